@@ -13,6 +13,7 @@ from bokeh.plotting import show, figure, ColumnDataSource
 
 from cave.analyzer.base_analyzer import BaseAnalyzer
 from cave.utils.bokeh_routines import get_checkbox
+from cave.utils.downsampling import downsample
 
 
 class BohbLearningCurves(BaseAnalyzer):
@@ -25,8 +26,18 @@ class BohbLearningCurves(BaseAnalyzer):
 
     def __init__(self,
                  runscontainer,
+                 max_points_per_line=None,
                  ):
-        super().__init__(runscontainer)
+        """
+        Parameters
+        ----------
+        runscontainer: RunsContainer
+            contains all important information about the configurator runs
+        max_points_per_line: int
+            maximum number of points per learning curve (largest-triangle-three-buckets), 0 for all points
+        """
+        super().__init__(runscontainer,
+                         max_points_per_line=max_points_per_line)
         try:
             from hpbandster.core.result import logged_results_to_HBS_result
             from hpbandster.core.result import extract_HBS_learning_curves
@@ -39,6 +50,7 @@ class BohbLearningCurves(BaseAnalyzer):
         self.result_object = self.result_objects[0]
         # TODO extend to support parallel runs (?)
         self.lcs = self.result_object.get_learning_curves(lc_extractor=extract_HBS_learning_curves)
+        self.max_points_per_line = self.options.getint('max_points_per_line', fallback=1000)
 
     def get_name(self):
         return "BOHB Learning Curves"
@@ -58,8 +70,10 @@ class BohbLearningCurves(BaseAnalyzer):
                 if len(tmp) == 0:
                     self.logger.debug("Probably filtered NaNs or None's.., skipping %s, data %s", str(conf_id), str(lc))
                     continue
-                times.append(tmp[0])
-                losses.append(tmp[1])
+                # Lines and scatter-points are serialized, so long curves are downsampled
+                selected = downsample(tmp[0], tmp[1], self.max_points_per_line, method='lttb')
+                times.append(tuple(tmp[0][i] for i in selected))
+                losses.append(tuple(tmp[1][i] for i in selected))
                 config_ids.append(conf_id)
 
         if reset_times:
@@ -26,6 +26,9 @@ class ConfiguratorFootprint(BaseAnalyzer):
                  time_slider=None,
                  number_quantiles=None,
                  timeslider_log: bool=None,
+                 embedding: str=None,
+                 n_jobs: int=None,
+                 compact_epm_data: bool=None,
                  ):
         """Plot the visualization of configurations, highlighting the
         incumbents. Using original rh, so the explored configspace can be
@@ -39,12 +42,18 @@ class ConfiguratorFootprint(BaseAnalyzer):
             maximum number of data-points to plot
         time_slider: bool
             whether or not to have a time_slider-widget on cfp-plot
-            INCREASES FILE-SIZE DRAMATICALLY
+            adds about one byte per configuration and quantile to the report
         number_quantiles: int
             if use_timeslider is not off, defines the number of quantiles for the
             slider/ number of static pictures
         timeslider_log: bool
             whether to use a logarithmic scale for the timeslider/quantiles
+        embedding: str
+            how to embed configurations into 2d, from ['mds', 'landmark_mds', 'pca', 'random_projection', 'spectral']
+        n_jobs: int
+            number of parallel jobs to compute distances and embeddings with
+        compact_epm_data: bool
+            build the EPM-data for the contours in float32
 
         Returns
         -------
@@ -60,7 +69,10 @@ class ConfiguratorFootprint(BaseAnalyzer):
                          max_configurations_to_plot=max_configurations_to_plot,
                          time_slider=time_slider,
                          number_quantiles=number_quantiles,
-                         timeslider_log=timeslider_log)
+                         timeslider_log=timeslider_log,
+                         embedding=embedding,
+                         n_jobs=n_jobs,
+                         compact_epm_data=compact_epm_data)
 
         self.logger.info("... visualizing explored configspace (this may take "
                          "a long time, if there is a lot of data - deactive with --no_configurator_footprint)")
@@ -79,6 +91,11 @@ class ConfiguratorFootprint(BaseAnalyzer):
         self.use_timeslider = self.options.getboolean('time_slider')
         self.num_quantiles = self.options.getint('number_quantiles')
         self.timeslider_log = self.options.getboolean('timeslider_log')
+        self.embedding = self.options.get('embedding', fallback='mds')
+        self.n_jobs = self.options.getint('n_jobs', fallback=1)
+        self.static_renderer = self.options.get('static_renderer', fallback='matplotlib')
+        self.animation = self.options.get('animation', fallback='off')
+        self.compact_epm_data = self.options.getboolean('compact_epm_data', fallback=False)
 
         incumbents = {r.trajectory[-1]['incumbent']: r.trajectory[-1]['cost'] for r in self.runs}
         self.final_incumbent = min(incumbents, key=incumbents.get)
@@ -96,7 +113,12 @@ class ConfiguratorFootprint(BaseAnalyzer):
                        use_timeslider=self.use_timeslider and self.num_quantiles > 1,
                        num_quantiles=self.num_quantiles,
                        timeslider_log=self.timeslider_log,
-                       output_dir=self.output_dir)
+                       output_dir=self.output_dir,
+                       n_jobs=self.n_jobs,
+                       embedding=self.embedding,
+                       static_renderer=self.static_renderer,
+                       animation=None if self.animation == 'off' else self.animation,
+                       compact_epm_data=self.compact_epm_data)
 
     def get_name(self):
         return "Configurator Footprint"
@@ -120,19 +142,23 @@ class ConfiguratorFootprint(BaseAnalyzer):
 
     def get_html(self, d=None, tooltip=None):
         bokeh_components = components(self.plot())
+        tooltip = (tooltip if tooltip else self.__doc__) + " Embedding: {} (normalized stress: {:.4f}).".format(
+            self.embedding, self.cfp.embedding_quality)
         if d is not None:
             if self.num_quantiles == 1 or self.use_timeslider:  # No need for "Static" with one plot / time slider activated
                 d[self.name] = {
                     "bokeh" : bokeh_components,
-                    "tooltip": self.__doc__,
+                    "tooltip": tooltip,
                 }
             else:
                 d[self.name] = {
-                    "tooltip": self.__doc__,
+                    "tooltip": tooltip,
                     "Interactive" : {"bokeh": (bokeh_components)},
                 }
                 if all([True for p in self.cfp_paths if os.path.exists(p)]):  # If the plots were actually generated
                     d[self.name]["Static"] = {"figure": self.cfp_paths}
+                    if self.cfp.animation_path:
+                        d[self.name]["Animation"] = {"figure": self.cfp.animation_path}
                 else:
                     d[self.name]["Static"] = {
                             "else": "This plot is missing. Maybe it was not generated? "
@@ -4,7 +4,6 @@ from typing import Union, Dict, List
 import numpy as np
 import pandas as pd
 from ConfigSpace.configuration_space import ConfigurationSpace, Configuration
-from ConfigSpace.hyperparameters import NumericalHyperparameter, CategoricalHyperparameter
 from bokeh.io import output_notebook
 from bokeh.models.annotations import Title
 from bokeh.plotting import show
@@ -18,6 +17,7 @@ from smac.utils.validate import Validator
 
 from cave.analyzer.base_analyzer import BaseAnalyzer
 from cave.plot.parallel_plot.parallel_plot import parallel_plot
+from cave.utils.configspace_structure import get_configspace_structure
 from cave.utils.hpbandster_helpers import format_budgets
 from cave.utils.timing import timing
 
@@ -216,17 +216,15 @@ class ParallelCoordinates(BaseAnalyzer):
     def _plot_budget(self, df):
         limits = OrderedDict([('cost', {'lower': df['cost'].min(),
                                         'upper': df['cost'].max()})])
-        for hp in self.runscontainer.scenario.cs.get_hyperparameters():
-            if isinstance(hp, NumericalHyperparameter):
-                limits[hp.name] = {'lower': hp.lower, 'upper': hp.upper}
-                if hp.log:
-                    limits[hp.name]['log'] = True
-            elif isinstance(hp, CategoricalHyperparameter):
+        structure = get_configspace_structure(self.runscontainer.scenario.cs)
+        for hp in structure.names:
+            if hp not in structure.limits:
+                hp_type = type(self.runscontainer.scenario.cs.get_hyperparameter(hp))
+                raise ValueError("Hyperparameter %s of type %s causes undefined behaviour." % (hp, hp_type))
+            limits[hp] = dict(structure.limits[hp])
+            if 'choices' in limits[hp]:
                 # We pass strings as numbers and overwrite the labels
-                df[hp.name].replace({v: i for i, v in enumerate(hp.choices)}, inplace=True)
-                limits[hp.name] = {'lower': 0, 'upper': len(hp.choices) - 1, 'choices': hp.choices}
-            else:
-                raise ValueError("Hyperparameter %s of type %s causes undefined behaviour." % (hp.name, type(hp)))
+                df[hp].replace({v: i for i, v in enumerate(limits[hp]['choices'])}, inplace=True)
         p = parallel_plot(df=df, axes=limits, color=df[df.columns[0]], palette=Viridis256)
         div = Div(text="Select up and down column grid lines to define filters. Double click a filter to reset it.")
         plot = column(div, p)
@@ -1,8 +1,10 @@
 import os
+from collections import OrderedDict
 
 from bokeh.embed import components
 from bokeh.io import output_notebook
 from bokeh.plotting import show
+from smac.runhistory.runhistory import RunHistory
 
 from cave.analyzer.base_analyzer import BaseAnalyzer
 from cave.plot.algorithm_footprint import AlgorithmFootprintPlotter
@@ -23,14 +25,37 @@ class AlgorithmFootprint(BaseAnalyzer):
     def __init__(self,
                  runscontainer,
                  density=200,
-                 purity=0.95):
+                 purity=0.95,
+                 footprint_algorithms=None,
+                 density_thresholds=None,
+                 purity_thresholds=None,
+                 n_jobs=None):
         """
         Parameters
         ----------
         runscontainer: RunsContainer
             contains all important information about the configurator runs
+        footprint_algorithms: str
+            from ['off', 'incumbents', 'trajectory'], compute footprint areas for the default and the incumbents of
+            all parallel runs (optionally all configurations on their trajectories)
+        density_thresholds, purity_thresholds: str
+            comma-separated grids of thresholds for the footprint areas
+        n_jobs: int
+            number of processes to compute footprint areas with
         """
-        super().__init__(runscontainer)
+        super().__init__(runscontainer,
+                         footprint_algorithms=footprint_algorithms,
+                         density_thresholds=density_thresholds,
+                         purity_thresholds=purity_thresholds,
+                         n_jobs=n_jobs)
+        self.footprint_algorithms = self.options.get('footprint_algorithms', fallback='off')
+        self.density_thresholds = [float(t) for t in self.options.get('density_thresholds', fallback='200').split(',')]
+        self.purity_thresholds = [float(t) for t in self.options.get('purity_thresholds', fallback='0.95').split(',')]
+        self.n_jobs = self.options.getint('n_jobs', fallback=1)
+        if self.footprint_algorithms not in ['off', 'incumbents', 'trajectory']:
+            raise ValueError("footprint_algorithms must be one of off, incumbents or trajectory, not %s" %
+                             self.footprint_algorithms)
+        self.footprints = None
 
         # Aggregated run over current runscontainer
         self.logger.info("Note: Algorithm Footprint does not support budgets / fidelities yet.")
@@ -67,6 +92,34 @@ class AlgorithmFootprint(BaseAnalyzer):
         except ValueError as err:
             self.logger.debug(err, exc_info=1)
             self.error = str(err)
+            return
+
+        if self.footprint_algorithms != 'off':
+            self._compute_footprints(agg_run, train_feats, test_feats)
+
+    def _compute_footprints(self, agg_run, train_feats, test_feats):
+        """ Footprint areas of the default and the incumbents of all runs (or their trajectories) over the grid of
+        thresholds. The labels (good/bad per instance) are relative to the best of all these algorithms. """
+        algorithms = OrderedDict([(agg_run.default, 'default'), (agg_run.incumbent, 'incumbent')])
+        for folder in self.runscontainer.get_folders():
+            run = self.runscontainer.get_runs_for_folder(folder)
+            if self.footprint_algorithms == 'trajectory':
+                for idx, entry in enumerate(run.trajectory):
+                    algorithms.setdefault(entry['incumbent'], '{} (trajectory {})'.format(folder, idx))
+            algorithms.setdefault(run.incumbent, 'incumbent ({})'.format(folder))
+        algorithms = [(config, name) for config, name in algorithms.items() if config is not None]
+        self.logger.info("... footprint areas for %d algorithms, %d density- and %d purity-thresholds",
+                         len(algorithms), len(self.density_thresholds), len(self.purity_thresholds))
+
+        # Estimate costs on all instances for all algorithms
+        epm_rh = RunHistory()
+        epm_rh.update(agg_run.epm_runhistory)
+        epm_rh.update(agg_run.validator.validate_epm([c for c, _ in algorithms], 'train+test', 1,
+                                                     runhistory=agg_run.combined_runhistory))
+        plotter = AlgorithmFootprintPlotter(epm_rh, train_feats, test_feats, algorithms, agg_run.scenario.cutoff,
+                                            agg_run.output_dir, rng=agg_run.rng)
+        self.footprints = plotter.footprints(self.density_thresholds, self.purity_thresholds, n_jobs=self.n_jobs)
+        self.footprints_plotter = plotter
 
     def get_name(self):
         return "Algorithm Footprint"
@@ -81,6 +134,10 @@ class AlgorithmFootprint(BaseAnalyzer):
         bokeh_plot = self._plot()
         output_notebook()
         show(bokeh_plot)
+        if self.footprints is not None:
+            from IPython.core.display import HTML, display
+            show(self.footprints_plotter.plot_footprint_areas(self.footprints))
+            display(HTML(self.footprints.to_html(index=False)))
 
     def get_html(self, d=None, tooltip=None):
 
@@ -94,6 +151,10 @@ class AlgorithmFootprint(BaseAnalyzer):
                 d["Algorithm Footprint"] = {"tooltip" : self.__doc__}
                 # Interactive bokeh-plot
                 d["Algorithm Footprint"]["Interactive Algorithm Footprint"] = {"bokeh" : bokeh_components}
+                if self.footprints is not None:
+                    d["Algorithm Footprint"]["Footprint Areas"] = {
+                        "bokeh": components(self.footprints_plotter.plot_footprint_areas(self.footprints)),
+                        "table": self.footprints.to_html(index=False)}
                 for plots in self.plots3d:
                     header = os.path.splitext(os.path.split(plots[0])[1])[0][10:-2]
                     header = header[0].upper() + header[1:].replace('_', ' ')
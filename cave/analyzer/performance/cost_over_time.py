@@ -1,6 +1,7 @@
+import heapq
 import itertools
 import os
-from collections import OrderedDict, namedtuple
+from collections import namedtuple
 from typing import List
 
 import numpy as np
@@ -13,21 +14,97 @@ from bokeh.models.sources import CDSView
 from bokeh.palettes import Dark2_5
 from bokeh.plotting import figure, ColumnDataSource, show
 from smac.configspace import convert_configurations_to_array
-from smac.epm.rf_with_instances import RandomForestWithInstances
-from smac.epm.util_funcs import get_types
 from smac.runhistory.runhistory import RunHistory, RunKey
-from smac.runhistory.runhistory2epm import RunHistory2EPM4Cost
-from smac.utils.constants import MAXINT
 from smac.utils.validate import Validator
 
 from cave.analyzer.base_analyzer import BaseAnalyzer
 from cave.reader.runs_container import RunsContainer
 from cave.utils.bokeh_routines import get_checkbox
-from cave.utils.hpbandster_helpers import get_incumbent_trajectory, format_budgets
+from cave.utils.downsampling import downsample
+from cave.utils.hpbandster_helpers import format_budgets
+from cave.utils.incremental_epm import IncrementalEPM
 from cave.utils.io import export_bokeh
+from cave.utils.marginalized_forest import predict_marginalized_over_instances
 
 Line = namedtuple('Line', ['name', 'time', 'mean', 'upper', 'lower', 'config'])
 
+
+def _nanpercentile(values, q):
+    """
+    Column-wise percentiles ignoring nan, as np.nanpercentile(values, q, axis=0) (linear interpolation), but with one
+    sort instead of a per-column evaluation, which is slow for many columns.
+
+    Parameters
+    ----------
+    values: np.array
+        shape (n_samples, n_columns), may contain nan
+    q: List[float]
+        percentiles in [0, 100]
+
+    Returns
+    -------
+    percentiles: np.array
+        shape (len(q), n_columns), nan for columns without values
+    """
+    values = np.sort(values, axis=0)  # nan last
+    n_valid = np.count_nonzero(~np.isnan(values), axis=0)
+    last = np.maximum(n_valid - 1, 0)
+    pos = np.outer(np.asarray(q, dtype=np.float64) / 100, last)
+    below = np.floor(pos).astype(np.int64)
+    above = np.minimum(below + 1, last)
+    columns = np.arange(values.shape[1])
+    lower, upper = values[below, columns], values[above, columns]
+    percentiles = lower + (upper - lower) * (pos - below)
+    percentiles[:, n_valid == 0] = np.nan
+    return percentiles
+
+
+def _merge_trajectories(trajectories):
+    """
+    Merge trajectories of parallel runs by time (k-way merge with a heap) and keep track of mean and standard
+    deviation over the current cost of all runs that have started (running sums, shifted by the first cost for
+    numerical stability), in O(E log R) for E entries of R runs.
+
+    Parameters
+    ----------
+    trajectories: List[Tuple[List[float], List[float]]]
+        times and costs per run, times sorted. not modified
+
+    Returns
+    -------
+    times, mean, std: np.array
+        one entry per trajectory entry. equal times are ordered by run, nan-costs are ignored
+    """
+    events = heapq.merge(*[zip(times, itertools.repeat(idx), costs) for idx, (times, costs) in enumerate(trajectories)],
+                         key=lambda event: event[:2])
+    current = [np.nan for _ in trajectories]
+    shift, total, total_sq, count = None, 0., 0., 0
+    f_time, f_mean, f_std = [], [], []
+    for time, idx, cost in events:
+        if shift is None and not np.isnan(cost):
+            shift = cost
+        if not np.isnan(current[idx]):
+            total -= current[idx] - shift
+            total_sq -= (current[idx] - shift) ** 2
+            count -= 1
+        if not np.isnan(cost):
+            total += cost - shift
+            total_sq += (cost - shift) ** 2
+            count += 1
+        current[idx] = cost
+        f_time.append(time)
+        if count > 0:
+            mean, mean_sq = total / count, total_sq / count
+            var = mean_sq - mean ** 2
+            # Cancellation in the running sums leaves noise where all costs are equal
+            f_mean.append(shift + mean)
+            f_std.append(np.sqrt(var) if var > 1e-12 * mean_sq else 0.)
+        else:
+            f_mean.append(np.nan)
+            f_std.append(np.nan)
+    return np.array(f_time, dtype=np.float64), np.array(f_mean), np.array(f_std)
+
+
 class CostOverTime(BaseAnalyzer):
     """
     Depicts the average cost of the best so far found configuration (using all trajectory data) over the time spent
@@ -41,14 +118,41 @@ class CostOverTime(BaseAnalyzer):
                  runscontainer: RunsContainer,
                  incumbent_trajectory: str=None,
                  average_over_runs: bool=None,
+                 time_aggregation: str=None,
+                 num_time_bins: int=None,
+                 max_points_per_line: int=None,
+                 compact_epm_data: bool=None,
                  ):
         """
         Plot performance over time, using all trajectory entries
         where max_time = max(wallclock_limit, the highest recorded time)
+
+        Parameters
+        ----------
+        runscontainer: RunsContainer
+            contains all important information about the configurator runs
+        incumbent_trajectory: str
+            from ['racing', 'minimum', 'prefer_higher_budget'], defines incumbent trajectory from hpbandster result
+        average_over_runs: bool
+            if True, average over plots
+        time_aggregation: str
+            from ['union', 'log_bins']. union: median and quartiles on all time points of all runs plus one line per
+            run. log_bins: median, quartiles, minimum and maximum over runs on a logarithmic time grid, without lines
+            per run (for many runs)
+        num_time_bins: int
+            number of points on the logarithmic time grid
+        max_points_per_line: int
+            maximum number of points per line (keeping minimum and maximum of buckets), 0 for all points
+        compact_epm_data: bool
+            keep the EPM training data in float32
         """
         super().__init__(runscontainer,
                          incumbent_trajectory=incumbent_trajectory,
-                         average_over_runs=average_over_runs)
+                         average_over_runs=average_over_runs,
+                         time_aggregation=time_aggregation,
+                         num_time_bins=num_time_bins,
+                         max_points_per_line=max_points_per_line,
+                         compact_epm_data=compact_epm_data)
 
         self.rng = self.runscontainer.get_rng()
         self.output_fn = "cost_over_time.png"
@@ -68,6 +172,12 @@ class CostOverTime(BaseAnalyzer):
 
         self.average_over_runs = self.options.getboolean('average_over_runs')
         self.cot_inc_traj = self.options['incumbent_trajectory']
+        self.time_aggregation = self.options.get('time_aggregation', fallback='union')
+        self.num_time_bins = self.options.getint('num_time_bins', fallback=100)
+        self.max_points_per_line = self.options.getint('max_points_per_line', fallback=1000)
+        self.compact_epm_data = self.options.getboolean('compact_epm_data', fallback=False)
+        if self.time_aggregation not in ['union', 'log_bins']:
+            raise ValueError("time_aggregation must be one of union or log_bins, not %s" % self.time_aggregation)
 
         self.logger.debug("Initialized CostOverTime with %d runs, output to \"%s\"", len(self.runscontainer.get_folders()), self.output_dir)
 
@@ -76,11 +186,46 @@ class CostOverTime(BaseAnalyzer):
 
         # Will be set during execution:
         self.plots = []                     # List with paths to '.png's
+        self.epms = {}                      # Path to IncrementalEPM, see _get_incremental_epm
 
     def get_name(self):
         return "Cost Over Time"
 
-    def _get_mean_var_time(self, validator, traj, use_epm, rh):
+    def _get_incremental_epm(self, rh, path):
+        """
+        Get an EPM that is up to date with rh. EPMs are cached in memory and on disk, so re-analyzing a grown
+        runhistory only grows new trees on the new runs instead of retraining from scratch.
+
+        Parameters
+        ----------
+        rh: RunHistory
+            runhistory to train on
+        path: str
+            path to cache the EPM at, if None, the EPM is only cached in memory
+
+        Returns
+        -------
+        epm: IncrementalEPM
+            model, trained on all data in rh
+        """
+        if path not in self.epms and path is not None and os.path.exists(path):
+            try:
+                self.epms[path] = IncrementalEPM.load(path, self.scenario)
+                self.logger.debug("Loaded cached EPM from %s", path)
+            except Exception as err:
+                self.logger.debug("Could not load cached EPM from %s (%s), training new one.", path, err)
+        if path not in self.epms:
+            self.epms[path] = IncrementalEPM(self.scenario, rng=self.rng, compact=self.compact_epm_data)
+        epm = self.epms[path]
+        num_full_retrains = epm.num_full_retrains
+        if epm.update(rh):
+            if epm.num_full_retrains > num_full_retrains:
+                self.logger.debug("Fully retrained EPM (%d trees)", epm.max_trees)
+            if path is not None:
+                epm.save(path)
+        return epm
+
+    def _get_mean_var_time(self, validator, traj, use_epm, rh, epm_path=None):
         """
         Parameters
         ----------
@@ -92,6 +237,8 @@ class CostOverTime(BaseAnalyzer):
             validated or not (no need to use epm if validated)
         rh: RunHistory
             ??
+        epm_path: str
+            where to cache the EPM trained on rh, if no EPM is passed via the validator (None: only in memory)
 
         Returns
         -------
@@ -120,22 +267,11 @@ class CostOverTime(BaseAnalyzer):
                 epm = validator.epm
             else:
                 self.logger.debug("No EPM passed! Training new one from runhistory.")
-                # Train random forest and transform training data (from given rh)
+                # Train random forest (incrementally, if a model for a previous state of this rh is cached)
                 # Not using validator because we want to plot uncertainties
-                rh2epm = RunHistory2EPM4Cost(num_params=len(self.scenario.cs.get_hyperparameters()), scenario=self.scenario)
-                X, y = rh2epm.transform(rh)
-                self.logger.debug("Training model with data of shape X: %s, y: %s", str(X.shape), str(y.shape))
-
-                types, bounds = get_types(self.scenario.cs, self.scenario.feature_array)
-                epm = RandomForestWithInstances(self.scenario.cs,
-                                                types=types,
-                                                bounds=bounds,
-                                                seed=self.rng.randint(MAXINT),
-                                                instance_features=self.scenario.feature_array,
-                                                ratio_features=1.0)
-                epm.train(X, y)
+                epm = self._get_incremental_epm(rh, epm_path)
             config_array = convert_configurations_to_array(configs)
-            mean, var = epm.predict_marginalized_over_instances(config_array)
+            mean, var = predict_marginalized_over_instances(epm, config_array, logger=self.logger)
             var = np.zeros(mean.shape)
             # We don't want to show the uncertainty of the model but uncertainty over multiple optimizer runs
             # This variance is computed in an outer loop.
@@ -157,52 +293,124 @@ class CostOverTime(BaseAnalyzer):
             mean, var = np.array(mean).reshape(-1, 1), np.array(var).reshape(-1, 1)
         return mean, var, time, configs
 
-    def _get_avg(self, validator, runs, rh):
-        # If there is more than one run, we average over the runs
+    def _get_trajectory_matrix(self, validator, runs, rh, grid=None):
+        """
+        Evaluate the step-functions of all runs (value of the last trajectory entry at or before a time, nan before
+        the first entry) on a common time grid.
+
+        Parameters
+        ----------
+        validator: Validator
+            validator (smac-based)
+        runs: List[ConfiguratorRun]
+            runs to evaluate
+        rh: RunHistory
+            runhistory to train the EPM on, if runs are not validated
+        grid: Callable
+            maps the sorted union of all time points to the time grid, defaults to the union itself
+
+        Returns
+        -------
+        times: np.array
+            time grid
+        values: np.array
+            shape (len(runs), len(times))
+        """
         means, times = [], []
         for run in runs:
             # Ignore variances as we plot variance over runs
-            mean, _, time, _ = self._get_mean_var_time(validator, run.trajectory, not run.validated_runhistory, rh)
-            means.append(mean.flatten())
-            times.append(time)
-        all_times = np.array(sorted([a for b in times for a in b]))  # flatten times
-        means = np.array(means)
-        times = np.array(times)
-        at = [0 for _ in runs]      # keep track at which timestep each trajectory is
-        m = [np.nan for _ in runs]  # used to compute the mean over the timesteps
-        mean  = np.ones((len(all_times), 1)) * -1
-        var, upper, lower = np.copy(mean), np.copy(mean), np.copy(mean)
-        for time_idx, t in enumerate(all_times):
-            for traj_idx, entry_idx in enumerate(at):
-                try:
-                    if t == times[traj_idx][entry_idx]:
-                        m[traj_idx] = means[traj_idx][entry_idx]
-                        at[traj_idx] += 1
-                except IndexError:
-                    pass  # Reached the end of one trajectory. No need to check it further
-            # var[time_idx][0] = np.nanvar(m)
-            u, l, m_ = np.nanpercentile(m, 75), np.nanpercentile(m, 25), np.nanpercentile(m, 50)
-            # self.logger.debug((mean[time_idx][0] + np.sqrt(var[time_idx][0]), mean[time_idx][0],
-            #                    mean[time_idx][0] - np.sqrt(var[time_idx][0])))
-            # self.logger.debug((l, m_, u))
-            upper[time_idx][0] = u
-            mean[time_idx][0] = m_
-            lower[time_idx][0] = l
-
-        mean = mean[:, 0]
-        upper = upper[:, 0]
-        lower = lower[:, 0]
-
-        # Determine clipping point for y-axis from lowest legal value
-        clip_y_lower = False
-        if self.scenario.run_obj == 'runtime':  # y-axis on log -> clip plot
+            mean, _, time, _ = self._get_mean_var_time(validator, run.trajectory, not run.validated_runhistory, rh,
+                                                       os.path.join(self.output_dir, 'analysis_data',
+                                                                    'cost_over_time_epm.pkl'))
+            means.append(np.asarray(mean, dtype=np.float64).flatten())
+            times.append(np.asarray(time, dtype=np.float64))
+        all_times = np.unique(np.concatenate(times))
+        if grid is not None:
+            all_times = grid(all_times)
+        values = np.full((len(runs), len(all_times)), np.nan)
+        for run_idx, (time, mean) in enumerate(zip(times, means)):
+            entry_idx = np.searchsorted(time, all_times, side='right') - 1
+            started = entry_idx >= 0
+            values[run_idx, started] = mean[entry_idx[started]]
+        return all_times, values
+
+    def _log_grid(self, times):
+        """ num_time_bins points, logarithmically spaced between the first positive and the last time point """
+        positive = times[times > 0]
+        if len(positive) == 0 or positive[0] == times[-1]:
+            return times[-1:]
+        grid = np.geomspace(positive[0], times[-1], self.num_time_bins)
+        grid[0], grid[-1] = positive[0], times[-1]  # exact, so first and last entries are not missed
+        return grid
+
+    def _clip_lower(self, lower, mean):
+        """ Determine clipping point for y-axis from lowest legal value (y-axis is log for runtime) """
+        if self.scenario.run_obj == 'runtime':
             clip_y_lower = min(list(lower[lower > 0]) + list(mean)) * 0.8
             lower[lower <= 0] = clip_y_lower * 0.9
-        #if clip_y_lower:
-        #    p.y_range = Range1d(clip_y_lower, 1.2 * max(upper))
+        return lower
 
+    def _downsample(self, time, mean, *columns, doubled=False):
+        """
+        Select at most max_points_per_line points of a line (half as many, if it is doubled for the step-effect
+        afterwards), keeping minimum and maximum of the mean per bucket.
+
+        Parameters
+        ----------
+        time, mean: List[float]
+            coordinates of the line
+        columns: List[List]
+            data aligned with time (e.g. bands or configurations)
+        doubled: bool
+            whether the line will be doubled for the step-effect
+
+        Returns
+        -------
+        selected: List[List]
+            time, mean and columns, reduced to the selected points
+        """
+        max_points = self.max_points_per_line
+        if doubled and max_points > 0:
+            max_points = max(2, max_points // 2)
+        indices = downsample(time, mean, max_points, method='minmax')
+        if len(indices) < len(time):
+            self.logger.debug("Downsampled line from %d to %d points", len(time), len(indices))
+        return [[column[i] for i in indices] for column in (time, mean) + columns]
+
+    def _get_avg(self, validator, runs, rh):
+        """
+        Median and quartiles over runs, on the union of all time points.
+
+        Returns
+        -------
+        line: Line
+            median as mean, 75th and 25th percentile as upper and lower
+        """
+        # If there is more than one run, we average over the runs
+        all_times, values = self._get_trajectory_matrix(validator, runs, rh)
+        lower, mean, upper = _nanpercentile(values, [25, 50, 75])
+        lower = self._clip_lower(lower, mean)
+        all_times, mean, upper, lower = self._downsample(all_times, mean, upper, lower)
         return Line('average', all_times, mean, upper, lower, [None for _ in range(len(mean))])
 
+    def _get_binned(self, validator, runs, rh):
+        """
+        Median, quartiles, minimum and maximum over runs, on a logarithmic time grid of num_time_bins points. The
+        size of the plot is independent of the number of runs and trajectory entries.
+
+        Returns
+        -------
+        line: Line
+            median as mean, 75th and 25th percentile as upper and lower
+        envelope: Tuple[np.array, np.array]
+            minimum and maximum over runs
+        """
+        times, values = self._get_trajectory_matrix(validator, runs, rh, grid=self._log_grid)
+        minimum, lower, mean, upper, maximum = _nanpercentile(values, [0, 25, 50, 75, 100])
+        self.logger.debug("Aggregated %d runs on %d time points", len(runs), len(times))
+        lower, minimum = self._clip_lower(lower, mean), self._clip_lower(minimum, mean)
+        return Line('average', times, mean, upper, lower, [None for _ in range(len(mean))]), (minimum, maximum)
+
     def _get_all_runs(self, validator, runs, rh):
         """
         get a list of Line-objects
@@ -211,8 +419,11 @@ class CostOverTime(BaseAnalyzer):
         # TODO add configs to tooltips (first to data)
         for run in runs:
             validated = True if run.validated_runhistory else False
-            mean, var, time, configs = self._get_mean_var_time(validator, run.trajectory, not validated, run.combined_runhistory)
+            mean, var, time, configs = self._get_mean_var_time(validator, run.trajectory, not validated,
+                                                               run.combined_runhistory,
+                                                               os.path.join(run.output_dir, 'cost_over_time_epm.pkl'))
             mean = mean[:, 0]
+            time, mean, configs = self._downsample(time, mean, configs, doubled=True)
 
             # doubling for step-effect TODO if step works with hover in bokeh, consider changing this
             time_double = [t for sub in zip(time, time) for t in sub][1:-1]
@@ -227,30 +438,16 @@ class CostOverTime(BaseAnalyzer):
         else:
             budgets = [budget]
 
-        data = OrderedDict()
-        for idx, bohb_result in enumerate(self.bohb_results):
-            data[idx] = {'costs' : [], 'times' : []}
-            traj_dict = get_incumbent_trajectory(bohb_result, budgets, mode=self.cot_inc_traj)
-            data[idx]['costs'] = traj_dict['losses']
-            data[idx]['times'] = traj_dict['times_finished']
+        trajectories = []
+        for run in self.runscontainer.get_all_runs():
+            # Cached on the run, computed once for all budgets
+            traj_dict = run.get_incumbent_trajectory(budgets, mode=self.cot_inc_traj)
+            trajectories.append((traj_dict['times_finished'], traj_dict['losses']))
 
         # Average over parallel bohb iterations to get final values
-        f_time, f_config, f_mean, f_std = [], [], [], []
-
-        pointer = OrderedDict([(idx, {'cost' : np.nan,
-                          'time' : 0}) for idx in list(data.keys())])
-
-        while (len(data) > 0):
-            next_idx = min({idx : data[idx]['times'][0] for idx in data.keys()}.items(), key=lambda x: x[1])[0]
-            pointer[next_idx] = {'cost' : data[next_idx]['costs'].pop(0),
-                                 'time' : data[next_idx]['times'].pop(0)}
-            f_time.append(pointer[next_idx]['time'])
-            f_mean.append(np.nanmean([values['cost'] for values in pointer.values()]))
-            f_std.append(np.nanstd([values['cost'] for values in pointer.values()]))
-
-            if len(data[next_idx]['times']) == 0:
-                data.pop(next_idx)
+        f_time, f_mean, f_std = _merge_trajectories(trajectories)
 
+        f_time, f_mean, f_std = self._downsample(f_time, f_mean, f_std, doubled=True)
         time_double = [t for sub in zip(f_time, f_time) for t in sub][1:]
         mean_double = [t for sub in zip(f_mean, f_mean) for t in sub][:-1]
         std_double = [t for sub in zip(f_std, f_std) for t in sub][:-1]
@@ -267,12 +464,16 @@ class CostOverTime(BaseAnalyzer):
         rh, runs, output_fn, validator = self.rh, self.runs, self.output_fn, self.validator
         # Add lines to be plotted to lines (key-values must be zippable)
         lines = []
+        envelope = None
 
         # Get plotting data and create CDS
         if any(self.bohb_results):
             lines.append(self._get_bohb_line(validator, runs, rh))
             for b in self.bohb_results[0].HB_config['budgets']:
                 lines.append(self._get_bohb_line(validator, runs, rh, b))
+        elif self.time_aggregation == 'log_bins':
+            line, envelope = self._get_binned(validator, runs, rh)
+            lines.append(line)
         else:
             lines.append(self._get_avg(validator, runs, rh))
             lines.extend(self._get_all_runs(validator, runs, rh))
@@ -331,6 +532,9 @@ class CostOverTime(BaseAnalyzer):
                 band_y = np.append(line.lower, line.upper[::-1])
                 renderers[-1].extend([p.patch(band_x, band_y, color='#7570B3', fill_alpha=0.2,
                                               visible=True if line.name in ['average', 'all budgets'] else False)])
+                if name == 'average' and envelope is not None:
+                    band_y = np.append(envelope[0], envelope[1][::-1])
+                    renderers[-1].extend([p.patch(band_x, band_y, color='#7570B3', fill_alpha=0.1, line_alpha=0)])
 
         # Tooltips
         tooltips = [("estimated performance", "@mean"),
@@ -1,3 +1,4 @@
+from concurrent.futures import ProcessPoolExecutor
 from typing import List
 
 import numpy as np
@@ -9,7 +10,7 @@ from smac.scenario.scenario import Scenario
 from cave.analyzer.base_analyzer import BaseAnalyzer
 from cave.utils.helpers import get_cost_dict_for_config, get_timeout, combine_runhistories
 from cave.utils.hpbandster_helpers import format_budgets
-from cave.utils.statistical_tests import paired_permutation, paired_t_student
+from cave.utils.statistical_tests import sequential_paired_permutation, paired_t_student
 from cave.utils.timing import timing
 
 
@@ -24,7 +25,9 @@ class PerformanceTable(BaseAnalyzer):
 
     P-value (between 0 and 1) results from comparing default and incumbent using a paired permutation test with 10000 iterations
     (permuting instances) and tests against the null-hypothesis that the mean of performance between default and
-    incumbent is equal.
+    incumbent is equal. The number of permutations and the 99%-confidence interval of the p-value are given in
+    brackets (in adaptive mode, the test stops early once the interval excludes the significance level; the interval
+    is checked after every batch of permutations, so each check has a correspondingly higher confidence).
 
     Oracle performance searches for the best single run per instance (so the best seed/configuration-pair that was
     seen) and aggregates over them.
@@ -32,26 +35,66 @@ class PerformanceTable(BaseAnalyzer):
 
     def __init__(self,
                  runscontainer,
+                 permutation_test=None,
+                 num_permutations=None,
+                 significance_level=None,
+                 p_value_precision=None,
+                 n_jobs=None,
                  ):
-        super().__init__(runscontainer)
+        """
+        Parameters
+        ----------
+        runscontainer: RunsContainer
+            contains all important information about the configurator runs
+        permutation_test: str
+            from ['fixed', 'adaptive']. fixed always performs num_permutations permutations, adaptive stops as soon as
+            the confidence interval of the p-value excludes significance_level or is narrower than
+            2 * p_value_precision
+        num_permutations: int
+            (maximum) number of permutations
+        significance_level, p_value_precision: float
+            stopping criteria for adaptive permutation tests
+        n_jobs: int
+            number of processes for permutation tests
+        """
+        super().__init__(runscontainer,
+                         permutation_test=permutation_test,
+                         num_permutations=num_permutations,
+                         significance_level=significance_level,
+                         p_value_precision=p_value_precision,
+                         n_jobs=n_jobs)
 
         self.rng = self.runscontainer.get_rng()
         self.scenario = self.runscontainer.scenario
-
+        self.permutation_test = self.options.get('permutation_test', fallback='fixed')
+        self.num_permutations = self.options.getint('num_permutations', fallback=10000)
+        self.significance_level = self.options.getfloat('significance_level', fallback=0.05)
+        self.p_value_precision = self.options.getfloat('p_value_precision', fallback=0.001)
+        self.n_jobs = self.options.getint('n_jobs', fallback=1)
+        if self.permutation_test not in ['fixed', 'adaptive']:
+            raise ValueError("permutation_test must be one of fixed or adaptive, not %s" % self.permutation_test)
+
+        # One pool for all permutation tests, processes are only started if a test is large enough to use them
+        self.executor = ProcessPoolExecutor(max_workers=self.n_jobs) if self.n_jobs > 1 else None
         budgets = self.runscontainer.get_budgets()
         formatted_budgets = format_budgets(budgets)
-        for budget, run in zip(budgets, self.runscontainer.get_aggregated(keep_budgets=True, keep_folders=False)):
-            instances = [i for i in run.scenario.train_insts + run.scenario.test_insts if i]
-            self.result[formatted_budgets[budget]] = {
-                'table' : self.get_performance_table(
-                                instances,
-                                run.validated_runhistory,
-                                run.default,
-                                run.incumbent,
-                                run.epm_runhistory,
-                                run.scenario,
-                                ),
-            }
+        try:
+            for budget, run in zip(budgets, self.runscontainer.get_aggregated(keep_budgets=True, keep_folders=False)):
+                instances = [i for i in run.scenario.train_insts + run.scenario.test_insts if i]
+                self.result[formatted_budgets[budget]] = {
+                    'table' : self.get_performance_table(
+                                    instances,
+                                    run.validated_runhistory,
+                                    run.default,
+                                    run.incumbent,
+                                    run.epm_runhistory,
+                                    run.scenario,
+                                    ),
+                }
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown(wait=True)
+                self.executor = None
 
     def get_name(self):
         return "Performance Table"
@@ -88,24 +131,23 @@ class PerformanceTable(BaseAnalyzer):
         if self.scenario.cutoff:
             ora_timeout = self.timeouts_to_tuple({i: c < self.scenario.cutoff for i, c in oracle.items()})
             data1, data2 = zip(*[(int(def_timeouts[i]), int(inc_timeouts[i])) for i in def_timeouts.keys()])
-            p_value_timeouts = "%.5f" % paired_permutation(data1, data2, self.rng,
-                                                           num_permutations=10000, logger=self.logger)
+            p_value_timeouts = self._format_p_value(*self._paired_permutation(data1, data2, self.num_permutations))
         else:
             ora_timeout = self.timeouts_to_tuple({})
             p_value_timeouts = "N/A"
         # p-values (paired permutation)
         try:
-            p_value_par10 = self._permutation_test(epm_rh, default, incumbent, 10000, 10)
+            p_value_par10 = self._permutation_test(epm_rh, default, incumbent, self.num_permutations, 10)
         except ValueError as err:
             self.logger.debug(err, exc_info=1)
-            p_value_par10 = np.nan
-        p_value_par10 = "%.5f" % p_value_par10 if np.isfinite(p_value_par10) else 'N/A'
+            p_value_par10 = (np.nan, 0, (np.nan, np.nan))
+        p_value_par10 = self._format_p_value(*p_value_par10)
         try:
-            p_value_par1 = self._permutation_test(epm_rh, default, incumbent, 10000, 1)
+            p_value_par1 = self._permutation_test(epm_rh, default, incumbent, self.num_permutations, 1)
         except ValueError as err:
             self.logger.debug(err, exc_info=1)
-            p_value_par1 = np.nan
-        p_value_par1 = "%.5f" % p_value_par1 if np.isfinite(p_value_par1) else 'N/A'
+            p_value_par1 = (np.nan, 0, (np.nan, np.nan))
+        p_value_par1 = self._format_p_value(*p_value_par1)
 
         dec_place = 3
 
@@ -309,16 +351,51 @@ class PerformanceTable(BaseAnalyzer):
 
     @timing
     def _permutation_test(self, epm_rh, default, incumbent, num_permutations, par=1):
+        """
+        Returns
+        -------
+        p, num_permutations, ci: float, int, Tuple[float, float]
+            see _paired_permutation
+        """
         if par != 1 and not self.scenario.cutoff:
-            return np.nan
+            return np.nan, 0, (np.nan, np.nan)
         cutoff = self.scenario.cutoff
         def_cost = get_cost_dict_for_config(epm_rh, default, par=par, cutoff=cutoff)
         inc_cost = get_cost_dict_for_config(epm_rh, incumbent, par=par, cutoff=cutoff)
         data1, data2 = zip(*[(def_cost[i], inc_cost[i]) for i in def_cost.keys()])
-        p = paired_permutation(data1, data2, self.rng, num_permutations=num_permutations, logger=self.logger)
+        p, used_permutations, ci = self._paired_permutation(data1, data2, num_permutations)
         self.logger.debug("p-value for def/inc-difference: %f (permutation test "
-                          "with %d permutations and par %d)", p, num_permutations, par)
-        return p
+                          "with %d permutations and par %d)", p, used_permutations, par)
+        return p, used_permutations, ci
+
+    def _paired_permutation(self, data1, data2, num_permutations):
+        """
+        Paired permutation test with the configured mode (fixed or adaptive)
+
+        Returns
+        -------
+        p: float
+            p-value
+        num_permutations: int
+            number of permutations performed
+        ci: Tuple[float, float]
+            confidence interval of the p-value (99% over all checks in adaptive mode)
+        """
+        return sequential_paired_permutation(data1, data2, self.rng,
+                                             max_permutations=num_permutations,
+                                             alpha=self.significance_level,
+                                             precision=self.p_value_precision,
+                                             early_stopping=self.permutation_test == 'adaptive',
+                                             n_jobs=self.n_jobs,
+                                             executor=self.executor,
+                                             logger=self.logger)
+
+    @staticmethod
+    def _format_p_value(p, num_permutations, ci):
+        """ p-value with number of permutations and confidence interval for the table, N/A if not available """
+        if not np.isfinite(p):
+            return 'N/A'
+        return "%.5f (n=%d, CI %.5f-%.5f)" % (p, num_permutations, ci[0], ci[1])
 
     def _paired_t_test(self, epm_rh, default, incumbent, num_permutations):
         def_cost, inc_cost = get_cost_dict_for_config(epm_rh, default), get_cost_dict_for_config(epm_rh, incumbent)
@@ -158,7 +158,7 @@ class CaveCLI(object):
         cfp_opts = parser.add_argument_group("Configurator Footprint", "Fine-tune the configurator footprint")
         cfp_opts.add_argument("--cfp_time_slider",
                               help="whether or not to have a time_slider-widget on cfp-plot"
-                                   "INCREASES FILE-SIZE (and loading) DRAMATICALLY. ",
+                                   " (adds about one byte per configuration and quantile to the report). ",
                               choices=["on", "off"],
                               default="off")
         cfp_opts.add_argument("--cfp_number_quantiles",
@@ -168,6 +168,14 @@ class CaveCLI(object):
                               help="maximum number of configurations to be plotted in configurator footprint (in case "
                                    "you run into a MemoryError). -1 -> plot all. ",
                               default=-1, type=int)
+        cfp_opts.add_argument("--cfp_embedding",
+                              help="how to embed configurations into 2d for the configurator footprint. mds needs all "
+                                   "pairwise distances, the others scale to large numbers of configurations. ",
+                              default="mds", type=str.lower,
+                              choices=['mds', 'landmark_mds', 'pca', 'random_projection', 'spectral'])
+        cfp_opts.add_argument("--cfp_n_jobs",
+                              help="number of parallel jobs to compute distances and embeddings with. ",
+                              default=1, type=int)
 
         pc_opts = parser.add_argument_group("Parallel Coordinates", "Fine-tune the parameter parallel coordinates")
         # TODO: this choice should be integrated into the bokeh plot
@@ -190,6 +198,30 @@ class CaveCLI(object):
                                    "(this will likely lead to peaks, whenever a new budget is evaluated)",
                               default="racing", type=str.lower,
                               choices=["racing", "minimum", "prefer_higher_budget"])
+        cot_opts.add_argument("--cot_time_aggregation",
+                              help="how to aggregate multiple runs. 'union' plots median and quartiles on all time "
+                                   "points of all runs and each run individually; 'log_bins' only plots median, "
+                                   "quartiles, minimum and maximum on a logarithmic time grid, which keeps the plot "
+                                   "small for hundreds of runs",
+                              default="union", type=str.lower,
+                              choices=["union", "log_bins"])
+        cot_opts.add_argument("--cot_num_time_bins",
+                              help="number of points of the logarithmic time grid for "
+                                   "'--cot_time_aggregation log_bins'",
+                              default=100, type=int)
+        pt_opts = parser.add_argument_group("Performance Table", "Fine-tune the performance table")
+        pt_opts.add_argument("--pt_permutation_test",
+                             help="'fixed' always performs '--pt_num_permutations' permutations for the p-values; "
+                                  "'adaptive' stops as soon as the confidence interval of the p-value excludes the "
+                                  "significance level (0.05) or is sufficiently narrow",
+                             default="fixed", type=str.lower,
+                             choices=["fixed", "adaptive"])
+        pt_opts.add_argument("--pt_num_permutations",
+                             help="(maximum) number of permutations for the p-values",
+                             default=10000, type=int)
+        pt_opts.add_argument("--pt_n_jobs",
+                             help="number of processes for permutation tests",
+                             default=1, type=int)
 
         # General analysis to be carried out
         default_opts = parser.add_mutually_exclusive_group()
@@ -266,7 +298,14 @@ class CaveCLI(object):
         analyzing_options["Configurator Footprint"]["time_slider"] = str(args_.cfp_time_slider)
         analyzing_options["Configurator Footprint"]["number_quantiles"] = str(args_.cfp_number_quantiles)
         analyzing_options["Configurator Footprint"]["max_configurations_to_plot"] = str(args_.cfp_max_configurations_to_plot)
+        analyzing_options["Configurator Footprint"]["embedding"] = str(args_.cfp_embedding)
+        analyzing_options["Configurator Footprint"]["n_jobs"] = str(args_.cfp_n_jobs)
         analyzing_options["Cost Over Time"]["incumbent_trajectory"] = str(args_.cot_inc_traj)
+        analyzing_options["Cost Over Time"]["time_aggregation"] = str(args_.cot_time_aggregation)
+        analyzing_options["Cost Over Time"]["num_time_bins"] = str(args_.cot_num_time_bins)
+        analyzing_options["Performance Table"]["permutation_test"] = str(args_.pt_permutation_test)
+        analyzing_options["Performance Table"]["num_permutations"] = str(args_.pt_num_permutations)
+        analyzing_options["Performance Table"]["n_jobs"] = str(args_.pt_n_jobs)
         analyzing_options["fANOVA"]["fanova_pairwise"] = str(args_.fanova_pairwise)
         analyzing_options["fANOVA"]["pimp_max_samples"] = str(args_.pimp_max_samples)
         analyzing_options["Parallel Coordinates"]["pc_sort_by"] = str(args_.pc_sort_by)
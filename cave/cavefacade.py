@@ -273,8 +273,18 @@ class CAVE(object):
         return CompareDefaultIncumbent(self.runscontainer)
 
     @_analyzer_type
-    def performance_table(self):
-        return PerformanceTable(self.runscontainer)
+    def performance_table(self,
+                          permutation_test=None,
+                          num_permutations=None,
+                          significance_level=None,
+                          p_value_precision=None,
+                          n_jobs=None):
+        return PerformanceTable(self.runscontainer,
+                                permutation_test=permutation_test,
+                                num_permutations=num_permutations,
+                                significance_level=significance_level,
+                                p_value_precision=p_value_precision,
+                                n_jobs=n_jobs)
 
     @_analyzer_type
     def plot_scatter(self):
@@ -285,14 +295,30 @@ class CAVE(object):
         return PlotECDF(self.runscontainer)
 
     @_analyzer_type
-    def algorithm_footprints(self):
-        return AlgorithmFootprint(self.runscontainer)
+    def algorithm_footprints(self,
+                             footprint_algorithms=None,
+                             density_thresholds=None,
+                             purity_thresholds=None,
+                             n_jobs=None):
+        return AlgorithmFootprint(self.runscontainer,
+                                  footprint_algorithms=footprint_algorithms,
+                                  density_thresholds=density_thresholds,
+                                  purity_thresholds=purity_thresholds,
+                                  n_jobs=n_jobs)
 
     @_analyzer_type
     def cost_over_time(self,
-                       incumbent_trajectory=None):
+                       incumbent_trajectory=None,
+                       time_aggregation=None,
+                       num_time_bins=None,
+                       max_points_per_line=None,
+                       compact_epm_data=None):
         return CostOverTime(self.runscontainer,
-                            incumbent_trajectory=incumbent_trajectory)
+                            incumbent_trajectory=incumbent_trajectory,
+                            time_aggregation=time_aggregation,
+                            num_time_bins=num_time_bins,
+                            max_points_per_line=max_points_per_line,
+                            compact_epm_data=compact_epm_data)
 
     @_analyzer_type
     def parallel_coordinates(self,
@@ -312,11 +338,17 @@ class CAVE(object):
     def configurator_footprint(self,
                                time_slider=None,
                                max_configurations_to_plot=None,
-                               number_quantiles=None):
+                               number_quantiles=None,
+                               embedding=None,
+                               n_jobs=None,
+                               compact_epm_data=None):
         return ConfiguratorFootprint(self.runscontainer,
                                      time_slider=time_slider,
                                      max_configurations_to_plot=max_configurations_to_plot,
-                                     number_quantiles=number_quantiles)
+                                     number_quantiles=number_quantiles,
+                                     embedding=embedding,
+                                     n_jobs=n_jobs,
+                                     compact_epm_data=compact_epm_data)
 
     @_analyzer_type
     def cave_fanova(self):
@@ -384,8 +416,10 @@ class CAVE(object):
         self.feature_clustering(d=d)
 
     @_analyzer_type
-    def bohb_learning_curves(self):
-        return BohbLearningCurves(self.runscontainer)
+    def bohb_learning_curves(self,
+                             max_points_per_line=None):
+        return BohbLearningCurves(self.runscontainer,
+                                  max_points_per_line=max_points_per_line)
 
     @_analyzer_type
     def bohb_incumbents_per_budget(self):
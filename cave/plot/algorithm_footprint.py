@@ -1,11 +1,14 @@
+import heapq
 import itertools
 import logging
 import os
 import time
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 
 import matplotlib.pyplot as plt
 import numpy as np
+import pandas as pd
 
 plt.style.use(os.path.join(os.path.dirname(__file__), 'mpl_style'))  # noqa
 from scipy import spatial
@@ -18,9 +21,11 @@ from bokeh.plotting import figure, ColumnDataSource
 from bokeh.models import HoverTool, CustomJS, CDSView, GroupFilter
 from bokeh.models.widgets import RadioButtonGroup
 from bokeh.models.ranges import DataRange1d
+from bokeh.palettes import Category20
 from bokeh.layouts import row, column, widgetbox
 
 from smac.runhistory.runhistory import RunHistory
+from smac.utils.constants import MAXINT
 
 from cave.utils.helpers import get_cost_dict_for_config
 from cave.utils.io import export_bokeh
@@ -90,7 +95,10 @@ class AlgorithmFootprintPlotter(object):
             raise ValueError("Default and Incumbent are equal or some other error occured. Deactivate "
                              "algorithm-footprints with --no_algorithm_footprint")
 
+        self._algo_cost = {}  # Use function self._get_cost!! Maps algo -> {instance -> cost}
         self.algo_labels = {}  # Maps algo -> label (good and bad)
+        self.costs = None  # cost-matrix (algorithms x instances, in order of self.algorithms and self.insts)
+        self.labels = None  # label-matrix (same shape)
 
         self.features = np.array([self.inst_to_feat[k] for k in self.insts])
         self.features_2d = self._reduce_dim(self.features, 2)
@@ -135,19 +143,32 @@ class AlgorithmFootprintPlotter(object):
         instance: str
             instance name
         """
-        if not hasattr(self, '__algo_cost'):
-            self.__algo_cost = {}  # Use function self._get_cost!! Maps algo -> {instance -> cost}
-        if algorithm not in self.__algo_cost:
-            #self.logger.debug("Getting cost for %s, using PAR1-score", self.algo_name[algorithm])
-            self.__algo_cost[algorithm] = get_cost_dict_for_config(self.rh, algorithm)
+        if algorithm not in self._algo_cost:
+            self._algo_cost[algorithm] = get_cost_dict_for_config(self.rh, algorithm)
         if instance:
-            return self.__algo_cost[algorithm][instance]
+            return self._algo_cost[algorithm][instance]
         else:
-            return self.__algo_cost[algorithm]
+            return self._algo_cost[algorithm]
+
+    def _get_cost_matrix(self):
+        """
+        Costs of all algorithms on all instances, queried once from the runhistory.
+
+        Returns
+        -------
+        costs: np.array
+            costs, shape (len(self.algorithms), len(self.insts)), nan if an algorithm was not evaluated on an instance
+        """
+        costs = np.full((len(self.algorithms), len(self.insts)), np.nan)
+        for idx, a in enumerate(self.algorithms):
+            cost_dict = self._get_cost(a)
+            costs[idx] = [cost_dict.get(i, np.nan) for i in self.insts]
+        return costs
 
     def _label_instances(self, epsilon=0.95):
         """
-        Returns dictionary with a label for each instance.
+        Label each instance for each algorithm: good (1) if the algorithm's cost is within epsilon of the best cost
+        (best / cost >= epsilon) and no timeout, bad (0) otherwise.
 
         Returns
         -------
@@ -157,23 +178,16 @@ class AlgorithmFootprintPlotter(object):
         start = time.time()
         if len(self.algo_labels) > 0:
             return
-        self.algo_labels = {a: {} for a in self.algo_name.keys()}
-        for i in self.insts:
-            best_cost = min([self._get_cost(a, i) for a in self.algo_name.keys()])
-            for a in self.algo_name.keys():
-                cost = self._get_cost(a, i)
-                # self.logger.debug("%s on \'%s\': best/this (%f/%f=%f)",
-                #                  self.algo_name[a], i,
-                #                  best_cost, cost,
-                #                  best_cost / cost)
-                if (cost == 0 or
-                    (best_cost/cost >= epsilon and
-                     (not self.cutoff or not cost >= self.cutoff))):
-                    # Algorithm for instance is in threshhold epsilon and no timeout
-                    label = 1
-                else:
-                    label = 0
-                self.algo_labels[a][i] = label
+        self.costs = costs = self._get_cost_matrix()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            best = np.fmin.reduce(costs, axis=0)  # ignoring nan
+            good = best / costs >= epsilon
+        if self.cutoff:
+            good &= ~(costs >= self.cutoff)
+        good |= costs == 0
+        self.labels = good.astype(np.int64)  # algorithms x instances
+        self.algo_labels = {a: dict(zip(self.insts, self.labels[idx].tolist()))
+                            for idx, a in enumerate(self.algorithms)}
         self.logger.debug("Labeling instances in %.2f secs.", time.time() - start)
 
 # -~-~-~-~ FOOTPRINT
@@ -182,12 +196,7 @@ class AlgorithmFootprintPlotter(object):
         """
         Calculating the footprint within a portfolio using convex hulls that
         depend on density and purity thresholds.
-        (algorithm 1 in Smith-Miles 2014)
-
-        We use 3 ways to refer to an instance here:
-        name: the name (unique!) of the instance
-        feat2d: the position as np.array
-        tup: the tuple-version of feat2d (hashable...)
+        (algorithm 1 in Smith-Miles 2014, see footprint_area)
 
         Parameters
         ----------
@@ -204,114 +213,53 @@ class AlgorithmFootprintPlotter(object):
         footprint: float
             the size of all resulting convex hulls
         """
-        def get_2NN(x, X):
-            """ Return indices in X of two nearest points in X to x. """
-            # map index to dist from point
-            dist = [(i, np.linalg.norm(tmp - x)) for i, tmp in enumerate(X)]
-            # sort after dist
-            dist = sorted(dist, key=lambda x: x[1])
-            # return indices of the two smallest values
-            return (dist[0][0], dist[1][0])
-
-        count_exceptions = 0
-
-        # -~-~ Initialise Stage
-        # Map inst-names to feat2d (np.array) and tup (tuple)
-        inst_feat2d = {i: self.features_2d[idx] for idx, i in enumerate(self.insts)}
-        inst_tup = {i: tuple(pos) for i, pos in inst_feat2d.items()}  # noqa
-
-        # regions maps tuple(centroid) of region to inst-names in region
-        regions = OrderedDict()
-
-        # Instances (by name) in not_in_region
-        not_in_region = self.insts[:]
-
-        # Randomly select a good instance;
-        good = [i for i in self.insts if self.algo_labels[a][i] == 1]
-        if len(good) < 3:
-            self.logger.debug("Less than 3 good instances found in %s, footprint"
-                              " not calculated.", self.algo_name[a])
-            return 0
-
-        # Repeat until no more triangles can be formed (at least 3 points left).
-        while (len(not_in_region) >= 3):
-            # Select random good instance TODO also from in_regions?!?!
-            rand_good = self.rng.choice(good)
-            try:
-                not_in_region.remove(rand_good)  # Remove here so it's not its own nearest neighbor
-            except ValueError:
-                pass
-
-            # Form a closed region (triangle) with the two closest (smallest
-            #        Euclidean distance in feature space) instances to
-            #        rand_good, not already part of a triangle;
-            idx1, idx2 = get_2NN(inst_feat2d[rand_good],
-                                 [inst_feat2d[i] for i in not_in_region])
-
-            triangle = (rand_good, not_in_region[idx1], not_in_region[idx2])  # names
-            triangle_feat = np.array([inst_feat2d[i] for i in triangle])
-            centroid = np.sum(np.array(triangle_feat), axis=0)/len(triangle)
-            regions[tuple(centroid)] = triangle
-            for p in triangle:
-                try:
-                    not_in_region.remove(p)
-                except ValueError:
-                    pass
-
-        # -~-~ Merge Stage
-        # Repeat the Merge Stage until there are no more pairs to consider.
-        # If we iterated over whole list once, we are done.
-        stop = False
-        while not stop:
-            stop = True
-            centroids = list(regions.keys())
-            self.rng.shuffle(centroids)
-            # Randomly select a closed region;
-            for idx, cent in enumerate(centroids):
-                reg = regions[cent]          # inst-names!
-                cent_array = np.array(cent)  # Keys in dict are tuples!
-
-                # Find the closest closed region (minimum Euclidean
-                #   centroid distance);
-                remaining_centroids = [np.array(c) for c in regions.keys() if not c == cent]
-                idx = get_2NN(cent_array, remaining_centroids)[0]
-                nearest_cent = tuple(remaining_centroids[idx])
-                nearest_reg = regions[nearest_cent]  # inst-names!
-
-                # Check purity and density
-                new_reg = tuple(set(reg) | set(nearest_reg))  # names
-                new_reg_array = np.array([inst_feat2d[i] for i in new_reg])  # array
-                try:
-                    combined_hull = spatial.ConvexHull(new_reg_array)
-                except spatial.qhull.QhullError:
-                    count_exceptions += 1
-                    continue
-                density = len(new_reg)/combined_hull.volume
-                purity = (len([i for i in reg if i in good]) +
-                          len([i for i in nearest_reg if i in good])) / float(len(new_reg))
-                if density > density_threshold and purity > purity_threshold:
-                    self.logger.debug("Purity: %f, density: %f", purity, density)
-                    regions.pop(cent)
-                    regions.pop(nearest_cent)
-                    new_centroid = tuple(np.sum(new_reg_array, axis=0)/len(new_reg))
-                    regions[new_centroid] = new_reg
-                    stop = False
-                    break
+        good = self.labels[self.algorithms.index(a)] == 1
+        return footprint_area(self.features_2d, good, density_threshold, purity_threshold, self.rng, self.logger,
+                              self.algo_name[a])
+
+    def footprints(self, density_thresholds, purity_thresholds, algorithms=None, n_jobs=1):
+        """
+        Footprints of multiple algorithms over a grid of density and purity thresholds, computed in a process pool.
+        The reduced instance features are passed to each process once, each footprint is seeded individually (so the
+        result does not depend on n_jobs).
 
-        # We now have final regions -> return sum of individual convex hulls
-        area = 0
-        for reg in regions.values():
-            try:
-                hull = spatial.ConvexHull(np.array([inst_feat2d[p] for p in reg]))
-                area += hull.volume
-            except spatial.qhull.QhullError:
-                count_exceptions += 1
-                pass
-        self.logger.debug("Area for %s is %f (%d Qhull-exceptions, %d/%d good "
-                          "insts, %d regions)",
-                          self.algo_name[a], area, count_exceptions, len(good),
-                          len(self.insts), len(regions))
-        return area
+        Parameters
+        ----------
+        density_thresholds, purity_thresholds: List[float]
+            grid of thresholds
+        algorithms: List[Configuration]
+            algorithms to get footprints of, defaults to all algorithms
+        n_jobs: int
+            number of processes
+
+        Returns
+        -------
+        footprints: pd.DataFrame
+            columns algorithm (name), density, purity, area and good (number of good instances)
+        """
+        algorithms = algorithms if algorithms is not None else self.algorithms
+        tasks = []
+        for a in algorithms:
+            good = self.labels[self.algorithms.index(a)] == 1
+            for density, purity in itertools.product(density_thresholds, purity_thresholds):
+                tasks.append((self.algo_name[a], good, density, purity, self.rng.randint(MAXINT)))
+        self.logger.debug("Computing %d footprints (%d algorithms) with %d processes", len(tasks), len(algorithms),
+                          n_jobs)
+
+        start = time.time()
+        n_jobs = min(n_jobs, len(tasks))
+        if n_jobs <= 1:
+            _init_footprint_worker(self.features_2d)
+            areas = [_footprint_task(*task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_footprint_worker,
+                                     initargs=(self.features_2d,)) as executor:
+                areas = list(executor.map(_footprint_task, *zip(*tasks)))
+        self.logger.debug("Computed footprints in %.2f secs.", time.time() - start)
+
+        return pd.DataFrame([(name, density, purity, area, int(good.sum()))
+                             for (name, good, density, purity, _), area in zip(tasks, areas)],
+                            columns=['algorithm', 'density', 'purity', 'area', 'good'])
 
 # -~-~-~ PLOTS
     def _get_good_bad(self, conf, insts=[]):
@@ -327,29 +275,54 @@ class AlgorithmFootprintPlotter(object):
 
         Returns
         -------
-        outpath: str
-            output path
+        good_idx, bad_idx: np.array, np.array
+            indices of good and bad instances (in self.insts)
         """
-        if len(insts) == 0:
-            insts = self.insts
-
-        good_idx, bad_idx = [], []
-        for k, v in self._get_cost(conf).items():
-            # Only consider passed insts
-            if k not in insts:
-                continue
-            # Append inst-idx either to good or to bad
-            if self.algo_labels[conf][k] == 0:
-                bad_idx.append(self.insts.index(k))
-            else:
-                good_idx.append(self.insts.index(k))
-        assert(len(good_idx) == len(set(good_idx)))
-        assert(len(bad_idx) == len(set(bad_idx)))
-        good_idx, bad_idx = np.array(good_idx), np.array(bad_idx)
+        idx = self.algorithms.index(conf)
+        # Only consider passed insts with costs
+        considered = ~np.isnan(self.costs[idx])
+        if len(insts) > 0:
+            considered &= np.isin(self.insts, list(insts))
+        good_idx = np.flatnonzero(considered & (self.labels[idx] == 1))
+        bad_idx = np.flatnonzero(considered & (self.labels[idx] == 0))
         self.logger.debug("for config %s good: %d, bad: %d",
                           self.algo_name[conf], len(good_idx), len(bad_idx))
         return (good_idx, bad_idx)
 
+    def plot_footprint_areas(self, footprints):
+        """ Interactive plot of footprint areas over the density thresholds, one line per algorithm and purity
+        threshold (click on the legend to hide lines).
+
+        Parameters
+        ----------
+        footprints: pd.DataFrame
+            as returned by footprints
+
+        Returns
+        -------
+        plot: bokeh.plotting.figure
+            plot
+        """
+        hover = HoverTool(tooltips=[('algorithm', '@algorithm'),
+                                    ('density', '@density'),
+                                    ('purity', '@purity'),
+                                    ('area', '@area'),
+                                    ('good instances', '@good'),
+                                    ])
+        p = figure(plot_height=500, plot_width=700, x_axis_type='log',
+                   tools=[hover, 'save', 'wheel_zoom', 'box_zoom', 'pan', 'reset'])
+        groups = list(footprints.groupby(['algorithm', 'purity'], sort=False))
+        colors = itertools.cycle(Category20[20])
+        for ((name, purity), group), color in zip(groups, colors):
+            source = ColumnDataSource(data=group.sort_values('density'))
+            legend = '{} (purity {})'.format(name, purity)
+            p.line(x='density', y='area', source=source, color=color, legend=legend)
+            p.circle(x='density', y='area', source=source, color=color, legend=legend)
+        p.legend.click_policy = 'hide'
+        p.legend.location = 'top_right'
+        p.xaxis.axis_label, p.yaxis.axis_label = 'density threshold', 'footprint area'
+        return p
+
     def plot_interactive_footprint(self):
         """Use bokeh to create an interactive algorithm footprint with zoom and
         hover tooltips. Should avoid problems with overplotting (since we can
@@ -370,7 +343,8 @@ class AlgorithmFootprintPlotter(object):
             source.add([cost[i] for i in instances], '{}_cost'.format(name))
             # TODO should be in function
             good, bad = self._get_good_bad(config)
-            color = [1 if idx in good else 0 for idx, i in enumerate(instances)]
+            color = np.zeros(len(instances), dtype=bool)
+            color[good] = True
             # TODO end
             color = ['blue' if c else 'red' for c in color]
             self.logger.debug("%s colors: %s", name, str(color))
@@ -545,3 +519,312 @@ class AlgorithmFootprintPlotter(object):
                           str({k: len(v) for k, v in cluster_dict.items()}))
 
         return clusters, cluster_dict
+
+
+# Reduced instance features in processes of AlgorithmFootprintPlotter.footprints
+_SHARED_FEATURES = None
+
+
+def _init_footprint_worker(features_2d):
+    global _SHARED_FEATURES
+    _SHARED_FEATURES = features_2d
+
+
+def _footprint_task(name, good, density_threshold, purity_threshold, seed):
+    """ Footprint of one algorithm in a process, on the shared features """
+    logger = logging.getLogger(AlgorithmFootprintPlotter.__module__ + '.' + AlgorithmFootprintPlotter.__name__)
+    return footprint_area(_SHARED_FEATURES, good, density_threshold, purity_threshold, np.random.RandomState(seed),
+                          logger, name)
+
+
+def footprint_area(features_2d, good, density_threshold, purity_threshold, rng, logger=None, name=''):
+    """
+    Calculating the footprint of an algorithm using convex hulls that depend on density and purity thresholds.
+    (algorithm 1 in Smith-Miles 2014)
+
+    Parameters
+    ----------
+    features_2d: np.array
+        reduced instance features, shape (n_instances, 2)
+    good: np.array
+        boolean mask, whether the algorithm is good on an instance
+    density_threshold: float
+        minimum density that regions must show to be merged
+    purity_threshold: float
+        minimum purity (percentage of good instance) that regions must show to be merged
+    rng: np.random.RandomState
+        random state
+    logger: logging.Logger
+        logger
+    name: str
+        name of the algorithm (for logging)
+
+    Returns
+    -------
+    footprint: float
+        the size of all resulting convex hulls
+    """
+    logger = logger if logger is not None else logging.getLogger(__name__)
+    count_exceptions = 0
+
+    # -~-~ Initialise Stage
+    # regions maps tuple(centroid) of region to instances (by index) in region
+    regions = OrderedDict()
+
+    # Instances (by index) not in a region, with a spatial index for nearest-neighbour queries
+    not_in_region = _DynamicKDTree(features_2d)
+
+    # Randomly select a good instance;
+    good_idx = np.flatnonzero(good)
+    if len(good_idx) < 3:
+        logger.debug("Less than 3 good instances found in %s, footprint not calculated.", name)
+        return 0
+
+    # Repeat until no more triangles can be formed (at least 3 points left).
+    while (len(not_in_region) >= 3):
+        # Select random good instance TODO also from in_regions?!?!
+        rand_good = good_idx[rng.choice(len(good_idx))]
+        not_in_region.remove(rand_good)  # Remove here so it's not its own nearest neighbor
+
+        # Form a closed region (triangle) with the two closest (smallest
+        #        Euclidean distance in feature space) instances to
+        #        rand_good, not already part of a triangle;
+        idx1, idx2 = not_in_region.query(features_2d[rand_good], 2)
+
+        triangle = (rand_good, idx1, idx2)
+        centroid = np.sum(features_2d[list(triangle)], axis=0)/len(triangle)
+        regions[tuple(centroid)] = triangle
+        not_in_region.remove(idx1)
+        not_in_region.remove(idx2)
+
+    # -~-~ Merge Stage
+    regions, merge_exceptions = _merge_regions(features_2d, list(regions.values()), good, density_threshold,
+                                               purity_threshold, rng, logger)
+    count_exceptions += merge_exceptions
+
+    # We now have final regions -> return sum of individual convex hulls
+    area = 0
+    for reg in regions:
+        try:
+            hull = spatial.ConvexHull(reg['hull_points'])
+            area += hull.volume
+        except spatial.qhull.QhullError:
+            count_exceptions += 1
+            pass
+    logger.debug("Area for %s is %f (%d Qhull-exceptions, %d/%d good insts, %d regions)",
+                 name, area, count_exceptions, len(good_idx), len(features_2d), len(regions))
+    return area
+
+
+def _merge_regions(features_2d, regions, good, density_threshold, purity_threshold, rng, logger):
+    """
+    Merge stage of the footprint: merge regions with their closest region (minimum Euclidean centroid distance),
+    if the merged region is dense and pure enough, until no region can be merged with its closest region.
+
+    Instead of rescanning all regions (in random order) after every merge, the closest pairs are kept in a heap
+    (closest first, ties broken randomly) with a KD-tree over the centroids. After a merge, only regions whose
+    closest region changed (the merged regions were closest or the new centroid is closer) are evaluated again. Those
+    are found with a radius query around the new centroid, bounded by the largest distance of a region to its closest.
+
+    Parameters
+    ----------
+    features_2d: np.array
+        reduced instance features, shape (n_instances, 2)
+    regions: List[Tuple[int]]
+        instances (by index) per region
+    good: np.array
+        boolean mask, whether the algorithm is good on an instance
+    density_threshold: float
+        minimum density that regions must show to be merged
+    purity_threshold: float
+        minimum purity (percentage of good instance) that regions must show to be merged
+    rng: np.random.RandomState
+        random state (to break ties)
+    logger: logging.Logger
+        logger
+
+    Returns
+    -------
+    regions: List[dict]
+        final regions with 'insts' (set of instance-indices) and 'hull_points' (points with the same convex hull as
+        all instances in the region)
+    count_exceptions: int
+        number of Qhull-exceptions
+    """
+    # Merged regions are appended, so there are at most twice as many regions as in the beginning
+    regs = [{'insts': set(reg),
+             'sum': np.sum(features_2d[list(reg)], axis=0),
+             'good': int(good[list(reg)].sum()),
+             'hull_points': features_2d[list(reg)]} for reg in regions]
+    tree = _DynamicKDTree(np.array([reg['sum'] / len(reg['insts']) for reg in regs]), capacity=2 * len(regs))
+    nearest = np.full(2 * len(regs), -1, dtype=np.int64)
+    nearest_dist = np.full(2 * len(regs), np.inf)
+    nearest_of = [set() for _ in range(2 * len(regs))]  # reverse of nearest
+    version = np.zeros(2 * len(regs), dtype=np.int64)
+    heap = []
+    farthest = []  # max-heap of nearest_dist (with outdated entries), bounds the search for regions closer to a new one
+    count_exceptions = 0
+
+    def update_nearest(idx):
+        """ Find closest region of idx and (re-)schedule its evaluation """
+        if nearest[idx] >= 0:
+            nearest_of[nearest[idx]].discard(idx)
+        version[idx] += 1
+        if len(tree) < 2:
+            nearest[idx], nearest_dist[idx] = -1, np.inf
+            return
+        ids, dists = tree.query(tree.points[idx], 2, return_distance=True)
+        nearest[idx], nearest_dist[idx] = (ids[1], dists[1]) if ids[0] == idx else (ids[0], dists[0])
+        nearest_of[nearest[idx]].add(idx)
+        heapq.heappush(heap, (nearest_dist[idx], rng.rand(), idx, version[idx]))
+        heapq.heappush(farthest, (-nearest_dist[idx], idx, version[idx]))
+
+    def max_nearest_dist():
+        """ Largest distance of an alive region to its closest region """
+        while farthest and not (tree.alive[farthest[0][1]] and farthest[0][2] == version[farthest[0][1]]):
+            heapq.heappop(farthest)
+        return -farthest[0][0] if farthest else np.inf
+
+    for idx in range(len(regs)):
+        update_nearest(idx)
+
+    while heap:
+        _, _, idx, idx_version = heapq.heappop(heap)
+        if not tree.alive[idx] or idx_version != version[idx]:
+            continue  # merged or closest region changed since
+        reg, nearest_reg = regs[idx], regs[nearest[idx]]
+
+        # Check purity and density (the convex hull of the merged region is the convex hull of both hulls)
+        small, large = sorted([reg['insts'], nearest_reg['insts']], key=len)
+        shared = [i for i in small if i in large]
+        n_insts = len(small) + len(large) - len(shared)
+        try:
+            combined_hull = spatial.ConvexHull(np.concatenate([reg['hull_points'], nearest_reg['hull_points']]))
+        except spatial.qhull.QhullError:
+            count_exceptions += 1
+            continue
+        density = n_insts / combined_hull.volume
+        purity = (reg['good'] + nearest_reg['good']) / float(n_insts)
+        if not (density > density_threshold and purity > purity_threshold):
+            continue
+        logger.debug("Purity: %f, density: %f", purity, density)
+
+        # Merge (reusing the larger set of instances, the merged regions are not needed anymore)
+        merged = {'insts': large,
+                  'sum': reg['sum'] + nearest_reg['sum'] - features_2d[shared].sum(axis=0),
+                  'good': reg['good'] + nearest_reg['good'] - int(good[shared].sum()),
+                  'hull_points': combined_hull.points[combined_hull.vertices]}
+        merged['insts'].update(small)
+        regs.append(merged)
+        old = (idx, nearest[idx])
+        for o in old:
+            tree.remove(o)
+        new_idx = tree.add(merged['sum'] / len(merged['insts']))
+        update_nearest(new_idx)
+        # Regions that had a merged region as closest or that are closer to the new region than to their closest
+        # (only regions within the largest distance to a closest region can be closer, with slack for rounding)
+        candidates = tree.query_radius(tree.points[new_idx], max_nearest_dist() * (1 + 1e-9))
+        diff = tree.points[candidates] - tree.points[new_idx]
+        closer = candidates[np.einsum('ij,ij->i', diff, diff) < nearest_dist[candidates] ** 2]
+        for o in set(closer) | nearest_of[old[0]] | nearest_of[old[1]]:
+            if tree.alive[o] and o != new_idx:
+                update_nearest(o)
+
+    return [regs[idx] for idx in np.flatnonzero(tree.alive[:tree.size])], count_exceptions
+
+
+class _DynamicKDTree(object):
+    """ Nearest-neighbour queries on a changing set of points (cKDTree with lazy deletion). Removed points are skipped
+    in queries until a quarter of the points in the tree is removed, added points are searched exhaustively until
+    there are more than about sqrt(n) of them. Then the tree is rebuilt. """
+
+    def __init__(self, points, capacity=None):
+        """
+        Parameters
+        ----------
+        points: np.array
+            initial points, shape (n_points, n_dims), referred to by their index
+        capacity: int
+            maximum number of points (including added ones)
+        """
+        points = np.asarray(points, dtype=np.float64)
+        self.size = len(points)
+        self.points = np.zeros((max(capacity or 0, self.size), points.shape[1]))
+        self.points[:self.size] = points
+        self.alive = np.zeros(len(self.points), dtype=bool)
+        self.alive[:self.size] = True
+        self.n_alive = self.size
+        self._build()
+
+    def _build(self):
+        self._ids = np.flatnonzero(self.alive)
+        self._tree = spatial.cKDTree(self.points[self._ids]) if len(self._ids) > 0 else None
+        self._removed = 0  # removed points still in the tree
+        self._added = set()  # points not in the tree yet
+
+    def __len__(self):
+        return self.n_alive
+
+    def _changed(self):
+        # Added points are searched exhaustively, so there should be no more than about sqrt(n) of them
+        if (self._removed * 4 > len(self._ids) or len(self._added) ** 2 > max(len(self._ids), 256)) and \
+                self.n_alive > 0:
+            self._build()
+
+    def remove(self, idx):
+        """ Remove point idx (if not already removed) """
+        if not self.alive[idx]:
+            return
+        self.alive[idx] = False
+        self.n_alive -= 1
+        if idx in self._added:
+            self._added.discard(idx)
+        else:
+            self._removed += 1
+        self._changed()
+
+    def add(self, point):
+        """ Add a point and return its index """
+        idx = self.size
+        self.points[idx] = point
+        self.alive[idx] = True
+        self.size += 1
+        self.n_alive += 1
+        self._added.add(idx)
+        self._changed()
+        return idx
+
+    def query(self, x, k, return_distance=False):
+        """ Indices (and distances) of the k nearest remaining points to x, ties are broken by index (as a stable sort
+        would) """
+        k = min(k, self.n_alive)
+        ids = np.fromiter(self._added, dtype=np.int64, count=len(self._added))
+        diff = self.points[ids] - x
+        dist = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+        n_tree = min(k, len(self._ids) - self._removed)
+        if n_tree > 0:
+            n_query = min(len(self._ids), 2 * n_tree + 4)
+            while True:
+                tree_dist, pos = self._tree.query(x, k=n_query)
+                tree_dist, tree_ids = np.atleast_1d(tree_dist), self._ids[np.atleast_1d(pos)]
+                alive = self.alive[tree_ids]
+                # Enough remaining points and no more points at the distance of the last one outside of the result
+                if alive.sum() >= n_tree and (n_query == len(self._ids) or
+                                              tree_dist[-1] > tree_dist[alive][n_tree - 1]):
+                    break
+                n_query = min(len(self._ids), 2 * n_query)
+            ids, dist = np.concatenate([ids, tree_ids[alive]]), np.concatenate([dist, tree_dist[alive]])
+        order = np.lexsort((ids, dist))[:k]
+        return (ids[order], dist[order]) if return_distance else ids[order]
+
+    def query_radius(self, x, r):
+        """ Indices of the remaining points within distance r of x (unordered) """
+        if not np.isfinite(r):
+            return np.flatnonzero(self.alive[:self.size])
+        ids = np.fromiter(self._added, dtype=np.int64, count=len(self._added))
+        diff = self.points[ids] - x
+        ids = ids[np.einsum('ij,ij->i', diff, diff) <= r ** 2]
+        if self._tree is not None:
+            tree_ids = self._ids[np.asarray(self._tree.query_ball_point(x, r), dtype=np.int64)]
+            ids = np.concatenate([ids, tree_ids[self.alive[tree_ids]]])
+        return ids
@@ -6,33 +6,45 @@ __maintainer__ = "Joshua Marben"
 __email__ = "marbenj@cs.uni-freiburg.de"
 
 import copy
+import hashlib
 import logging
 import os
 import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
-from ConfigSpace import CategoricalHyperparameter
 from ConfigSpace.configuration_space import Configuration, ConfigurationSpace
-from ConfigSpace.util import impute_inactive_values
 from bokeh.layouts import column, row, widgetbox
 from bokeh.models import HoverTool, ColorBar, LinearColorMapper, BasicTicker, CustomJS, Slider
-from bokeh.models.filters import GroupFilter, BooleanFilter
+from bokeh.models.filters import IndexFilter
 from bokeh.models.sources import CDSView
 from bokeh.models.widgets import CheckboxButtonGroup, RadioButtonGroup, Button, Div
 from bokeh.plotting import figure, ColumnDataSource
+from bokeh.transform import factor_cmap, factor_mark
 from sklearn.decomposition import PCA
 from sklearn.manifold import MDS
 from sklearn.preprocessing import StandardScaler
 from smac.epm.rf_with_instances import RandomForestWithInstances
 from smac.runhistory.runhistory import RunHistory
 from smac.scenario.scenario import Scenario
+from smac.tae.execute_ta_run import StatusType
 from smac.utils.constants import MAXINT
 
-from cave.utils.convert_for_epm import convert_data_for_epm
+from cave.plot.configurator_footprint_static import plot_footprint_frames, save_animation
+from cave.utils.configspace_structure import get_configspace_structure
+from cave.utils.convert_for_epm import convert_data_for_epm, runhistory_to_arrays, impute_default_values
+from cave.utils.distances import pairwise_config_distances, config_distances
+from cave.utils.embeddings import select_landmarks, landmark_mds, config_features, feature_embedding, \
+    normalized_stress, sampled_normalized_stress, embedding_cache_path, EMBEDDINGS
 from cave.utils.helpers import escape_parameter_name, get_config_origin, combine_runhistories
 from cave.utils.io import export_bokeh
+from cave.utils.marginalized_forest import predict_marginalized_over_instances
 from cave.utils.timing import timing
 
+# Colors of the configuration types (Candidate, Incumbent, Final Incumbent, Default)
+TYPE_COLORS = OrderedDict([('Candidate', 'white'), ('Incumbent', 'red'), ('Final Incumbent', 'red'),
+                           ('Default', 'orange')])
 
 class ConfiguratorFootprintPlotter(object):
 
@@ -49,6 +61,14 @@ class ConfiguratorFootprintPlotter(object):
                  timeslider_log: bool=True,
                  rng=None,
                  output_dir: str=None,
+                 n_jobs: int=1,
+                 embedding: str='mds',
+                 num_landmarks: int=500,
+                 landmark_method: str='classical',
+                 max_contour_points: int=40000,
+                 static_renderer: str='matplotlib',
+                 animation: str=None,
+                 compact_epm_data: bool=False,
                  ):
         """
         Creating an interactive plot, visualizing the configuration search space.
@@ -73,7 +93,7 @@ class ConfiguratorFootprintPlotter(object):
             step size of meshgrid to compute contour of fitness landscape
         use_timeslider: bool
             whether or not to have a time_slider-widget on cfp-plot
-            INCREASES FILE-SIZE DRAMATICALLY
+            adds about one byte per configuration and quantile to the report
         num_quantiles: int
             number of quantiles for the slider/ number of static pictures
         timeslider_log: bool
@@ -82,6 +102,27 @@ class ConfiguratorFootprintPlotter(object):
             random number generator
         output_dir: str
             output directory
+        n_jobs: int
+            number of threads/jobs to compute distances and embeddings with
+        embedding: str
+            how to embed the configurations into 2d, one of 'mds' (sklearn's MDS on the full distance matrix),
+            'landmark_mds' (MDS on num_landmarks landmarks, triangulation of the other configurations), 'pca',
+            'random_projection' or 'spectral' (embeddings of a feature representation of the configurations). Embeddings
+            are cached in output_dir.
+        num_landmarks: int
+            number of landmarks for landmark_mds (default, incumbents and a stratified sample)
+        landmark_method: str
+            'classical' or 'smacof', MDS-method to embed the landmarks with
+        max_contour_points: int
+            maximum number of points in the meshgrid of a contour, the step size is increased if necessary
+        static_renderer: str
+            'matplotlib' (parallel with n_jobs processes, headless) or 'bokeh' (needs selenium and phantomjs) to
+            create the static pictures of the quantiles
+        animation: str
+            if 'gif' or 'apng' and static_renderer is 'matplotlib', the static pictures are also combined into an
+            animation
+        compact_epm_data: bool
+            build the EPM-data for the contours in float32, see cave.utils.convert_for_epm
         """
         self.logger = logging.getLogger(self.__module__ + '.' + self.__class__.__name__)
         self.rng = rng
@@ -99,12 +140,25 @@ class ConfiguratorFootprintPlotter(object):
         self.contour_step_size = contour_step_size
         self.output_dir = output_dir
         self.timeslider_log = timeslider_log
+        self.n_jobs = n_jobs
+        self.compact_epm_data = compact_epm_data
+        self.embedding = embedding
+        self.num_landmarks = num_landmarks
+        self.landmark_method = landmark_method
+        self.max_contour_points = max_contour_points
+        self.static_renderer = static_renderer
+        self.animation = animation
+        if self.embedding not in EMBEDDINGS:
+            raise ValueError("Unknown embedding %s for configurator footprint, choose from %s" %
+                             (self.embedding, ", ".join(EMBEDDINGS)))
+        self.embedding_quality = None  # normalized stress of the embedding, set in run()
+        self.animation_path = None  # path to the animation of the static pictures, if created in run()
 
         # Preprocess input
         self.default = scenario.cs.get_default_configuration()
         self.final_incumbent = final_incumbent
 
-        self.configs_in_run = {label : rh.get_all_configs() for label, rh in zip(self.rh_labels, self.rhs)}
+        self.configs_in_run = {label : set(rh.get_all_configs()) for label, rh in zip(self.rh_labels, self.rhs)}
 
     def run(self):
         """
@@ -115,18 +169,16 @@ class ConfiguratorFootprintPlotter(object):
         self.combined_rh = self.reduce_runhistory(self.combined_rh, self.max_plot, keep=[a for b in self.incs for a in b]+[default])
         conf_matrix, conf_list, runs_per_quantile, timeslider_labels = self.get_conf_matrix(self.combined_rh, self.incs)
         self.logger.debug("Number of Configurations: %d", conf_matrix.shape[0])
-        dists = self.get_distance(conf_matrix, self.scenario.cs)
-        red_dists = self.get_mds(dists)
+        red_dists = self.get_embedding(conf_matrix, conf_list, [a for b in self.incs for a in b] + [default])
 
-        contour_data = {}
+        contour_rhs = {}
         if not any([label.startswith('budget') for label in self.rh_labels]):
-            contour_data['combined'] = self.get_pred_surface(self.combined_rh, X_scaled=red_dists,
-                                                             conf_list=copy.deepcopy(conf_list),
-                                                             contour_step_size=self.contour_step_size)
+            contour_rhs['combined'] = self.combined_rh
         for label, rh in zip(self.rh_labels, self.rhs):
-            contour_data[label] = self.get_pred_surface(self.combined_rh, X_scaled=red_dists,
-                                                        conf_list=copy.deepcopy(conf_list),
-                                                        contour_step_size=self.contour_step_size)
+            # Only configurations that are plotted can be mapped to the embedding
+            contour_rhs[label] = self._restrict_runhistory(rh, conf_list)
+        contour_data = self.get_pred_surfaces(contour_rhs, X_scaled=red_dists, conf_list=conf_list,
+                                              contour_step_size=self.contour_step_size)
 
         return self.plot(red_dists,
                          conf_list,
@@ -136,6 +188,117 @@ class ConfiguratorFootprintPlotter(object):
                          use_timeslider=self.use_timeslider,
                          timeslider_labels=timeslider_labels)
 
+    @timing
+    def get_embedding(self, conf_matrix, conf_list, fixed_landmarks):
+        """
+        Embed the configurations into 2d using the chosen embedding and compute its normalized stress (on all
+        configurations for 'mds', else on a sample) as quality metric. Embeddings are cached in the output-directory
+        and reused if configurations and parameters of the embedding (including seed and fixed landmarks) are
+        unchanged. A seed is drawn from self.rng in any case, so later random numbers do not depend on cache hits.
+
+        Parameters
+        ----------
+        conf_matrix: np.array
+            numpy array with cols as parameter values
+        conf_list: list
+            list of Configuration objects (same order as conf_matrix)
+        fixed_landmarks: List[Configuration]
+            configurations that should be landmarks for landmark_mds (e.g. default and incumbents)
+
+        Returns
+        -------
+        np.array
+            scaled coordinates in 2-dim room
+        """
+        seed = self.rng.randint(MAXINT)
+        fixed_landmarks = set(fixed_landmarks)
+        fixed = [idx for idx, c in enumerate(conf_list) if c in fixed_landmarks]
+        cache_path = None
+        if self.output_dir:
+            params = {'method': self.embedding}
+            if self.embedding == 'landmark_mds':
+                # Landmarks are the only random (seeded) part of the embeddings
+                params.update({'num_landmarks': self.num_landmarks, 'landmark_method': self.landmark_method,
+                               'seed': seed, 'fixed_landmarks': fixed})
+            cache_path = embedding_cache_path(os.path.join(self.output_dir, 'analysis_data'), conf_matrix, **params)
+            if os.path.exists(cache_path):
+                with np.load(cache_path) as cached:
+                    self.embedding_quality = float(cached['stress'])
+                    self.logger.debug("Loaded cached embedding from %s", cache_path)
+                    return cached['coords']
+
+        is_cat, depth = self._get_categorical_and_depth(self.scenario.cs)
+        if self.embedding == 'mds':
+            dists = self.get_distance(conf_matrix, self.scenario.cs)
+            coords = self.get_mds(dists)
+            self.embedding_quality = normalized_stress(dists, coords)
+        else:
+            if self.embedding == 'landmark_mds':
+                coords = self.get_landmark_mds(conf_matrix, fixed, np.random.RandomState(seed))
+            else:
+                coords = feature_embedding(config_features(conf_matrix, is_cat, depth), self.embedding,
+                                           n_jobs=self.n_jobs)
+            self.embedding_quality = sampled_normalized_stress(conf_matrix, coords, is_cat, depth, n_jobs=self.n_jobs)
+        self.logger.info("Embedded %d configurations with %s (normalized stress: %.4f)", len(conf_list),
+                         self.embedding, self.embedding_quality)
+
+        if cache_path:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            np.savez(cache_path, coords=coords, stress=self.embedding_quality)
+        return coords
+
+    @timing
+    def get_pred_surfaces(self, rhs, X_scaled, conf_list: list, contour_step_size):
+        """Compute contour data for multiple runhistories (see get_pred_surface). Runhistories that lead to identical
+        training data are only computed once, distinct surfaces are computed in a process pool with n_jobs workers.
+
+        Parameters
+        ----------
+        rhs: Dict[str -> RunHistory]
+            label to runhistory
+        X_scaled: np.array
+            configurations in scaled 2dim
+        conf_list: list
+            list of Configuration objects
+        contour_step_size: float
+            step-size for contour
+
+        Returns
+        -------
+        contour_data: Dict[str -> (np.array, np.array, np.array)]
+            label to x, y, Z for contour plots
+        """
+        xx, yy = self._get_meshgrid(X_scaled, contour_step_size)
+        grid = np.c_[xx.ravel(), yy.ravel()]
+
+        label_to_key, inputs = {}, {}
+        for label, rh in rhs.items():
+            if len(rh.data) == 0:
+                self.logger.debug("No runs of plotted configurations for %s, skipping contour", label)
+                continue
+            X_trans, y, instance_features = self._get_surface_data(rh, X_scaled, conf_list)
+            sha = hashlib.sha1()
+            for array in (X_trans, y, instance_features):
+                sha.update(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+            label_to_key[label] = sha.hexdigest()
+            inputs.setdefault(label_to_key[label], (X_trans, y, instance_features))
+        self.logger.debug("Computing %d distinct contour surfaces for %d labels", len(inputs), len(label_to_key))
+
+        keys = list(inputs.keys())
+        args = [inputs[k] + (grid, self.rng.randint(MAXINT)) for k in keys]
+        n_jobs = min(self.n_jobs, len(keys))
+        start = time.time()
+        if n_jobs > 1:
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                surfaces = list(executor.map(_fit_and_predict_surface, *zip(*args)))
+        else:
+            surfaces = [_fit_and_predict_surface(*a) for a in args]
+        self.logger.debug("Fitting and predicting %d surfaces with %d jobs took %f time", len(keys), n_jobs,
+                          time.time() - start)
+
+        surfaces = dict(zip(keys, surfaces))
+        return {label: (xx, yy, surfaces[key].reshape(xx.shape)) for label, key in label_to_key.items()}
+
     @timing
     def get_pred_surface(self, rh, X_scaled, conf_list: list, contour_step_size):
         """fit epm on the scaled input dimension and
@@ -157,6 +320,48 @@ class ConfiguratorFootprintPlotter(object):
         contour_data: (np.array, np.array, np.array)
             x, y, Z for contour plots
         """
+        return self.get_pred_surfaces({'surface': rh}, X_scaled, conf_list, contour_step_size)['surface']
+
+    def _get_meshgrid(self, X_scaled, contour_step_size):
+        """ Meshgrid around the embedded configurations, the step size is increased to stay within
+        max_contour_points """
+        x_min, x_max = X_scaled[:, 0].min() - 1, X_scaled[:, 0].max() + 1
+        y_min, y_max = X_scaled[:, 1].min() - 1, X_scaled[:, 1].max() + 1
+        num_points = np.ceil((x_max - x_min) / contour_step_size) * np.ceil((y_max - y_min) / contour_step_size)
+        if self.max_contour_points and num_points > self.max_contour_points:
+            new_step_size = np.sqrt((x_max - x_min) * (y_max - y_min) / self.max_contour_points)
+            # Rounding up the number of steps per axis may still exceed the budget by one row/column
+            while np.ceil((x_max - x_min) / new_step_size) * np.ceil((y_max - y_min) / new_step_size) > \
+                    self.max_contour_points:
+                new_step_size *= 1.01
+            self.logger.debug("Increasing contour step-size from %f to %f to stay within %d points",
+                              contour_step_size, new_step_size, self.max_contour_points)
+            contour_step_size = new_step_size
+        xx, yy = np.meshgrid(np.arange(x_min, x_max, contour_step_size),
+                             np.arange(y_min, y_max, contour_step_size))
+
+        self.logger.debug("x_min: %f, x_max: %f, y_min: %f, y_max: %f", x_min, x_max, y_min, y_max)
+        self.logger.debug("Predict on %d samples in grid to get surface (step-size: %f)", xx.size, contour_step_size)
+        return xx, yy
+
+    def _get_surface_data(self, rh, X_scaled, conf_list):
+        """Training data for the contour-epm: configurations are replaced by their embedding and instance features are
+        reduced to at most 2 dims.
+
+        Parameters
+        ----------
+        rh: RunHistory
+            runhistory
+        X_scaled: np.array
+            configurations in scaled 2dim
+        conf_list: list
+            list of Configuration objects
+
+        Returns
+        -------
+        X_trans, y, instance_features: np.array, np.array, np.array
+            training data and instance features for the epm
+        """
         # use PCA to reduce features to also at most 2 dims
         scen = copy.deepcopy(self.scenario)  # pca changes feats
         if scen.feature_array.shape[1] > 2:
@@ -173,19 +378,13 @@ class ConfiguratorFootprintPlotter(object):
 
         # convert the data to train EPM on 2-dim featurespace (for contour-data)
         self.logger.debug("Convert data for epm.")
-        X, y, types = convert_data_for_epm(scenario=scen, runhistory=rh, impute_inactive_parameters=True, logger=self.logger)
-        types = np.array(np.zeros((2 + scen.feature_array.shape[1])), dtype=np.uint)
+        X, y, types = convert_data_for_epm(scenario=scen, runhistory=rh, impute_inactive_parameters=True,
+                                           logger=self.logger, compact=self.compact_epm_data)
         num_params = len(scen.cs.get_hyperparameters())
 
-        # impute missing values in configs and insert MDS'ed (2dim) configs to the right positions
-        conf_dict = {}
-        # Remove forbidden clauses (this is necessary to enable the impute_inactive_values-method, see #226)
-        cs_no_forbidden = copy.deepcopy(conf_list[0].configuration_space)
-        cs_no_forbidden.forbidden_clauses = []
-        for idx, c in enumerate(conf_list):
-            c.configuration_space = cs_no_forbidden
-            conf_list[idx] = impute_inactive_values(c)
-            conf_dict[str(conf_list[idx].get_array())] = X_scaled[idx, :]
+        # impute missing values in configs (as in X, same dtype) and insert MDS'ed (2dim) configs to the right positions
+        conf_matrix = impute_default_values(scen.cs, np.array([c.get_array() for c in conf_list])).astype(X.dtype)
+        conf_dict = {str(x): X_scaled[idx, :] for idx, x in enumerate(conf_matrix)}
 
         # Debug compare elements:
         c1, c2 = {str(z) for z in X}, {str(z) for z in conf_dict.keys()}
@@ -199,38 +398,22 @@ class ConfiguratorFootprintPlotter(object):
             # append scaled config + pca'ed features (total of 4 values) per config/feature-sample
             X_trans.append(np.concatenate((x_scaled_conf, x[num_params:]), axis=0))
         X_trans = np.array(X_trans)
+        self.logger.debug("Shape of X: {}, shape of X_trans: {}".format(X.shape, X_trans.shape))
+        return X_trans, y, np.array(scen.feature_array)
 
-        self.logger.debug("Train random forest for contour-plot. Shape of X: {}, shape of X_trans: {}".format(X.shape, X_trans.shape))
-        self.logger.debug("Faking configspace to be able to train rf...")
-        # We need to fake config-space bypass imputation of inactive values in random forest implementation
-        fake_cs = ConfigurationSpace(name="fake-cs-for-configurator-footprint")
-
-        bounds = np.array([(0, np.nan), (0, np.nan)], dtype=object)
-        model = RandomForestWithInstances(fake_cs,
-                                          types, bounds,
-                                          seed = self.rng.randint(MAXINT),
-                                          instance_features=np.array(scen.feature_array),
-                                          ratio_features=1.0)
-
-        start = time.time()
-        model.train(X_trans, y)
-        self.logger.debug("Fitting random forest took %f time", time.time() - start)
-
-        x_min, x_max = X_scaled[:, 0].min() - 1, X_scaled[:, 0].max() + 1
-        y_min, y_max = X_scaled[:, 1].min() - 1, X_scaled[:, 1].max() + 1
-        xx, yy = np.meshgrid(np.arange(x_min, x_max, contour_step_size),
-                             np.arange(y_min, y_max, contour_step_size))
-
-        self.logger.debug("x_min: %f, x_max: %f, y_min: %f, y_max: %f", x_min, x_max, y_min, y_max)
-        self.logger.debug("Predict on %d samples in grid to get surface (step-size: %f)",
-                          np.c_[xx.ravel(), yy.ravel()].shape[0], contour_step_size)
-
-        start = time.time()
-        Z, _ = model.predict_marginalized_over_instances(np.c_[xx.ravel(), yy.ravel()])
-        Z = Z.reshape(xx.shape)
-        self.logger.debug("Predicting random forest took %f time", time.time() - start)
-
-        return xx, yy, Z
+    def _restrict_runhistory(self, rh: RunHistory, configs):
+        """ Runhistory with only the runs of the given configurations """
+        configs = set(configs)
+        if all([c in configs for c in rh.get_all_configs()]):
+            return rh
+        new_rh = RunHistory()
+        for k, v in list(rh.data.items()):
+            c = rh.ids_config[k.config_id]
+            if c in configs:
+                new_rh.add(config=c, cost=v.cost, time=v.time, status=v.status,
+                           instance_id=k.instance_id, seed=k.seed, budget=k.budget,
+                           additional_info=v.additional_info)
+        return new_rh
 
     @timing
     def get_distance(self, conf_matrix, cs: ConfigurationSpace):
@@ -250,40 +433,18 @@ class ConfiguratorFootprintPlotter(object):
             np.array with distances between configurations i,j in dists[i,j] or dists[j,i]
         """
         self.logger.debug("Calculate distance between configurations.")
-        n_confs = conf_matrix.shape[0]
-        dists = np.zeros((n_confs, n_confs))
-
-        is_cat = []
-        depth = []
-        for _, param in cs._hyperparameters.items():
-            if type(param) == CategoricalHyperparameter:
-                is_cat.append(True)
-            else:
-                is_cat.append(False)
-            depth.append(self.get_depth(cs, param))
-        is_cat = np.array(is_cat)
-        depth = np.array(depth)
+        is_cat, depth = self._get_categorical_and_depth(cs)
+        return pairwise_config_distances(conf_matrix, is_cat, depth, n_jobs=self.n_jobs, logger=self.logger)
 
-        # TODO tqdm
-        start = time.time()
-        for i in range(n_confs):
-            for j in range(i + 1, n_confs):
-                dist = np.abs(conf_matrix[i, :] - conf_matrix[j, :])
-                dist[np.isnan(dist)] = 1
-                dist[np.logical_and(is_cat, dist != 0)] = 1
-                dist = np.sum(dist / depth)
-                dists[i, j] = dist
-                dists[j, i] = dist
-            if 5 < n_confs and i % (n_confs // 5) == 0:
-                self.logger.debug("%.2f%% of all distances calculated in %.2f seconds...", 100 * i / n_confs,
-                                                                                         time.time() - start)
-
-        return dists
+    def _get_categorical_and_depth(self, cs: ConfigurationSpace):
+        """ Boolean mask of categorical parameters and depth of all parameters (to weight distances) """
+        structure = get_configspace_structure(cs)
+        return structure.is_categorical, structure.depth
 
     def get_depth(self, cs: ConfigurationSpace, param: str):
         """
         Get depth in configuration space of a given parameter name
-        breadth search until reaching a leaf for the first time
+        (shortest path to an unconditional parameter, memoized per configuration space)
 
         Parameters
         ----------
@@ -292,21 +453,8 @@ class ConfiguratorFootprintPlotter(object):
         param: str
             name of parameter to inspect
         """
-        parents = cs.get_parents_of(param)
-        if not parents:
-            return 1
-        new_parents = parents
-        d = 1
-        while new_parents:
-            d += 1
-            old_parents = new_parents
-            new_parents = []
-            for p in old_parents:
-                pp = cs.get_parents_of(p)
-                if pp:
-                    new_parents.extend(pp)
-                else:
-                    return d
+        structure = get_configspace_structure(cs)
+        return int(structure.depth[structure.index[param if isinstance(param, str) else param.name]])
 
     @timing
     def get_mds(self, dists):
@@ -325,12 +473,42 @@ class ConfiguratorFootprintPlotter(object):
         """
         # TODO there are ways to extend MDS to provide a transform-method. if
         #   available, train on randomly sampled configs and plot all
-        # TODO MDS provides 'n_jobs'-argument for parallel computing...
-        mds = MDS(n_components=2, dissimilarity="precomputed", random_state=12345)
+        mds = MDS(n_components=2, dissimilarity="precomputed", random_state=12345, n_jobs=self.n_jobs)
         dists = mds.fit_transform(dists)
         self.logger.debug("MDS-stress: %f", mds.stress_)
         return dists
 
+    @timing
+    def get_landmark_mds(self, conf_matrix, fixed, rng):
+        """
+        Compute landmark-MDS: only the distances of all configurations to num_landmarks landmarks are computed, the
+        landmarks are embedded using MDS and the other configurations are triangulated. O(n*k) instead of O(n^2).
+
+        Parameters
+        ----------
+        conf_matrix: np.array
+            numpy array with cols as parameter values
+        fixed: List[int]
+            indices of configurations (rows of conf_matrix) that should be landmarks (e.g. default and incumbents)
+        rng: np.random.RandomState
+            random number generator to sample the other landmarks with
+
+        Returns
+        -------
+        np.array
+            scaled coordinates in 2-dim room
+        """
+        landmarks = select_landmarks(len(conf_matrix), self.num_landmarks, fixed, rng)
+        self.logger.debug("Landmark-MDS with %d landmarks (%d fixed) for %d configurations", len(landmarks),
+                          len(fixed), len(conf_matrix))
+        is_cat, depth = self._get_categorical_and_depth(self.scenario.cs)
+        landmark_dists = config_distances(conf_matrix, conf_matrix[landmarks], is_cat, depth, n_jobs=self.n_jobs)
+        landmark_dists[landmarks, np.arange(len(landmarks))] = 0
+        coords, stress = landmark_mds(landmark_dists, landmarks, method=self.landmark_method)
+        if stress is not None:
+            self.logger.debug("MDS-stress (landmarks): %f", stress)
+        return coords
+
     def reduce_runhistory(self,
                           rh: RunHistory,
                           max_configs: int,
@@ -356,11 +534,12 @@ class ConfiguratorFootprintPlotter(object):
         if max_configs <= 0 or max_configs > len(configs):  # keep all
             return rh
 
-        runs = [(c, len(rh.get_runs_for_config(c, only_max_observed_budget=False))) for c in configs]
-        if not keep:
-            keep = []
-        runs = sorted(runs, key=lambda x: x[1])[-self.max_plot:]
-        keep = [r[0] for r in runs] + keep
+        # Count runs per config-id in one pass, capped runs are not counted (as in RunHistory.get_runs_for_config)
+        config_ids = np.array([rh.config_ids[c] for c in configs])
+        counted = [k.config_id for k, v in rh.data.items() if v.status != StatusType.CAPPED]
+        num_runs = np.bincount(counted, minlength=config_ids.max() + 1)[config_ids]
+        most_runs = np.argsort(num_runs, kind='stable')[-max_configs:]
+        keep = set([configs[idx] for idx in most_runs]) | set(keep if keep else [])
         self.logger.info("Reducing number of configs from %d to %d, dropping from the fewest evaluations",
                          len(configs), len(keep))
 
@@ -400,17 +579,13 @@ class ConfiguratorFootprintPlotter(object):
         labels: List[str]
             labels for timeslider (i.e. wallclock-times)
         """
-        conf_list = []
-        conf_matrix = []
         # Get all configurations. Index of c in conf_list serves as identifier
-        for c in rh.get_all_configs():
-            if c not in conf_list:
-                conf_matrix.append(c.get_array())
-                conf_list.append(c)
-        for inc in [a for b in incs for a in b]:
-            if inc not in conf_list:
-                conf_matrix.append(inc.get_array())
-                conf_list.append(inc)
+        conf_to_idx = {}
+        for c in rh.get_all_configs() + [a for b in incs for a in b]:
+            if c not in conf_to_idx:
+                conf_to_idx[c] = len(conf_to_idx)
+        conf_list = list(conf_to_idx.keys())
+        conf_matrix = [c.get_array() for c in conf_list]
 
         # Sanity check, number quantiles must be smaller than the number of configs
         if self.num_quantiles >= len(conf_list):
@@ -457,18 +632,18 @@ class ConfiguratorFootprintPlotter(object):
             numpy array of runs per configuration per quantile
         """
         runs_total = len(rh.data)
-        # Iterate over the runhistory's entries in ranges and creating each
-        # sublist from a "snapshot"-runhistory
-        labels, last_time_seen = [], -1  # label, means wallclocktime at splitting points
-        r_p_q_p_c = []  # runs per quantile per config
-        as_list = list(rh.data.items())
+        labels = []  # label, means wallclocktime at splitting points
+        runs, _ = runhistory_to_arrays(rh)
         scale = np.geomspace if self.timeslider_log else np.linspace
 
         # Trying to work with timestamps if they are available
         timestamps = None
+        order = np.arange(runs_total)
         try:
-            as_list = sorted(as_list, key=lambda x: x[1].additional_info['timestamps']['finished'])
-            timestamps = [x[1].additional_info['timestamps']['finished'] for x in as_list]
+            timestamps = np.array([v.additional_info['timestamps']['finished'] for v in rh.data.values()],
+                                  dtype=np.float64)
+            order = np.argsort(timestamps, kind='stable')
+            timestamps = timestamps[order]
             time_ranges = scale(timestamps[0], timestamps[-1], num=quantiles+1, endpoint=True)
             ranges = []
             idx = 0
@@ -479,38 +654,44 @@ class ConfiguratorFootprintPlotter(object):
         except (KeyError, TypeError) as err:
             self.logger.debug(err)
             self.logger.debug("Failed to sort by timestamps... only a reason to worry if this is BOHB-analysis")
+            timestamps = None
             ranges = [int(x) for x in scale(1, runs_total, num=quantiles+1)]
         # Fix possible wrong values
         ranges[0] = 0
-        ranges[-1] = len(as_list)
+        ranges[-1] = runs_total
 
         self.logger.debug("Creating %d quantiles with a total number of runs of %d", quantiles, runs_total)
         self.logger.debug("Ranges: %s", str(ranges))
 
         for r in range(len(ranges))[1:]:
             if ranges[r] <= ranges[r-1]:
-                if ranges[r-1] + 1 >= len(as_list):
+                if ranges[r-1] + 1 >= runs_total:
                     raise RuntimeError("There was a problem with the quantiles of the configuration footprint. "
                                        "Please report this Error on \"https://github.com/automl/CAVE/issues\" and provide the debug.txt-file.")
                 ranges[r] = ranges[r-1] + 1
                 self.logger.debug("Fixed ranges to: %s", str(ranges))
 
         # Sanity check
-        if not ranges[0] == 0 or not ranges[-1] == len(as_list) or not len(ranges) == quantiles + 1:
+        if not ranges[0] == 0 or not ranges[-1] == runs_total or not len(ranges) == quantiles + 1:
             raise RuntimeError("Sanity check on range-creation in configurator footprint went wrong. "
                                "Please report this Error on \"https://github.com/automl/CAVE/issues\" and provide the debug.txt-file.")
 
-        tmp_rh = RunHistory()
-        for i, j in zip(ranges[:-1], ranges[1:]):
-            for idx in range(i, j):
-                k, v = as_list[idx]
-                tmp_rh.add(config=rh.ids_config[k.config_id],
-                           cost=v.cost, time=v.time, status=v.status,
-                           instance_id=k.instance_id, seed=k.seed,
-                           additional_info=v.additional_info)
-            if timestamps:
-                labels.append("{0:.2f}".format(timestamps[j - 1]))
-            r_p_q_p_c.append([len(tmp_rh.get_runs_for_config(c, only_max_observed_budget=False)) for c in conf_list])
+        # Map runs (in temporal order) to the index of their config in conf_list and to the quantile they finished in
+        config_id_to_idx = np.full(max(rh.config_ids.values(), default=0) + 1, -1, dtype=np.int64)
+        for idx, c in enumerate(conf_list):
+            if c in rh.config_ids:
+                config_id_to_idx[rh.config_ids[c]] = idx
+        conf_idx = config_id_to_idx[runs['config_id'][order]]
+        quantile_idx = np.searchsorted(ranges[1:], np.arange(runs_total), side='right')
+        # Capped runs are not counted (as in RunHistory.get_runs_for_config)
+        counted = runs['status'][order] != StatusType.CAPPED.value
+
+        # Runs per quantile per config, the snapshot at a quantile contains all runs until then
+        r_p_q_p_c = np.zeros((quantiles, len(conf_list)), dtype=np.int64)
+        np.add.at(r_p_q_p_c, (quantile_idx[counted], conf_idx[counted]), 1)
+        r_p_q_p_c = np.cumsum(r_p_q_p_c, axis=0)
+        if timestamps is not None:
+            labels = ["{0:.2f}".format(timestamps[j - 1]) for j in ranges[1:]]
         self.logger.debug("Labels: " + str(labels))
         return labels, r_p_q_p_c
 
@@ -542,28 +723,29 @@ class ConfiguratorFootprintPlotter(object):
         sizes *= np.array([0 if r == 0 else 1 for r in r_p_c])  # 0 size if 0 runs
         return sizes
 
-    def _get_color(self, types):
-        """Determine appropriate color for all configurations
+    def _get_marker(self, t, o):
+        """Determine marker of a configuration
 
         Parameters:
         -----------
-        types: List[str]
+        t: str
             type of configuration
+        o: str
+            origin of configuration
 
         Returns:
         --------
-        colors: list
-            list of color per config
+        marker: str
+            bokeh-marker
         """
-        colors = []
-        for t in types:
-            if t == "Default":
-                colors.append('orange')
-            elif "Incumbent" in t:
-                colors.append('red')
-            else:
-                colors.append('white')
-        return colors
+        if t == "Default":
+            shape = 'triangle'
+        elif t == 'Final Incumbent':
+            shape = 'inverted_triangle'
+        else:
+            shape = 'square' if t == "Incumbent" else 'circle'
+            shape += '_x' if o.startswith("Acquisition Function") else ''
+        return shape
 
     @timing
     def _plot_contour(self, p, contour_data, x_range, y_range):
@@ -607,66 +789,41 @@ class ConfiguratorFootprintPlotter(object):
         return handles, color_mapper
 
     def _create_views(self, source, used_configs):
-        """Create views in order of plotting, so more interesting views are
-        plotted on top. Order of interest:
-        default > final-incumbent > incumbent > candidate
-          local > random
-            num_runs (ascending, more evaluated -> more interesting)
-        Individual views are necessary, since bokeh can only plot one
-        marker-type (circle, triangle, ...) per 'scatter'-call
+        """Create a view on the source with a client-side index filter to toggle the individual runs. The rows of the
+        source are already in order of plotting (see _plot_get_source), so one scatter with categorical markers and
+        colors suffices, independent of the number of runs.
 
         Parameters
         ----------:
         source: ColumnDataSource
             containing relevant information for plotting
         used_configs: List[Configuration]
-            configs that are contained in this source. necessary to plot glyphs for the independent runs so they can be
-            toggled. not all configs are in every source because of efficiency: no need to have 0-runs configs
+            configs that are contained in this source. necessary to toggle the independent runs. not all configs are
+            in every source because of efficiency: no need to have 0-runs configs
 
         Returns
         -------
-        views: List[CDSView]
-            views in order of plotting
-        views_by_run: Dict[ConfiguratorRun -> List[int]]
-            maps each run to a list of indices of the related glyphs in the returned 'views'-list
-        markers: List[string]
-            markers (to the view with the same index)
+        view: CDSView
+            view with an IndexFilter (all rows of configs evaluated in any run)
+        run_index: ColumnDataSource
+            pairs of row (in source) and run (index in self.configs_in_run), for every run a config was evaluated in
         """
-
-        def _get_marker(t, o):
-            """ returns marker according to type t and origin o """
-            if t == "Default":
-                shape = 'triangle'
-            elif t == 'Final Incumbent':
-                shape = 'inverted_triangle'
-            else:
-                shape = 'square' if t == "Incumbent" else 'circle'
-                shape += '_x' if o.startswith("Acquisition Function") else ''
-            return shape
-
-        views, markers = [], []
-        views_by_run = {run : [] for run in self.configs_in_run}
-        idx = 0
-        for t in ['Candidate', 'Incumbent', 'Final Incumbent', 'Default']:
-            for o in ['Unknown', 'Random', 'Acquisition Function']:
-                for z in sorted(list(set(source.data['zorder'])), key=lambda x: int(x)):
-                    for run, configs in self.configs_in_run.items():
-                        booleans = [True if c in configs else False for c in used_configs]
-                        view = CDSView(source=source, filters=[
-                                GroupFilter(column_name='type', group=t),
-                                GroupFilter(column_name='origin', group=o),
-                                GroupFilter(column_name='zorder', group=z),
-                                BooleanFilter(booleans)])
-                        views.append(view)  # all views
-                        views_by_run[run].append(idx)  # views sorted by runs
-                        idx += 1
-                        markers.append(_get_marker(t, o))
-        self.logger.debug("%d different glyph renderers, %d different zorder-values",
-                          len(views), len(set(source.data['zorder'])))
-        return (views, views_by_run, markers)
+        rows, runs = [], []
+        for run_idx, configs in enumerate(self.configs_in_run.values()):
+            in_run = np.array([c in configs for c in used_configs], dtype=bool)
+            rows.append(np.flatnonzero(in_run))
+            runs.append(np.full(in_run.sum(), run_idx))
+        rows, runs = np.concatenate(rows).astype(np.int32), np.concatenate(runs)
+        run_index = ColumnDataSource(data={'row': rows,
+                                           'run': runs.astype(np.promote_types(np.min_scalar_type(runs.max(initial=0)),
+                                                                               np.uint8))})
+        view = CDSView(source=source, filters=[IndexFilter(np.unique(rows).tolist())])
+        self.logger.debug("%d configurations in %d runs (%d memberships)", len(used_configs),
+                          len(self.configs_in_run), len(rows))
+        return view, run_index
 
     @timing
-    def _scatter(self, p, source, views, markers):
+    def _scatter(self, p, source, view):
         """
         Parameters
         ----------
@@ -674,26 +831,84 @@ class ConfiguratorFootprintPlotter(object):
             figure
         source: ColumnDataSource
             data container
-        views: List[CDSView]
-            list with views to be plotted (in order!)
-        markers: List[str]
-            corresponding markers to the views
+        view: CDSView
+            view to be plotted
 
         Returns
         -------
-        scatter_handles: List[GlyphRenderer]
-            glyph renderer per view
+        scatter_handle: GlyphRenderer
+            glyph renderer
+        """
+        types = ['Candidate', 'Incumbent', 'Final Incumbent', 'Default']
+        markers = sorted(set([self._get_marker(t, o) for t in types for o in ['Unknown', 'Random',
+                                                                             'Acquisition Function']]))
+        return p.scatter(x='x', y='y',
+                         source=source,
+                         view=view,
+                         color=factor_cmap('type', [TYPE_COLORS[t] for t in types], types),
+                         line_color='black',
+                         fill_alpha='alpha', line_alpha='alpha',
+                         size='size',
+                         marker=factor_mark('marker', markers, markers),
+                         )
+
+    def _get_plot_data(self,
+                       conf_list,
+                       runs,
+                       X,
+                       inc_list):
         """
-        scatter_handles = []
-        for view, marker in zip(views, markers):
-            scatter_handles.append(p.scatter(x='x', y='y',
-                                             source=source,
-                                             view=view,
-                                             color='color', line_color='black',
-                                             size='size',
-                                             marker=marker,
-                                             ))
-        return scatter_handles
+        Arrays with the data to plot (shared by bokeh- and matplotlib-plots), only configurations with > 0 runs, in
+        order of plotting.
+
+        Parameters
+        ----------
+        conf_list: list[Configuration]
+            configurations
+        runs: list[int]
+            runs per configuration (same order as conf_list)
+        X: np.array
+            configuration-parameters as 2-dimensional array
+        inc_list: list[Configuration]
+            incumbents for this conf-run
+
+        Returns
+        -------
+        data: Dict[str -> np.array]
+            x, y, type, origin, marker, size and runs per configuration
+        conf_list: List[Configuration]
+            filtered conf_list with only configs we actually plot (i.e. > 0 runs), in order of the data
+        """
+        # Remove all configurations without any runs
+        keep = [i for i in range(len(runs)) if runs[i] > 0]
+        runs = np.array(runs)[keep]
+        conf_list = np.array(conf_list)[keep]
+        X = X[keep]
+        inc_list = set([a for b in inc_list for a in b])
+
+        conf_types = np.array(["Default" if c == self.default else "Final Incumbent" if c == self.final_incumbent
+                               else "Incumbent" if c in inc_list else "Candidate" for c in conf_list])
+        # We group "Local Search" and "Random Search (sorted)" both into local
+        origins = np.array([get_config_origin(c) for c in conf_list])
+        sizes = self._get_size(runs)
+        sizes = np.array([s * 3 if conf_types[idx] == "Default" else s for idx, s in enumerate(sizes)])
+
+        # Rows are plotted in order, so more interesting configs are plotted on top. Order of interest:
+        # default > final-incumbent > incumbent > candidate
+        #   local > random
+        #     num_runs (ascending, more evaluated -> more interesting)
+        type_rank = {t: i for i, t in enumerate(['Candidate', 'Incumbent', 'Final Incumbent', 'Default'])}
+        origin_rank = {o: i for i, o in enumerate(['Unknown', 'Random', 'Acquisition Function'])}
+        order = np.lexsort((sizes,
+                            [origin_rank.get(o, -1) for o in origins],
+                            [type_rank[t] for t in conf_types]))
+        conf_list, runs, X = conf_list[order], runs[order], X[order]
+        conf_types, origins, sizes = conf_types[order], origins[order], sizes[order]
+
+        data = {'x': X[:, 0], 'y': X[:, 1], 'type': conf_types, 'origin': origins,
+                'marker': np.array([self._get_marker(t, o) for t, o in zip(conf_types, origins)]),
+                'size': sizes, 'runs': runs}
+        return data, conf_list
 
     def _plot_get_source(self,
                          conf_list,
@@ -708,9 +923,9 @@ class ConfiguratorFootprintPlotter(object):
           - all parameters and values
           - origin (if conflicting, origin from best run counts)
           - type (default, incumbent or candidate)
+          - marker
           - # of runs
           - size
-          - color
 
         Parameters
         ----------
@@ -730,39 +945,18 @@ class ConfiguratorFootprintPlotter(object):
         source: ColumnDataSource
             source with attributes as requested
         conf_list: List[Configuration]
-            filtered conf_list with only configs we actually plot (i.e. > 0 runs)
+            filtered conf_list with only configs we actually plot (i.e. > 0 runs), in order of the source
         """
-        # Remove all configurations without any runs
-        keep = [i for i in range(len(runs)) if runs[i] > 0]
-        runs = np.array(runs)[keep]
-        conf_list = np.array(conf_list)[keep]
-        X = X[keep]
-        inc_list = [a for b in inc_list for a in b]
-
-        source = ColumnDataSource(data=dict(x=X[:, 0], y=X[:, 1]))
+        data, conf_list = self._get_plot_data(conf_list, runs, X, inc_list)
+        source = ColumnDataSource(data=dict(x=data['x'], y=data['y']))
         for k in hp_names:  # Add parameters for each config
             source.add([c[k] if c[k] else "None" for c in conf_list], escape_parameter_name(k))
-        conf_types = ["Default" if c == self.default else "Final Incumbent" if c == self.final_incumbent
-                      else "Incumbent" if c in inc_list else "Candidate" for c in conf_list]
-        # We group "Local Search" and "Random Search (sorted)" both into local
-        origins = [get_config_origin(c) for c in conf_list]
-        source.add(conf_types, 'type')
-        source.add(origins, 'origin')
-        sizes = self._get_size(runs)
-        sizes = [s * 3 if conf_types[idx] == "Default" else s for idx, s in enumerate(sizes)]
-        source.add(sizes, 'size')
-        source.add(self._get_color(source.data['type']), 'color')
-        source.add(runs, 'runs')
-        # To enforce zorder, we categorize all entries according to their size
-        # Since we plot all different zorder-levels sequentially, we use a
-        # manually defined level of influence
-        num_bins = 20  # How fine-grained the size-ordering should be
-        min_size, max_size = min(source.data['size']), max(source.data['size'])
-        step_size = (max_size - min_size) / num_bins
-        if step_size == 0:
-            step_size = 1
-        zorder = [str(int((s - min_size) / step_size)) for s in source.data['size']]
-        source.add(zorder, 'zorder')  # string, so we can apply group filter
+        source.add(data['type'].tolist(), 'type')
+        source.add(data['origin'].tolist(), 'origin')
+        source.add(data['marker'].tolist(), 'marker')
+        source.add(data['size'].tolist(), 'size')
+        source.add(data['runs'], 'runs')
+        source.add(np.ones(len(conf_list), dtype=np.uint8), 'alpha')  # to hide configurations without runs (timeslider)
 
         return source, conf_list
 
@@ -795,7 +989,7 @@ class ConfiguratorFootprintPlotter(object):
             contour data (xx,yy,Z)
         use_timeslider: bool
             whether or not to have a time_slider-widget on cfp-plot
-            INCREASES FILE-SIZE DRAMATICALLY
+            the runs per config per quantile are stored as compact array, sizes are derived in the browser
         use_checkbox: bool
             have checkboxes to toggle individual runs
 
@@ -818,44 +1012,26 @@ class ConfiguratorFootprintPlotter(object):
         x_range = [min(X[:, 0]) - 1, max(X[:, 0]) + 1]
         y_range = [min(X[:, 1]) - 1, max(X[:, 1]) + 1]
 
-        # Get individual sources for quantiles
-        sources, used_configs = zip(*[self._plot_get_source(conf_list, quantiled_run, X, inc_list, hp_names)
-                                      for quantiled_run in runs_per_quantile])
-
-        # We collect all glyphs in one list
-        # Then we have to dicts to identify groups of glyphs (for interactivity)
-        # They map the name of the group to a list of indices (of the respective glyphs that are in the group)
-        # Those indices refer to the main list of all glyphs
-        # This is necessary to enable interactivity for two inputs at the same time
-        all_glyphs = []
-        overtime_groups = {}
-        run_groups = {run : [] for run in self.configs_in_run.keys()}
-
-        # Iterate over quantiles (this updates overtime_groups)
-        for idx, source, u_cfgs in zip(range(len(sources)), sources, used_configs):
-            # Create new plot if necessary (only plot all quantiles in one single plot if timeslider is on)
-            if not use_timeslider or idx == 0:
-                p = self._create_figure(x_range, y_range)
-                if contour_data is not None:  # TODO
-                    contour_handles, color_mapper = self._plot_contour(p, contour_data, x_range, y_range)
-
-            # Create views and scatter
-            views, views_by_run, markers = self._create_views(source, u_cfgs)
-            scatter_handles = self._scatter(p, source, views, markers)
-            self.logger.debug("Quantile %d: %d scatter-handles", idx, len(scatter_handles))
-            if len(scatter_handles) == 0:
+        # Without timeslider, every quantile is plotted into its own (static) figure and the last one is interactive.
+        # With timeslider, only the last quantile is plotted (it contains all configurations) and the browser updates
+        # sizes from the runs per quantile. The static figures are only plotted with bokeh, if it is also used to
+        # export them.
+        export_quantiles = self.output_dir and not use_timeslider and self.static_renderer == 'bokeh'
+        for idx, quantiled_run in enumerate(runs_per_quantile if export_quantiles else runs_per_quantile[-1:]):
+            p = self._create_figure(x_range, y_range)
+            if contour_data is not None:  # TODO
+                contour_handles, color_mapper = self._plot_contour(p, contour_data, x_range, y_range)
+
+            # Create source, view and scatter
+            source, used_configs = self._plot_get_source(conf_list, quantiled_run, X, inc_list, hp_names)
+            if len(used_configs) == 0:
                 self.logger.debug("No configs in quantile %d (?!)", idx)
                 continue
-
-            # Add to groups
-            start = len(all_glyphs)
-            all_glyphs.extend(scatter_handles)
-            overtime_groups[str(idx)] = [str(i) for i in range(start, len(all_glyphs))]
-            for run, indices in views_by_run.items():
-                run_groups[run].extend([str(start + i) for i in indices])
+            view, run_index = self._create_views(source, used_configs)
+            scatter_handle = self._scatter(p, source, view)
 
             # Write to file
-            if self.output_dir:
+            if export_quantiles:
                 file_path = "cfp_over_time/configurator_footprint" + str(idx) + ".png"
                 over_time_paths.append(os.path.join(self.output_dir, file_path))
                 self.logger.debug("Saving plot to %s", over_time_paths[-1])
@@ -865,16 +1041,20 @@ class ConfiguratorFootprintPlotter(object):
         # TODO add only important parameters (needs to change order of exec pimp before conf-footprints)
         hover = HoverTool(tooltips=[('type', '@type'), ('origin', '@origin'), ('runs', '@runs')] +
                                    [(k, '@' + escape_parameter_name(k)) for k in hp_names],
-                          renderers=all_glyphs)
+                          renderers=[scatter_handle])
         p.add_tools(hover)
 
         # Build dashboard
-        timeslider, checkbox, select_all, select_none, checkbox_title = self._get_widgets(all_glyphs, overtime_groups, run_groups,
-                                                                                          slider_labels=timeslider_labels)
+        checkbox, select_all, select_none, checkbox_title = self._get_widgets(source, view, run_index)
         contour_checkbox, contour_title = self._contour_radiobuttongroup(contour_handles, color_mapper)
         layout = p
         if use_timeslider:
             self.logger.debug("Adding timeslider")
+            # Only configurations in the source (i.e. with runs in the last quantile), in order of the source
+            conf_to_idx = {c: idx for idx, c in enumerate(conf_list)}
+            plotted = [conf_to_idx[c] for c in used_configs]
+            timeslider = self._get_timeslider(source, np.array(runs_per_quantile)[:, plotted],
+                                              slider_labels=timeslider_labels)
             layout = column(layout, widgetbox(timeslider))
         if use_checkbox:
             self.logger.debug("Adding checkboxes")
@@ -888,99 +1068,130 @@ class ConfiguratorFootprintPlotter(object):
 
         if self.output_dir:
             path = os.path.join(self.output_dir, "content/images/configurator_footprint.png")
-            export_bokeh(p, path, self.logger)
+            if self.static_renderer == 'matplotlib':
+                over_time_paths, self.animation_path = self._plot_static(X, conf_list, runs_per_quantile, inc_list,
+                                                                         contour_data, x_range, y_range, path,
+                                                                         plot_quantiles=not use_timeslider,
+                                                                         labels=timeslider_labels)
+            else:
+                export_bokeh(p, path, self.logger)
 
         return layout, over_time_paths
 
-    def _get_widgets(self, all_glyphs, overtime_groups, run_groups, slider_labels=None):
-        """Combine timeslider for quantiles and checkboxes for individual runs in a single javascript-snippet
+    @timing
+    def _plot_static(self, X, conf_list, runs_per_quantile, inc_list, contour_data, x_range, y_range, path,
+                     plot_quantiles=True, labels=None):
+        """Plot static pictures of the quantiles and the final footprint with matplotlib, in n_jobs processes.
+        Reuses the embedding and the contour (combined, or first one) of the interactive plot.
 
         Parameters
         ----------
-        all_glyphs: List[Glyph]
-            togglable bokeh-glyphs
-        overtime_groups, run_groups: Dicŧ[str -> List[int]
-            mapping labels to indices of the all_glyphs-list
-        slider_labels: Union[None, List[str]]
-            if provided, used as labels for timeslider-widget
+        X: np.array
+            np.array with 2-d coordinates for each configuration
+        conf_list: list
+            list of ALL configurations in the same order as X
+        runs_per_quantile: list[np.array]
+            runs per config per quantile
+        inc_list: list
+            list of incumbents (Configuration)
+        contour_data: Dict[str -> (np.array, np.array, np.array)]
+            contour data (xx,yy,Z)
+        x_range, y_range: List[float, float]
+            min and max of axes
+        path: str
+            path to save the final footprint (last quantile) to
+        plot_quantiles: bool
+            whether to create a picture for each quantile (else only the final footprint)
+        labels: List[str]
+            wallclock-times of the quantiles
+
+        Returns
+        -------
+        over_time_paths: List[str]
+            list with paths to the pictures of the quantiles
+        animation_path: str
+            path to the animation of the pictures of the quantiles, None if not created
+        """
+        contour, color_range = None, None
+        if contour_data:
+            label = 'combined' if 'combined' in contour_data else list(contour_data.keys())[0]
+            contour = contour_data[label]
+            color_range = (min([np.min(c[2]) for c in contour_data.values()]),
+                           max([np.max(c[2]) for c in contour_data.values()]))
+        quantiles = list(range(len(runs_per_quantile))) if plot_quantiles else []
+        over_time_paths = [os.path.join(self.output_dir, "cfp_over_time/configurator_footprint" + str(idx) + ".png")
+                           for idx in quantiles]
+        frames = []
+        for idx, out_fn in zip(quantiles + [None], over_time_paths + [path]):
+            data, _ = self._get_plot_data(conf_list, runs_per_quantile[-1 if idx is None else idx], X, inc_list)
+            title = None
+            if idx is not None:
+                title = ("Until wallclocktime " + labels[idx]) if labels else "Quantile {}".format(idx + 1)
+            frames.append({'out_fn': out_fn, 'x': data['x'], 'y': data['y'], 'markers': data['marker'],
+                           'colors': np.array([TYPE_COLORS[t] for t in data['type']]), 'sizes': data['size'],
+                           'contour': contour, 'color_range': color_range, 'x_range': x_range, 'y_range': y_range,
+                           'axis_label': self._get_axis_label(), 'title': title})
+        self.logger.debug("Plotting %d static pictures with %d processes", len(frames), self.n_jobs)
+        plot_footprint_frames(frames, n_jobs=self.n_jobs)
+
+        animation_path = None
+        if self.animation and len(over_time_paths) > 1:
+            animation_path = os.path.join(self.output_dir, "cfp_over_time/configurator_footprint_animation" +
+                                          (".gif" if self.animation == 'gif' else ".png"))
+            self.logger.debug("Saving animation to %s", animation_path)
+            animation_path = save_animation(over_time_paths, animation_path)
+        return over_time_paths, animation_path
+
+    def _get_widgets(self, source, view, run_index):
+        """Checkboxes for individual runs, toggling the rows of the source via the index filter of the view
+
+        Parameters
+        ----------
+        source: ColumnDataSource
+            source of the plotted configurations
+        view: CDSView
+            view with an IndexFilter on the source
+        run_index: ColumnDataSource
+            pairs of row (in source) and run (index of checkbox)
 
         Returns
         -------
-        time_slider, checkbox, select_all, select_none: Widget
+        checkbox, select_all, select_none: Widget
             desired interlayed bokeh-widgets
         checkbox_title: Div
             text-element to "show title" of checkbox
         """
-        aliases = ['glyph' + str(idx) for idx, _ in enumerate(all_glyphs)]
-        labels_overtime = list(overtime_groups.keys())
-        labels_runs = list(run_groups.keys())
-
-        code = ""
-        # Define javascript variable with important arrays
-        code += "var glyphs = [" + ", ".join(aliases) + "];"
-        code += "var overtime = [" + ','.join(['[' + ','.join(overtime_groups[l]) + ']' for l in labels_overtime]) + '];'
-        code += "var runs = [" + ','.join(['[' + ','.join(run_groups[l]) + ']' for l in labels_runs]) + '];'
-        # Deactivate all glyphs
-        code += """
-        glyphs.forEach(function(g) {
-          g.visible = false;
-        })"""
-        # Add function for array-union (to combine all relevant glyphs for the different runs)
-        code += """
-        // union function
-        function union_arrays(x, y) {
-          var obj = {};
-          for (var i = x.length-1; i >= 0; -- i)
-             obj[x[i]] = x[i];
-          for (var i = y.length-1; i >= 0; -- i)
-             obj[y[i]] = y[i];
-          var res = []
-          for (var k in obj) {
-            if (obj.hasOwnProperty(k))  // <-- optional
-              res.push(obj[k]);
-          }
-          return res;
-        }"""
-        # Add logging
-        code += """
-        console.log("Timeslider: " + time_slider.value);
-        console.log("Checkbox: " + checkbox.active);"""
-        # Set timeslider title (to enable log-scale and print wallclocktime-labels)
-        if slider_labels:
-            code += "var slider_labels = " + str(slider_labels) + ";"
-            code += "console.log(\"Detected slider_labels: \" + slider_labels);"
-            code += "time_slider.title = \"Until wallclocktime \" + slider_labels[time_slider.value - 1] + \". Step no.\"; "
-            title = "Until wallclocktime " + slider_labels[-1] + ". Step no. "
-        else:
-            title = "Quantile on {} scale".format("logarithmic" if self.timeslider_log else "linear")
-            code += "time_slider.title = \"{}\";".format(title);
-        # Combine checkbox-arrays, intersect with time_slider and set all selected glyphs to true
-        code += """
-        var activate = [];
-        // if we want multiple checkboxes at the same time, we need to combine the arrays
+        labels_runs = list(self.configs_in_run.keys())
+
+        code = """
+        console.log("Checkbox: " + checkbox.active);
+        var active = new Uint8Array(%d);
         checkbox.active.forEach(function(c) {
-          activate = union_arrays(activate, runs[c]);
-        })
-        // now the intersection of timeslider-activated and checkbox-activated
-        activate = activate.filter(value => -1 !== overtime[time_slider.value - 1].indexOf(value));
-        activate.forEach(function(idx) {
-          glyphs[idx].visible = true;
+          active[c] = 1;
         })
-        """
+        // Show all rows that were evaluated in any of the active runs
+        var rows = run_index.data['row'], runs = run_index.data['run'];
+        var show = new Uint8Array(source.data['x'].length);
+        for (var i = 0; i < rows.length; i++) {
+          if (active[runs[i]]) {
+            show[rows[i]] = 1;
+          }
+        }
+        var indices = [];
+        for (var i = 0; i < show.length; i++) {
+          if (show[i]) {
+            indices.push(i);
+          }
+        }
+        view.filters[0].indices = indices;
+        source.change.emit();
+        """ % len(labels_runs)
 
-        num_quantiles = len(overtime_groups)
-        if num_quantiles > 1:
-            timeslider = Slider(start=1, end=num_quantiles, value=num_quantiles, step=1, title=title)
-        else:
-            timeslider = Slider(start=1, end=2, value=1)
         labels_runs = [label.replace('_', ' ') if label.startswith('budget') else label for label in labels_runs]
         checkbox = CheckboxButtonGroup(labels=labels_runs, active=list(range(len(labels_runs))))
 
-        args = {name: glyph for name, glyph in zip(aliases, all_glyphs)}
-        args['time_slider'] = timeslider
-        args['checkbox'] = checkbox
+        args = {'checkbox': checkbox, 'source': source, 'view': view, 'run_index': run_index}
         callback = CustomJS(args=args, code=code)
-        timeslider.js_on_change('value', callback)
         checkbox.callback = callback
         checkbox_title = Div(text="Showing only configurations evaluated in:")
 
@@ -990,7 +1201,70 @@ class ConfiguratorFootprintPlotter(object):
         select_all  = Button(label="All", callback=CustomJS(args=args, code=code_all))
         select_none = Button(label="None", callback=CustomJS(args=args, code=code_none))
 
-        return timeslider, checkbox, select_all, select_none, checkbox_title
+        return checkbox, select_all, select_none, checkbox_title
+
+    def _get_timeslider(self, source, runs_per_quantile, slider_labels=None):
+        """Timeslider for quantiles. Coordinates and parameters are stored once in the source, the runs per
+        configuration per quantile are stored as compact typed array (usually one byte per entry). The javascript-
+        callback derives runs, size and visibility (alpha) of the configurations from the slider index.
+
+        Parameters
+        ----------
+        source: ColumnDataSource
+            source of the plotted configurations
+        runs_per_quantile: np.array
+            runs per configuration (same order as source) per quantile, shape (quantiles, configurations)
+        slider_labels: Union[None, List[str]]
+            if provided, used as labels for timeslider-widget
+
+        Returns
+        -------
+        time_slider: Slider
+            slider-widget
+        """
+        num_quantiles = len(runs_per_quantile)
+        runs_per_quantile = np.asarray(runs_per_quantile)
+        # Smallest unsigned type (uint8/16/32 are serialized as binary arrays)
+        dtype = np.promote_types(np.min_scalar_type(max(int(runs_per_quantile.max()), 0)), np.uint8)
+        run_counts = ColumnDataSource(data={'runs': runs_per_quantile.ravel().astype(dtype)})
+
+        # Set timeslider title (to enable log-scale and print wallclocktime-labels)
+        if slider_labels:
+            code = "var slider_labels = " + str(slider_labels) + ";"
+            code += ("time_slider.title = \"Until wallclocktime \" + slider_labels[time_slider.value - 1] + "
+                     "\". Step no.\"; ")
+            title = "Until wallclocktime " + slider_labels[-1] + ". Step no. "
+        else:
+            title = "Quantile on {} scale".format("logarithmic" if self.timeslider_log else "linear")
+            code = "time_slider.title = \"{}\";".format(title)
+        # Same sizes as in _get_size
+        normalization_factor = self.max_runs_per_conf - self.min_runs_per_conf
+        min_size, enlargement_factor = 5, 20
+        if normalization_factor == 0:  # All configurations same size
+            normalization_factor = 1
+            min_size = 12
+        code += """
+        var q = time_slider.value - 1;
+        var n = source.data['x'].length;
+        var counts = run_counts.data['runs'];
+        var runs = source.data['runs'], size = source.data['size'], alpha = source.data['alpha'];
+        var type = source.data['type'];
+        for (var i = 0; i < n; i++) {
+          var r = counts[q * n + i];
+          runs[i] = r;
+          size[i] = r == 0 ? 0 : (%f + ((r - %d) / %d) * %f) * (type[i] == 'Default' ? 3 : 1);
+          alpha[i] = r == 0 ? 0 : 1;
+        }
+        source.change.emit();
+        """ % (min_size, self.min_runs_per_conf, normalization_factor, enlargement_factor)
+
+        if num_quantiles > 1:
+            timeslider = Slider(start=1, end=num_quantiles, value=num_quantiles, step=1, title=title)
+        else:
+            timeslider = Slider(start=1, end=2, value=1)
+        timeslider.js_on_change('value', CustomJS(args={'time_slider': timeslider, 'source': source,
+                                                        'run_counts': run_counts}, code=code))
+        return timeslider
 
     def _contour_radiobuttongroup(self, contour_data, color_mapper):
         """
@@ -1035,15 +1309,53 @@ class ConfiguratorFootprintPlotter(object):
         title = Div(text="Data used to estimate contour-plot")
         return radio, title
 
+    def _get_axis_label(self):
+        """ Name of the embedding for axis labels """
+        return {'pca': 'PCA', 'random_projection': 'RP', 'spectral': 'Spectral'}.get(self.embedding, 'MDS')
+
     def _create_figure(self, x_range, y_range):
         p = figure(plot_height=500, plot_width=600,
                    tools=['save', 'box_zoom', 'wheel_zoom', 'reset'],
                    x_range=x_range, y_range=y_range)
-        p.xaxis.axis_label = "MDS-X"
-        p.yaxis.axis_label = "MDS-Y"
+        p.xaxis.axis_label = self._get_axis_label() + "-X"
+        p.yaxis.axis_label = self._get_axis_label() + "-Y"
         p.xaxis.axis_label_text_font_size = "15pt"
         p.yaxis.axis_label_text_font_size = "15pt"
         p.xaxis.major_label_text_font_size = "12pt"
         p.yaxis.major_label_text_font_size = "12pt"
         p.title.text_font_size = "15pt"
         return p
+
+
+def _fit_and_predict_surface(X_trans, y, instance_features, grid, seed):
+    """Train a random forest on embedded configurations and predict the grid, marginalized over instances. Module-level
+    function, so it can be executed in a process pool.
+
+    Parameters
+    ----------
+    X_trans, y: np.array, np.array
+        training data (embedded configurations and instance features)
+    instance_features: np.array
+        instance features to marginalize over
+    grid: np.array
+        points in the embedding to predict, shape (n, 2)
+    seed: int
+        seed for the random forest
+
+    Returns
+    -------
+    Z: np.array
+        predicted mean per grid point
+    """
+    # We need to fake config-space bypass imputation of inactive values in random forest implementation
+    fake_cs = ConfigurationSpace(name="fake-cs-for-configurator-footprint")
+    types = np.array(np.zeros((2 + instance_features.shape[1])), dtype=np.uint)
+    bounds = np.array([(0, np.nan), (0, np.nan)], dtype=object)
+    model = RandomForestWithInstances(fake_cs,
+                                      types, bounds,
+                                      seed=seed,
+                                      instance_features=instance_features,
+                                      ratio_features=1.0)
+    model.train(X_trans, y)
+    Z, _ = predict_marginalized_over_instances(model, grid)
+    return Z.ravel()
@@ -0,0 +1,135 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+# bokeh-markers of the configurator footprint to matplotlib-markers (the '_x'-variants get an additional 'x')
+MARKERS = {'circle': 'o', 'square': 's', 'triangle': '^', 'inverted_triangle': 'v'}
+
+
+def plot_footprint_frame(out_fn, x, y, markers, colors, sizes, contour=None, color_range=None, x_range=None,
+                         y_range=None, axis_label='MDS', title=None, dpi=100):
+    """
+    Plot one (static) frame of the configurator footprint with matplotlib. Only uses the agg-backend (no pyplot), so
+    it works headless and in worker processes.
+
+    Parameters
+    ----------
+    out_fn: str
+        filename
+    x, y: np.array
+        coordinates of the configurations in the embedding, in order of plotting (later ones on top)
+    markers: np.array
+        bokeh-marker per configuration (circle, square, triangle, inverted_triangle and '_x'-variants)
+    colors: np.array
+        color per configuration
+    sizes: np.array
+        size per configuration (as bokeh-size, i.e. diameter in screen units)
+    contour: (np.array, np.array, np.array)
+        xx, yy, Z of the contour to plot in the background
+    color_range: (float, float)
+        minimum and maximum of the colorbar for the contour
+    x_range, y_range: (float, float)
+        limits of the axes
+    axis_label: str
+        name of the embedding for the axis labels
+    title: str
+        title of the plot
+    dpi: int
+        resolution, the frame has 600 x 500 pixels (as the bokeh-plot)
+
+    Returns
+    -------
+    out_fn: str
+        filename
+    """
+    fig = Figure(figsize=(6, 5), dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(1, 1, 1)
+    if contour is not None:
+        xx, yy, Z = contour
+        vmin, vmax = color_range if color_range else (np.min(Z), np.max(Z))
+        image = ax.imshow(Z, origin='lower', extent=(xx.min(), xx.max(), yy.min(), yy.max()), aspect='auto',
+                          cmap='viridis', vmin=vmin, vmax=vmax)
+        fig.colorbar(image, ax=ax)
+    # bokeh-sizes are diameters in pixels, matplotlib expects areas in points^2
+    areas = (np.asarray(sizes, dtype=np.float64) * 72. / dpi) ** 2
+    markers = np.asarray(markers)
+    # Consecutive configurations with the same marker in one scatter, so the order of plotting is kept
+    breaks = np.flatnonzero(markers[1:] != markers[:-1]) + 1
+    for start, end in zip(np.r_[0, breaks], np.r_[breaks, len(markers)]):
+        if start == end:
+            continue
+        shape = markers[start]
+        ax.scatter(x[start:end], y[start:end], s=areas[start:end], c=list(colors[start:end]),
+                   marker=MARKERS[shape.replace('_x', '')], edgecolors='black', linewidths=0.5)
+        if shape.endswith('_x'):
+            ax.scatter(x[start:end], y[start:end], s=areas[start:end], c='black', marker='x', linewidths=0.5)
+    if x_range is not None:
+        ax.set_xlim(*x_range)
+    if y_range is not None:
+        ax.set_ylim(*y_range)
+    ax.set_xlabel(axis_label + "-X")
+    ax.set_ylabel(axis_label + "-Y")
+    if title:
+        ax.set_title(title)
+    fig.tight_layout()
+    if os.path.dirname(out_fn):
+        os.makedirs(os.path.dirname(out_fn), exist_ok=True)
+    fig.savefig(out_fn)
+    return out_fn
+
+
+def plot_footprint_frames(frames, n_jobs=1):
+    """
+    Plot multiple frames (e.g. the quantiles of the configurator footprint) in a process pool.
+
+    Parameters
+    ----------
+    frames: List[dict]
+        keyword-arguments for plot_footprint_frame per frame
+    n_jobs: int
+        number of processes
+
+    Returns
+    -------
+    paths: List[str]
+        filenames of the frames
+    """
+    n_jobs = min(n_jobs, len(frames))
+    if n_jobs <= 1:
+        return [plot_footprint_frame(**frame) for frame in frames]
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        futures = [executor.submit(plot_footprint_frame, **frame) for frame in frames]
+        return [future.result() for future in futures]
+
+
+def save_animation(frame_paths, out_fn, duration=800):
+    """
+    Combine frames into an animation, animated GIF or APNG depending on the extension of out_fn (.gif or .png).
+
+    Parameters
+    ----------
+    frame_paths: List[str]
+        filenames of the frames (all with the same resolution)
+    out_fn: str
+        filename of the animation
+    duration: int
+        duration of a frame in milliseconds
+
+    Returns
+    -------
+    out_fn: str
+        filename
+    """
+    from PIL import Image  # pillow is a dependency of matplotlib
+
+    images = [Image.open(path) for path in frame_paths]
+    if out_fn.endswith('.gif'):
+        images = [image.convert('RGB').convert('P', palette=Image.ADAPTIVE) for image in images]
+    images[0].save(out_fn, save_all=True, append_images=images[1:], duration=duration, loop=0)
+    for image in images:
+        image.close()
+    return out_fn
@@ -15,6 +15,7 @@ from smac import __version__ as smac_version
 from cave.reader.smac2_reader import SMAC2Reader
 from cave.reader.smac3_reader import SMAC3Reader
 from cave.utils.helpers import scenario_sanity_check
+from cave.utils.hpbandster_helpers import get_incumbent_trajectories
 from cave.utils.timing import timing
 
 
@@ -115,6 +116,8 @@ class ConfiguratorRun(object):
                                   'evaluators': OrderedDict(),
                                   'validator': None,
                                   'hpbandster_result': None,  # Only for file-format BOHB
+                                  # Only for file-format BOHB, see get_incumbent_trajectory
+                                  'incumbent_trajectories': None,
                                   }
 
     def get_identifier(self):
@@ -203,6 +206,35 @@ class ConfiguratorRun(object):
     def get_incumbent(self):
         return self.incumbent
 
+    def get_incumbent_trajectory(self, budgets=None, mode='racing'):
+        """
+        Incumbent trajectory of the hpbandster result (only for file-format BOHB). On first request, the trajectories of
+        all modes for all budgets and each single budget are computed at once (unless the converter already did so) and
+        cached, so all analyzers share them.
+
+        Parameters
+        ----------
+        budgets: List[str|int|float]
+            budgets to consider, defaults to all budgets
+        mode: str
+            from ['racing', 'minimum', 'prefer_higher_budget']
+
+        Returns
+        -------
+        trajectory: dict
+            see cave.utils.hpbandster_helpers.get_incumbent_trajectory, shared and therefore not to be modified
+        """
+        result = self.share_information['hpbandster_result']
+        if result is None:
+            raise ValueError("Incumbent trajectories are only available for hpbandster results (file-format BOHB)")
+        if self.share_information.get('incumbent_trajectories') is None:
+            self.share_information['incumbent_trajectories'] = get_incumbent_trajectories(result)
+        trajectories = self.share_information['incumbent_trajectories']
+        budgets = sorted(budgets if budgets is not None else result.HB_config['budgets'])
+        if (mode, tuple(budgets)) not in trajectories:
+            trajectories.update(get_incumbent_trajectories(result, [budgets], [mode]))
+        return trajectories[(mode, tuple(budgets))]
+
     def _init_pimp_and_validator(self,
                                  alternative_output_dir=None,
                                  ):
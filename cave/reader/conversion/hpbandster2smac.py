@@ -16,6 +16,7 @@ from smac.utils.io.traj_logging import TrajLogger
 
 from cave.reader.conversion.base_converter import BaseConverter
 from cave.utils.helpers import get_folder_basenames
+from cave.utils.hpbandster_helpers import get_incumbent_trajectories
 
 
 class HpBandSter2SMAC(BaseConverter):
@@ -158,6 +159,7 @@ class HpBandSter2SMAC(BaseConverter):
                 'validated_runhistory' : validated_runhistory,
                 'scenario' : scenario,
                 'trajectory' : trajectory,
+                'incumbent_trajectories' : incumbent_trajectories_of_all_modes_and_budgets,
                 }
 
         """
@@ -218,7 +220,9 @@ class HpBandSter2SMAC(BaseConverter):
 
         rh.save_json(fn=os.path.join(output_dir, 'runhistory.json'))
 
-        trajectory = self.get_trajectory(result, output_dir, scenario, rh)
+        # All incumbent trajectories are computed in one go and shared with the analyzers (see ConfiguratorRun)
+        incumbent_trajectories = get_incumbent_trajectories(result)
+        trajectory = self.get_trajectory(result, output_dir, scenario, rh, incumbent_trajectories)
 
         return {'new_path': output_dir,
                 'hpbandster_result': result,
@@ -227,11 +231,17 @@ class HpBandSter2SMAC(BaseConverter):
                 'validated_runhistory': None,
                 'scenario': scenario,
                 'trajectory': trajectory,
+                'incumbent_trajectories': incumbent_trajectories,
                 }
 
-    def get_trajectory(self, result, output_path, scenario, rh):
+    def get_trajectory(self, result, output_path, scenario, rh, incumbent_trajectories=None):
         """
-        Use hpbandster's averaging.
+        Use hpbandster's averaging (prefer_higher_budget over all budgets).
+
+        Parameters
+        ----------
+        incumbent_trajectories: OrderedDict
+            as returned by get_incumbent_trajectories, computed if not passed
         """
         cs = scenario.cs
 
@@ -240,7 +250,10 @@ class HpBandSter2SMAC(BaseConverter):
 
         traj_logger = TrajLogger(output_path, Stats(scenario))
         total_traj_dict = []
-        traj_dict = result.get_incumbent_trajectory()
+        key = ('prefer_higher_budget', tuple(sorted(result.HB_config['budgets'])))
+        if incumbent_trajectories is None or key not in incumbent_trajectories:
+            incumbent_trajectories = get_incumbent_trajectories(result, [list(key[1])], [key[0]])
+        traj_dict = incumbent_trajectories[key]
 
         id2config_mapping = result.get_id2config_mapping()
 
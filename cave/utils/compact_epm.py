@@ -0,0 +1,42 @@
+import numpy as np
+from pyrfr import regression
+from smac.epm.rf_with_instances import RandomForestWithInstances
+
+# dtypes used in compact mode (see convert_data_for_epm and runhistory_to_arrays)
+COMPACT_FLOAT = np.float32
+COMPACT_INDEX = np.uint32
+COMPACT_STATUS = np.uint8
+
+
+class CompactRandomForestWithInstances(RandomForestWithInstances):
+    """
+    RandomForestWithInstances that accepts compact (float32) feature matrices. pyrfr only accepts float64-rows, so
+    the smac-implementation would need an upcasted copy of the whole training matrix. Here, rows are converted one by
+    one when filling the pyrfr data container and the (imputed) training data kept by the model stays compact.
+    Queries are upcasted per call.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance_features is not None:
+            # Small, used to build float64-rows for marginalized predictions
+            self.instance_features = np.asarray(self.instance_features, dtype=np.float64)
+
+    def _init_data_container(self, X: np.ndarray, y: np.ndarray):
+        data = regression.default_data_container(X.shape[1])
+
+        for i, (mn, mx) in enumerate(self.bounds):
+            if np.isnan(mx):
+                data.set_type_of_feature(i, mn)
+            else:
+                data.set_bounds_of_feature(i, mn, mx)
+
+        for row_X, row_y in zip(X, y):
+            data.add_data_point(row_X.tolist(), float(row_y))
+        return data
+
+    def _predict(self, X: np.ndarray, cov_return_type='diagonal_cov'):
+        return super()._predict(np.asarray(X, dtype=np.float64), cov_return_type)
+
+    def predict_marginalized_over_instances(self, X: np.ndarray):
+        return super().predict_marginalized_over_instances(np.asarray(X, dtype=np.float64))
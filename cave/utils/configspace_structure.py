@@ -0,0 +1,110 @@
+from collections import OrderedDict
+
+import numpy as np
+from ConfigSpace.configuration_space import ConfigurationSpace
+from ConfigSpace.hyperparameters import CategoricalHyperparameter, NumericalHyperparameter
+
+# Memoized ConfigSpaceStructure per configuration space (by content), see get_configspace_structure
+_STRUCTURE_CACHE = OrderedDict()
+_STRUCTURE_CACHE_SIZE = 8
+
+
+class ConfigSpaceStructure(object):
+    """
+    Structure of a configuration space, precomputed once, so that distances, imputation and plots do not have to
+    query the configuration space per parameter (and per configuration). All arrays are in the order of the vectorized
+    configurations (cs.get_hyperparameters()).
+
+    Attributes
+    ----------
+    names: List[str]
+        names of the hyperparameters
+    index: Dict[str, int]
+        name to column in vectorized configurations
+    is_categorical: np.array
+        boolean mask, whether a parameter is a CategoricalHyperparameter (distance of differing values is 1)
+    is_conditional: np.array
+        boolean mask, whether a parameter has parents
+    depth: np.array
+        depth of each parameter, 1 for unconditional parameters, else 1 + the shortest path to an unconditional
+        parameter
+    default_vector: np.array
+        vectorized default value per parameter
+    limits: OrderedDict
+        name to dict with lower, upper and log (numerical) or choices (categorical), as used by parallel coordinates
+    """
+
+    def __init__(self, cs: ConfigurationSpace):
+        hyperparameters = cs.get_hyperparameters()
+        self.names = [hp.name for hp in hyperparameters]
+        self.index = {name: idx for idx, name in enumerate(self.names)}
+        n = len(self.names)
+
+        self.is_categorical = np.array([type(hp) == CategoricalHyperparameter for hp in hyperparameters], dtype=bool)
+        self.default_vector = np.array([hp._inverse_transform(hp.default_value) for hp in hyperparameters],
+                                       dtype=np.float64)
+
+        # adjacency[p, c] is True if p is a parent of c
+        adjacency = np.zeros((n, n), dtype=bool)
+        for child in self.names:
+            for parent in cs.get_parents_of(child):
+                adjacency[self.index[parent.name], self.index[child]] = True
+        self.is_conditional = adjacency.any(axis=0)
+
+        # Parents come first, so the depth of all parents is known
+        self.depth = np.ones(n, dtype=np.int64)
+        for idx in _topological_order(adjacency):
+            parents = np.flatnonzero(adjacency[:, idx])
+            if len(parents) > 0:
+                self.depth[idx] = 1 + self.depth[parents].min()
+
+        self.limits = OrderedDict()
+        for hp in hyperparameters:
+            if isinstance(hp, NumericalHyperparameter):
+                self.limits[hp.name] = {'lower': hp.lower, 'upper': hp.upper}
+                if hp.log:
+                    self.limits[hp.name]['log'] = True
+            elif isinstance(hp, CategoricalHyperparameter):
+                self.limits[hp.name] = {'lower': 0, 'upper': len(hp.choices) - 1, 'choices': hp.choices}
+
+
+def _topological_order(adjacency):
+    """ Indices of parameters, parents before children """
+    order, done = [], np.zeros(len(adjacency), dtype=bool)
+    while len(order) < len(adjacency):
+        ready = np.flatnonzero(~done & ~(adjacency & ~done[:, np.newaxis]).any(axis=0))
+        if len(ready) == 0:
+            raise ValueError("Conditions of the configuration space are cyclic")
+        order.extend(ready)
+        done[ready] = True
+    return order
+
+
+def get_configspace_structure(cs: ConfigurationSpace):
+    """
+    Memoized ConfigSpaceStructure of a configuration space. Configuration spaces with the same content (e.g. copies
+    in different runs) share one structure.
+
+    Parameters
+    ----------
+    cs: ConfigurationSpace
+        configuration space
+
+    Returns
+    -------
+    structure: ConfigSpaceStructure
+        precomputed structure, must not be modified
+    """
+    key = str(cs)
+    if key in _STRUCTURE_CACHE:
+        _STRUCTURE_CACHE.move_to_end(key)
+    else:
+        _STRUCTURE_CACHE[key] = ConfigSpaceStructure(cs)
+        while len(_STRUCTURE_CACHE) > _STRUCTURE_CACHE_SIZE:
+            _STRUCTURE_CACHE.popitem(last=False)
+    return _STRUCTURE_CACHE[key]
+
+
+def clear_configspace_structure_cache():
+    """ Remove all memoized results of get_configspace_structure """
+    _STRUCTURE_CACHE.clear()
@@ -1,8 +1,11 @@
 #!/bin/python3
 
+import hashlib
+from collections import OrderedDict
+
 import numpy as np
-from ConfigSpace.util import impute_inactive_values
 from smac.epm.rf_with_instances import RandomForestWithInstances
+from smac.configspace import convert_configurations_to_array
 from smac.epm.rfr_imputator import RFRImputator
 from smac.epm.util_funcs import get_types
 from smac.runhistory.runhistory import RunHistory
@@ -11,11 +14,26 @@ from smac.scenario.scenario import Scenario
 from smac.tae.execute_ta_run import StatusType
 from smac.utils.constants import MAXINT
 
+from cave.utils.compact_epm import CompactRandomForestWithInstances, COMPACT_FLOAT, COMPACT_INDEX, COMPACT_STATUS
+from cave.utils.configspace_structure import get_configspace_structure
+
+
+# Memoized (X, Y, types) per (runhistory fingerprint, scenario fingerprint, imputation seed), see convert_data_for_epm
+_EPM_DATA_CACHE = OrderedDict()
+_EPM_DATA_CACHE_SIZE = 8
+
 
-def convert_data_for_epm(scenario: Scenario, runhistory: RunHistory, impute_inactive_parameters=False, rng=None, logger=None):
+def convert_data_for_epm(scenario: Scenario, runhistory: RunHistory, impute_inactive_parameters=False, rng=None,
+                         logger=None, compact=False):
     """
     converts data from runhistory into EPM format
 
+    The conversion (including the imputation of censored data for runtime-scenarios) is memoized per runhistory- and
+    scenario-content (and seed of the imputation), so repeated calls with the same data are cheap. Censored data is
+    imputed once and shared by both modes of `impute_inactive_parameters`. For this, the imputation-model always sees
+    inactive parameters as their defaults (as after imputing them), also for `impute_inactive_parameters=False`,
+    instead of SMAC's own encoding of inactive values, so imputed censored data differs slightly from CAVE <= 1.3.3.
+
     Parameters
     ----------
     scenario: Scenario
@@ -24,6 +42,14 @@ def convert_data_for_epm(scenario: Scenario, runhistory: RunHistory, impute_inac
         smac.runhistory.runhistory.RunHistory Object with all necessary data
     impute_inactive_parameters: bool
         whether to impute all inactive parameters in all configurations - this is needed for random forests, as they do not accept nan-values
+    rng: np.random.RandomState
+        a seed for the imputation of censored data is drawn from it (part of the memoization key for
+        runtime-scenarios), if None, a fixed seed is used
+    logger: logging.Logger
+        logger for debug-messages
+    compact: bool
+        if True, X and y are built in float32 (and memoized in float32, unless float64-data is already memoized),
+        see cave.utils.compact_epm
 
     Returns
     -------
@@ -34,16 +60,182 @@ def convert_data_for_epm(scenario: Scenario, runhistory: RunHistory, impute_inac
     types: np.array
         types of X cols -- necessary to train our RF implementation
     """
-    if rng is None:
-        rng = np.random.RandomState(42)
+    seed = rng.randint(MAXINT) if rng is not None else None
+    # Only the imputation of censored data depends on the seed
+    key = (_fingerprint_runhistory(runhistory), _fingerprint_scenario(scenario),
+           seed if scenario.run_obj == 'runtime' else None)
+    # float64-data can be cast to compact data, but not the other way round
+    if key in _EPM_DATA_CACHE and (compact or _EPM_DATA_CACHE[key][0].dtype != COMPACT_FLOAT):
+        if logger is not None:
+            logger.debug("Using memoized EPM-data for runhistory with %d runs", len(runhistory.data))
+        _EPM_DATA_CACHE.move_to_end(key)
+    else:
+        _EPM_DATA_CACHE[key] = _convert_data_for_epm(scenario, runhistory,
+                                                     np.random.RandomState(seed) if seed is not None else None,
+                                                     logger, compact=compact)
+        _EPM_DATA_CACHE.move_to_end(key)
+        while len(_EPM_DATA_CACHE) > _EPM_DATA_CACHE_SIZE:
+            _EPM_DATA_CACHE.popitem(last=False)
+    X, Y, types = _EPM_DATA_CACHE[key]
+    dtype = COMPACT_FLOAT if compact else X.dtype
+    X, Y, types = X.astype(dtype), Y.astype(dtype), types.copy()
 
     if impute_inactive_parameters:
-        runhistory = force_finite_runhistory(runhistory)
+        num_params = len(scenario.cs.get_hyperparameters())
+        X[:, :num_params] = impute_default_values(scenario.cs, X[:, :num_params])
+
+    return X, Y, types
+
+
+def runhistory_to_arrays(runhistory: RunHistory, compact=False):
+    """
+    Flat arrays describing all runs in the runhistory (in order of runhistory.data), instead of RunKey- and
+    RunValue-objects.
+
+    Parameters
+    ----------
+    runhistory: RunHistory
+        runhistory to convert
+    compact: bool
+        if True, use uint32 for ids/indices, uint8 for status and float32 for budget, cost and time
+
+    Returns
+    -------
+    runs: dict
+        config_id, instance (index into instances), seed, budget, status (StatusType.value), cost, time
+    instances: list
+        instance-ids, referenced by runs['instance']
+    """
+    index_dtype, status_dtype, float_dtype = (COMPACT_INDEX, COMPACT_STATUS, COMPACT_FLOAT) if compact else \
+                                             (np.int64, np.int64, np.float64)
+    instances = sorted({k.instance_id for k in runhistory.data.keys()}, key=str)
+    inst_idx = {inst: idx for idx, inst in enumerate(instances)}
+    n = len(runhistory.data)
+    runs = {'config_id': np.empty(n, dtype=index_dtype),
+            'instance': np.empty(n, dtype=index_dtype),
+            'seed': np.empty(n, dtype=np.int64),
+            'budget': np.empty(n, dtype=float_dtype),
+            'status': np.empty(n, dtype=status_dtype),
+            'cost': np.empty(n, dtype=float_dtype),
+            'time': np.empty(n, dtype=float_dtype),
+            }
+    for idx, (k, v) in enumerate(runhistory.data.items()):
+        runs['config_id'][idx] = k.config_id
+        runs['instance'][idx] = inst_idx[k.instance_id]
+        runs['seed'][idx] = k.seed if k.seed is not None else -1
+        runs['budget'][idx] = k.budget
+        runs['status'][idx] = v.status.value
+        runs['cost'][idx] = v.cost
+        runs['time'][idx] = v.time
+    return runs, instances
+
+
+def clear_epm_data_cache():
+    """ Remove all memoized results of convert_data_for_epm """
+    _EPM_DATA_CACHE.clear()
+
+
+def impute_default_values(cs, X):
+    """
+    Impute the (vectorized) default value for all inactive (non-finite) parameters in X. Equivalent to applying
+    `ConfigSpace.util.impute_inactive_values` to all configurations, but does not need to create Configuration-objects.
+
+    Parameters
+    ----------
+    cs: ConfigurationSpace
+        configuration space of the configurations in X
+    X: np.array
+        vectorized configurations, shape (n_configs, n_hyperparameters)
+
+    Returns
+    -------
+    X: np.array
+        copy of X (same dtype) without non-finite values
+    """
+    X = np.array(X)
+    nonfinite_mask = ~np.isfinite(X)
+    X[nonfinite_mask] = np.broadcast_to(get_configspace_structure(cs).default_vector, X.shape)[nonfinite_mask]
+    return X
+
+
+def _fingerprint_runhistory(runhistory):
+    """ Hash of all runs and configurations in the runhistory """
+    h = hashlib.sha1()
+    for k, v in runhistory.data.items():
+        h.update(repr((k, v.cost, v.time, v.status)).encode())
+    for config_id in sorted(runhistory.ids_config.keys()):
+        h.update(repr(config_id).encode())
+        h.update(runhistory.ids_config[config_id].get_array().tobytes())
+    return h.hexdigest()
+
+
+def _fingerprint_scenario(scenario):
+    """ Hash of everything in the scenario that the conversion depends on (configspace, features, imputation) """
+    h = hashlib.sha1()
+    h.update(repr((scenario.run_obj, scenario.cutoff, scenario.par_factor)).encode())
+    h.update(str(scenario.cs).encode())
+    if scenario.feature_array is not None:
+        h.update(repr(np.asarray(scenario.feature_array).shape).encode())
+        h.update(np.ascontiguousarray(scenario.feature_array, dtype=np.float64).tobytes())
+    for inst in sorted(scenario.feature_dict.keys()):
+        h.update(repr(inst).encode())
+        h.update(np.ascontiguousarray(scenario.feature_dict[inst], dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+
+class _CompactMatrixMixin(object):
+    """
+    Builds the matrices of a RunHistory2EPM-object directly in COMPACT_FLOAT, vectorizing each configuration and
+    instance only once instead of creating a float64-row per run.
+    """
+
+    def _build_matrix(self, run_dict, runhistory, return_time_as_y=False, store_statistics=False):
+        keys = list(run_dict.keys())
+        X = np.empty((len(keys), self.num_params + self.n_feats), dtype=COMPACT_FLOAT)
+        y = np.array([run.time if return_time_as_y else run.cost for run in run_dict.values()],
+                     dtype=np.float64).reshape(-1, 1)
+        if keys:
+            config_ids, config_idx = np.unique([k.config_id for k in keys], return_inverse=True)
+            configs = convert_configurations_to_array([runhistory.ids_config[c] for c in config_ids])
+            X[:, :self.num_params] = configs.astype(COMPACT_FLOAT)[config_idx]
+            if self.n_feats:
+                instances = sorted({k.instance_id for k in keys}, key=str)
+                inst_idx = {inst: idx for idx, inst in enumerate(instances)}
+                feats = np.array([self.instance_features[inst] for inst in instances], dtype=COMPACT_FLOAT)
+                X[:, self.num_params:] = feats[[inst_idx[k.instance_id] for k in keys]]
+        if y.size > 0:
+            if store_statistics:
+                self.perc = np.percentile(y, self.scale_perc)
+                self.min_y = np.min(y)
+                self.max_y = np.max(y)
+            y = self.transform_response_values(values=y)
+        return X, y.astype(COMPACT_FLOAT)
+
+
+class CompactRunHistory2EPM4Cost(_CompactMatrixMixin, RunHistory2EPM4Cost):
+    """ RunHistory2EPM4Cost with float32-matrices """
+
+
+class CompactRunHistory2EPM4LogCost(_CompactMatrixMixin, RunHistory2EPM4LogCost):
+    """ RunHistory2EPM4LogCost with float32-matrices """
+
+
+def _convert_data_for_epm(scenario, runhistory, rng=None, logger=None, compact=False):
+    """ Actual conversion of convert_data_for_epm (without inactive parameters imputed) """
+    if rng is None:
+        rng = np.random.RandomState(42)
 
     types, bounds = get_types(scenario.cs, scenario.feature_array)
     if logger is not None:
         logger.debug("Types: " + str(types) + ", Bounds: " + str(bounds))
-    model = RandomForestWithInstances(scenario.cs, types, bounds, rng.randint(MAXINT))
+    model_class = CompactRandomForestWithInstances if compact else RandomForestWithInstances
+    model = model_class(scenario.cs, types, bounds, rng.randint(MAXINT))
+    # Let the imputation-model see inactive parameters as their defaults, so the imputed values are independent of
+    # impute_inactive_parameters and can be shared
+    structure = get_configspace_structure(scenario.cs)
+    for idx in range(len(structure.names)):
+        model.conditional[idx] = bool(structure.is_conditional[idx])
+        model.impute_values[idx] = structure.default_vector[idx]
 
     params = scenario.cs.get_hyperparameters()
     num_params = len(params)
@@ -65,37 +257,28 @@ def convert_data_for_epm(scenario: Scenario, runhistory: RunHistory, impute_inac
                                change_threshold=0.01,
                                max_iter=10)
         # TODO: Adapt runhistory2EPM object based on scenario
-        rh2EPM = RunHistory2EPM4LogCost(scenario=scenario,
-                                        num_params=num_params,
-                                        success_states=[
-                                            StatusType.SUCCESS, ],
-                                        impute_censored_data=True,
-                                        impute_state=[
-                                            StatusType.TIMEOUT, ],
-                                        imputor=imputor)
+        rh2EPM_class = CompactRunHistory2EPM4LogCost if compact else RunHistory2EPM4LogCost
+        rh2EPM = rh2EPM_class(scenario=scenario,
+                              num_params=num_params,
+                              success_states=[
+                                  StatusType.SUCCESS, ],
+                              impute_censored_data=True,
+                              impute_state=[
+                                  StatusType.TIMEOUT, ],
+                              imputor=imputor)
         X, Y = rh2EPM.transform(runhistory)
     else:
-        rh2EPM = RunHistory2EPM4Cost(scenario=scenario,
-                                     num_params=num_params,
-                                     success_states=[
-                                         StatusType.SUCCESS, ],
-                                     impute_censored_data=False,
-                                     impute_state=None)
+        rh2EPM_class = CompactRunHistory2EPM4Cost if compact else RunHistory2EPM4Cost
+        rh2EPM = rh2EPM_class(scenario=scenario,
+                              num_params=num_params,
+                              success_states=[
+                                  StatusType.SUCCESS, ],
+                              impute_censored_data=False,
+                              impute_state=None)
         X, Y = rh2EPM.transform(runhistory)
 
-    return X, Y, types
-
-def force_finite_runhistory(runhistory):
-
-    def sanitize_config(config):
-        cs_no_forbidden = config.configuration_space
-        cs_no_forbidden.forbidden_clauses = []
-        config.configuration_space = cs_no_forbidden
-        return impute_inactive_values(config)
-
+    if compact:
+        # Imputed values are float64
+        Y = Y.astype(COMPACT_FLOAT, copy=False)
+    return X, Y, np.array(types)
 
-    new_config_ids = {sanitize_config(config) : id for config, id in runhistory.config_ids.items()}
-    new_ids_config = {id : sanitize_config(config) for id, config in runhistory.ids_config.items()}
-    runhistory.ids_config = new_ids_config
-    runhistory.config_ids = new_config_ids
-    return runhistory
@@ -0,0 +1,131 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+def pairwise_config_distances(conf_matrix, is_cat, depth, max_memory_mb=256, n_jobs=1, out_path=None, logger=None):
+    """
+    Compute the distance between all pairs of (vectorized) configurations. The distance between two configurations
+    is the sum over all parameters of the absolute difference (1 if the parameter is categorical and differs or if
+    it is inactive in any of the two configurations), each weighted with 1 / depth of the parameter.
+
+    The upper triangle is computed in blocks of rows, the size of a block is chosen so that the temporary arrays fit
+    into `max_memory_mb`. Blocks are independent and can be processed by a thread pool.
+
+    Parameters
+    ----------
+    conf_matrix: np.array
+        configurations (rows) with vectorized parameter values (cols), inactive values are nan
+    is_cat: np.array
+        boolean mask, whether a parameter is categorical
+    depth: np.array
+        depth of parameters in the configuration space
+    max_memory_mb: int
+        memory budget for the temporary arrays of one block (per thread)
+    n_jobs: int
+        number of threads
+    out_path: str
+        if given, the distances are written into a float32-memmap at this path (for large numbers of configurations)
+    logger: logging.Logger
+        to log progress
+
+    Returns
+    -------
+    dists: np.array
+        symmetric matrix with distances between configurations i,j in dists[i,j] and dists[j,i]
+    """
+    logger = logger if logger else logging.getLogger(__name__)
+    conf_matrix = np.asarray(conf_matrix, dtype=np.float64)
+    is_cat, depth = np.asarray(is_cat, dtype=bool), np.asarray(depth, dtype=np.float64)
+    n_confs, n_params = conf_matrix.shape
+
+    if out_path:
+        dists = np.memmap(out_path, dtype=np.float32, mode='w+', shape=(n_confs, n_confs))
+    else:
+        dists = np.zeros((n_confs, n_confs))
+
+    # Two temporaries of shape (block_size, n_confs, n_params) are alive at a time
+    block_size = int(max_memory_mb * 2 ** 20 / (2 * 8 * max(n_confs, 1) * max(n_params, 1)))
+    block_size = min(max(block_size, 1), max(n_confs, 1))
+    blocks = [(start, min(start + block_size, n_confs)) for start in range(0, n_confs, block_size)]
+    logger.debug("Computing distances of %d configurations in %d blocks of %d rows with %d threads",
+                 n_confs, len(blocks), block_size, n_jobs)
+
+    def compute_block(block):
+        start, end = block
+        block_dists = _distances(conf_matrix[start:end], conf_matrix[start:], is_cat, depth)
+        # Distance of a configuration to itself is 0 (even if it has inactive parameters)
+        block_dists[np.arange(end - start), np.arange(end - start)] = 0
+        dists[start:end, start:] = block_dists
+        dists[start:, start:end] = block_dists.T
+
+    start_time = time.time()
+    if n_jobs == 1:
+        for idx, block in enumerate(blocks):
+            compute_block(block)
+            if 5 < len(blocks) and idx % (len(blocks) // 5) == 0:
+                logger.debug("%.2f%% of all distances calculated in %.2f seconds...", 100 * idx / len(blocks),
+                             time.time() - start_time)
+    else:
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            list(executor.map(compute_block, blocks))
+    if out_path:
+        dists.flush()
+    return dists
+
+
+def config_distances(conf_matrix_a, conf_matrix_b, is_cat, depth, max_memory_mb=256, n_jobs=1):
+    """
+    Compute the distances (see pairwise_config_distances) between all configurations in conf_matrix_a and all
+    configurations in conf_matrix_b, e.g. between all configurations and a set of landmarks.
+
+    Parameters
+    ----------
+    conf_matrix_a, conf_matrix_b: np.array
+        configurations (rows) with vectorized parameter values (cols), inactive values are nan
+    is_cat: np.array
+        boolean mask, whether a parameter is categorical
+    depth: np.array
+        depth of parameters in the configuration space
+    max_memory_mb: int
+        memory budget for the temporary arrays of one block (per thread)
+    n_jobs: int
+        number of threads
+
+    Returns
+    -------
+    dists: np.array
+        matrix of shape (len(conf_matrix_a), len(conf_matrix_b))
+    """
+    conf_matrix_a = np.asarray(conf_matrix_a, dtype=np.float64)
+    conf_matrix_b = np.asarray(conf_matrix_b, dtype=np.float64)
+    is_cat, depth = np.asarray(is_cat, dtype=bool), np.asarray(depth, dtype=np.float64)
+    n_a, n_b, n_params = conf_matrix_a.shape[0], conf_matrix_b.shape[0], conf_matrix_a.shape[1]
+    dists = np.zeros((n_a, n_b))
+
+    block_size = int(max_memory_mb * 2 ** 20 / (2 * 8 * max(n_b, 1) * max(n_params, 1)))
+    block_size = min(max(block_size, 1), max(n_a, 1))
+    blocks = [(start, min(start + block_size, n_a)) for start in range(0, n_a, block_size)]
+
+    def compute_block(block):
+        start, end = block
+        dists[start:end] = _distances(conf_matrix_a[start:end], conf_matrix_b, is_cat, depth)
+
+    if n_jobs == 1:
+        for block in blocks:
+            compute_block(block)
+    else:
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            list(executor.map(compute_block, blocks))
+    return dists
+
+
+def _distances(conf_matrix_a, conf_matrix_b, is_cat, depth):
+    """ Distances between all rows of a and all rows of b """
+    dist = np.abs(conf_matrix_a[:, np.newaxis, :] - conf_matrix_b[np.newaxis, :, :])
+    dist[np.isnan(dist)] = 1
+    dist[np.logical_and(is_cat, dist != 0)] = 1
+    dist /= depth
+    return np.sum(dist, axis=2)
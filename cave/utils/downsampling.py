@@ -0,0 +1,71 @@
+import numpy as np
+
+
+def downsample(x, y, max_points, method='lttb'):
+    """
+    Select at most max_points points of a line to be plotted, so the size of reports and the render time in the
+    browser are bounded, independent of the length of the line. First and last point are always kept.
+
+    Parameters
+    ----------
+    x, y: np.array
+        coordinates of the line, x sorted
+    max_points: int
+        maximum number of points, if <= 0, no downsampling
+    method: str
+        from ['lttb', 'minmax']. lttb (largest-triangle-three-buckets) keeps the visual shape of the line, minmax
+        keeps minimum and maximum of each bucket (and therefore the extremes of the line, e.g. for step-functions)
+
+    Returns
+    -------
+    indices: np.array
+        sorted indices of the selected points, use them to select aligned data (e.g. configurations or bands)
+    """
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    if len(x) != len(y):
+        raise ValueError("x and y must have the same length (%d != %d)" % (len(x), len(y)))
+    if max_points <= 0 or len(x) <= max_points:
+        return np.arange(len(x))
+    if max_points < 3:
+        return np.array([0, len(x) - 1])[:max_points]
+    if method == 'lttb':
+        return _lttb(x, y, max_points)
+    elif method == 'minmax':
+        return _minmax(y, max_points)
+    else:
+        raise ValueError("%s is not a supported downsampling method, choose from lttb or minmax" % method)
+
+
+def _lttb(x, y, n_out):
+    """ Largest-triangle-three-buckets (Steinarsson, 2013), inner points are split into n_out - 2 buckets """
+    n = len(x)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for bucket in range(n_out - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start, next_end = (end, edges[bucket + 2]) if bucket + 2 < len(edges) else (n - 1, n)
+        avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        # Twice the area of the triangles between the last selected point, the candidates and the next bucket's mean
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        indices[bucket + 1] = a
+    return indices
+
+
+def _minmax(y, n_out):
+    """ Minimum and maximum of (n_out - 2) // 2 buckets of inner points """
+    n = len(y)
+    n_buckets = (n_out - 2) // 2
+    if n_buckets == 0:
+        return np.array([0, n - 1])
+    edges = np.linspace(1, n - 1, n_buckets + 1).astype(np.int64)
+    inner = np.arange(1, n - 1)
+    bucket = np.searchsorted(edges, inner, side='right') - 1
+    # Sorted by bucket, then value: first of a bucket is its minimum, last its maximum. Buckets are already sorted,
+    # so they keep their positions
+    order = inner[np.lexsort((y[inner], bucket))]
+    first = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    last = np.r_[first[1:] - 1, len(order) - 1]
+    return np.unique(np.concatenate([[0], order[first], order[last], [n - 1]]))
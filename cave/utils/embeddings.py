@@ -0,0 +1,281 @@
+import hashlib
+import os
+
+import numpy as np
+from scipy.spatial.distance import cdist
+from sklearn.decomposition import PCA
+from sklearn.manifold import MDS, SpectralEmbedding
+from sklearn.random_projection import GaussianRandomProjection
+
+from cave.utils.distances import pairwise_config_distances
+
+# Backends that embed a feature representation of the configurations (no distance matrix needed)
+FEATURE_EMBEDDINGS = ['pca', 'random_projection', 'spectral']
+EMBEDDINGS = ['mds', 'landmark_mds'] + FEATURE_EMBEDDINGS
+
+
+def select_landmarks(n_confs, num_landmarks, fixed=None, rng=None):
+    """
+    Select landmarks for landmark-MDS. All fixed indices (e.g. default and incumbents) are landmarks, the rest is a
+    stratified sample over the order of the configurations (one random configuration per stratum), so that
+    configurations from all phases of the configurator run are represented.
+
+    Parameters
+    ----------
+    n_confs: int
+        number of configurations
+    num_landmarks: int
+        number of landmarks (if fewer fixed indices than this)
+    fixed: List[int]
+        indices that are landmarks in any case
+    rng: np.random.RandomState
+        random number generator
+
+    Returns
+    -------
+    landmarks: np.array
+        sorted indices of landmarks
+    """
+    rng = rng if rng is not None else np.random.RandomState(42)
+    fixed = np.unique(np.asarray(fixed if fixed is not None else [], dtype=np.int64))
+    rest = np.setdiff1d(np.arange(n_confs), fixed)
+    num_sampled = min(max(num_landmarks - len(fixed), 0), len(rest))
+    if num_sampled == 0:
+        return fixed
+    strata = np.array_split(rest, num_sampled)
+    sampled = np.array([rng.choice(stratum) for stratum in strata], dtype=np.int64)
+    return np.sort(np.concatenate([fixed, sampled]))
+
+
+def classical_mds(dists, n_components=2):
+    """
+    Classical (Torgerson) MDS via eigendecomposition of the double-centered squared distances.
+
+    Parameters
+    ----------
+    dists: np.array
+        symmetric matrix of distances
+    n_components: int
+        dimensions of the embedding
+
+    Returns
+    -------
+    coords: np.array
+        embedded points, shape (len(dists), n_components)
+    """
+    n = dists.shape[0]
+    centering = np.eye(n) - np.ones((n, n)) / n
+    b = -0.5 * centering.dot(dists ** 2).dot(centering)
+    eigenvalues, eigenvectors = np.linalg.eigh(b)
+    order = np.argsort(eigenvalues)[::-1][:n_components]
+    eigenvalues = np.clip(eigenvalues[order], 0, None)
+    return eigenvectors[:, order] * np.sqrt(eigenvalues)
+
+
+def landmark_mds(landmark_dists, landmarks, method='classical', n_components=2, random_state=12345):
+    """
+    Landmark-MDS (de Silva & Tenenbaum, 2004): embed the landmarks with MDS and triangulate all other points from
+    their distances to the landmarks. Needs only the distances to the landmarks, O(n*k) instead of O(n^2).
+
+    Parameters
+    ----------
+    landmark_dists: np.array
+        distances of all points to the landmarks, shape (n, k)
+    landmarks: np.array
+        indices of the landmarks (rows of landmark_dists), so that landmark_dists[landmarks] are the distances
+        between landmarks
+    method: str
+        'classical' or 'smacof' (sklearn's MDS), how to embed the landmarks
+    n_components: int
+        dimensions of the embedding
+    random_state: int
+        seed for smacof
+
+    Returns
+    -------
+    coords: np.array
+        embedded points, shape (n, n_components)
+    stress: float
+        stress of the embedding of the landmarks (only for smacof, else None)
+    """
+    between_landmarks = landmark_dists[landmarks]
+    between_landmarks = (between_landmarks + between_landmarks.T) / 2
+    stress = None
+    if method == 'classical':
+        landmark_coords = classical_mds(between_landmarks, n_components)
+    elif method == 'smacof':
+        mds = MDS(n_components=n_components, dissimilarity="precomputed", random_state=random_state)
+        landmark_coords = mds.fit_transform(between_landmarks)
+        stress = mds.stress_
+    else:
+        raise ValueError("Unknown method for landmark-MDS: %s" % method)
+
+    # Triangulation: x = -1/2 * pinv(L) * (delta_x - delta_mean), with centered landmark coordinates L
+    center = landmark_coords.mean(axis=0)
+    pseudo_inverse = np.linalg.pinv(landmark_coords - center)
+    delta_mean = (between_landmarks ** 2).mean(axis=0)
+    coords = -0.5 * (landmark_dists ** 2 - delta_mean).dot(pseudo_inverse.T) + center
+    # Landmarks keep the coordinates of their embedding
+    coords[landmarks] = landmark_coords
+    return coords, stress
+
+
+def config_features(conf_matrix, is_cat, depth):
+    """
+    Feature representation of (vectorized) configurations, so that the L1-distance between features approximates the
+    configuration distance (see pairwise_config_distances). Categorical parameters are one-hot encoded (with an extra
+    column for inactive values) and scaled by 0.5, so differing choices have a distance of 1. Inactive numerical values
+    are set to -1. All columns are weighted with 1 / depth of the parameter.
+
+    Parameters
+    ----------
+    conf_matrix: np.array
+        configurations (rows) with vectorized parameter values (cols), inactive values are nan
+    is_cat: np.array
+        boolean mask, whether a parameter is categorical
+    depth: np.array
+        depth of parameters in the configuration space
+
+    Returns
+    -------
+    features: np.array
+        feature matrix with one row per configuration
+    """
+    conf_matrix = np.asarray(conf_matrix, dtype=np.float64)
+    columns = [np.zeros((conf_matrix.shape[0], 0))]
+    for idx in range(conf_matrix.shape[1]):
+        values = conf_matrix[:, idx]
+        inactive = np.isnan(values)
+        if is_cat[idx]:
+            choices = np.unique(values[~inactive])
+            one_hot = np.c_[values[:, np.newaxis] == choices[np.newaxis, :], inactive]
+            columns.append(0.5 * one_hot / depth[idx])
+        else:
+            columns.append((np.where(inactive, -1, values) / depth[idx])[:, np.newaxis])
+    return np.hstack(columns)
+
+
+def feature_embedding(features, method, n_components=2, n_jobs=1, random_state=12345):
+    """
+    Embed a feature representation of the configurations (see config_features) in linear or quasi-linear time.
+
+    Parameters
+    ----------
+    features: np.array
+        feature matrix with one row per configuration
+    method: str
+        'pca' (principal components), 'random_projection' (gaussian random projection) or 'spectral' (laplacian
+        eigenmaps on the nearest-neighbors graph, parallel with n_jobs)
+    n_components: int
+        dimensions of the embedding
+    n_jobs: int
+        number of jobs for the nearest-neighbors search (spectral only)
+    random_state: int
+        seed
+
+    Returns
+    -------
+    coords: np.array
+        embedded points, shape (len(features), n_components)
+    """
+    n_samples = features.shape[0]
+    if features.shape[1] < n_components:
+        features = np.c_[features, np.zeros((n_samples, n_components - features.shape[1]))]
+    if method == 'pca':
+        return PCA(n_components=n_components, random_state=random_state).fit_transform(features)
+    elif method == 'random_projection':
+        return GaussianRandomProjection(n_components=n_components, random_state=random_state).fit_transform(features)
+    elif method == 'spectral':
+        spectral = SpectralEmbedding(n_components=n_components, affinity='nearest_neighbors',
+                                     n_neighbors=max(1, min(10, n_samples - 1)), random_state=random_state,
+                                     n_jobs=n_jobs)
+        return spectral.fit_transform(features)
+    raise ValueError("Unknown feature embedding: %s (choose from %s)" % (method, ", ".join(FEATURE_EMBEDDINGS)))
+
+
+def normalized_stress(dists, coords, block_size=1024):
+    """
+    Kruskal's stress-1 of an embedding after optimally scaling the embedded distances, so it is comparable between
+    embeddings of different scale (0 is a perfect embedding, 1 is no better than placing all points on one spot).
+    Computed in blocks of rows, so the embedded distances never have to be kept in memory at once.
+
+    Parameters
+    ----------
+    dists: np.array
+        symmetric matrix of original distances
+    coords: np.array
+        embedded points
+    block_size: int
+        number of rows per block
+
+    Returns
+    -------
+    stress: float
+        normalized stress
+    """
+    sum_de, sum_ee, sum_dd = 0., 0., 0.
+    for start in range(0, len(coords), block_size):
+        d = np.asarray(dists[start:start + block_size], dtype=np.float64)
+        e = cdist(coords[start:start + block_size], coords)
+        sum_de, sum_ee, sum_dd = sum_de + np.sum(d * e), sum_ee + np.sum(e * e), sum_dd + np.sum(d * d)
+    if sum_dd == 0 or sum_ee == 0:
+        return 0. if sum_dd == sum_ee else 1.
+    return float(np.sqrt(max(1 - sum_de ** 2 / (sum_ee * sum_dd), 0)))
+
+
+def sampled_normalized_stress(conf_matrix, coords, is_cat, depth, sample_size=1000, n_jobs=1, random_state=12345):
+    """
+    Normalized stress (see normalized_stress) estimated on a random sample of configurations, for embeddings that
+    never compute the full distance matrix.
+
+    Parameters
+    ----------
+    conf_matrix: np.array
+        configurations (rows) with vectorized parameter values (cols), inactive values are nan
+    coords: np.array
+        embedded points
+    is_cat: np.array
+        boolean mask, whether a parameter is categorical
+    depth: np.array
+        depth of parameters in the configuration space
+    sample_size: int
+        number of configurations to estimate the stress on
+    n_jobs: int
+        number of threads to compute distances with
+    random_state: int
+        seed for the sample
+
+    Returns
+    -------
+    stress: float
+        normalized stress on the sample
+    """
+    sample = np.arange(len(coords))
+    if len(sample) > sample_size:
+        sample = np.sort(np.random.RandomState(random_state).choice(sample, sample_size, replace=False))
+    dists = pairwise_config_distances(conf_matrix[sample], is_cat, depth, n_jobs=n_jobs)
+    return normalized_stress(dists, coords[sample])
+
+
+def embedding_cache_path(cache_dir, conf_matrix, **params):
+    """
+    Path to cache an embedding at, unique for the configurations and the parameters of the embedding.
+
+    Parameters
+    ----------
+    cache_dir: str
+        directory for cached embeddings
+    conf_matrix: np.array
+        configurations (rows) with vectorized parameter values (cols)
+    params: dict
+        all parameters the embedding depends on (method, seeds, ...)
+
+    Returns
+    -------
+    path: str
+        path to a .npz-file (that might not exist yet)
+    """
+    sha = hashlib.sha1(np.ascontiguousarray(conf_matrix, dtype=np.float64).tobytes())
+    sha.update(str(conf_matrix.shape).encode())
+    sha.update(str(sorted(params.items())).encode())
+    return os.path.join(cache_dir, 'cfp_embedding_{}_{}.npz'.format(params.get('method', ''), sha.hexdigest()))
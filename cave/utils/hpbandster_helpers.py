@@ -2,10 +2,13 @@
 Here are helper functions needed to provide a certain behaviour of HpBandSter, such as special trajectories.
 """
 
+import copy
 from collections import OrderedDict
 
 import numpy as np
 
+TRAJECTORY_MODES = ['racing', 'minimum', 'prefer_higher_budget']
+
 
 def format_budgets(budgets, allow_whitespace=False):
     """
@@ -59,11 +62,7 @@ def get_incumbent_trajectory(result, budgets=None, mode='racing'):
     """
     if budgets is None:
         budgets = list(result.HB_config['budgets'])
-    if not isinstance(budgets, list):
-        raise ValueError("%s not a valid argument for 'budgets'" % str(budgets))
-    if any([budget not in result.HB_config['budgets'] for budget in budgets]):
-        raise ValueError("Budget '{}' (type: {}) does not exist. Choose from {}".format(str(budget), str(type(budget)),
-            "[" + ", ".join([str(b) + " (type: " + str(type(b)) + ")" for b in result.HB_config['budgets']]) + "]"))
+    _check_budgets(result, budgets)
 
     if mode == 'racing':
         # Philipp's method
@@ -71,23 +70,7 @@ def get_incumbent_trajectory(result, budgets=None, mode='racing'):
         all_runs = list(filter(lambda r: r.budget in budgets, all_runs))
         all_runs.sort(key=lambda run: run.time_stamps['finished'])  # ensure that all_runs and budgets is sorted in ascending order
         budgets.sort()
-
-        return_dict = {'config_ids': [],
-                       'times_finished': [],
-                       'budgets': [],
-                       'losses': [],
-                       'config': [],
-                       }
-        last_run = None
-        for r in _compute_trajectory_racing(all_runs, budgets):
-            if last_run is None or last_run is not r:
-                return_dict['config_ids'].append(r.config_id)
-                return_dict['times_finished'].append(r.time_stamps['finished'])
-                return_dict['budgets'].append(r.budget)
-                return_dict['losses'].append(r.loss)
-                return_dict['config'].append(result.get_id2config_mapping()[r.config_id])
-            last_run = r
-        return return_dict
+        return _get_trajectory_racing(all_runs, budgets, result.get_id2config_mapping())
     else:
         # HpBandSter's method (adapted for single budgets)
         if mode == 'minimum':
@@ -99,6 +82,110 @@ def get_incumbent_trajectory(result, budgets=None, mode='racing'):
         else:
             raise ValueError("'%s' not a supported method for get_incumbent_trajectory" % mode)
 
+def get_incumbent_trajectories(result, budget_sets=None, modes=None):
+    """
+    Incumbent trajectories for several modes and sets of budgets at once. The runs are fetched and sorted by their
+    finishing time once and distributed to the sets of budgets in one pass, instead of once per trajectory (as in
+    get_incumbent_trajectory).
+
+    Parameters
+    ----------
+    result: hpbandster.core.result.Result
+        result object
+    budget_sets: List[List[str|int|float]]
+        sets of budgets to compute trajectories for, defaults to all budgets and each single budget
+    modes: List[str]
+        subset of ['racing', 'minimum', 'prefer_higher_budget'], defaults to all
+
+    Returns
+    -------
+    trajectories: OrderedDict
+        (mode, tuple of sorted budgets) -> trajectory as returned by get_incumbent_trajectory
+    """
+    all_budgets = list(result.HB_config['budgets'])
+    if budget_sets is None:
+        budget_sets = [all_budgets] + [[b] for b in all_budgets]
+    modes = TRAJECTORY_MODES if modes is None else modes
+    for mode in modes:
+        if mode not in TRAJECTORY_MODES:
+            raise ValueError("'%s' not a supported method for get_incumbent_trajectory" % mode)
+    budget_sets = [sorted(budgets) for budgets in budget_sets]
+    for budgets in budget_sets:
+        _check_budgets(result, budgets)
+
+    all_runs = result.get_all_runs(only_largest_budget=False)
+    all_runs.sort(key=lambda run: run.time_stamps['finished'])
+    sets_per_budget = {b: [idx for idx, budgets in enumerate(budget_sets) if b in budgets] for b in all_budgets}
+    runs_per_set = [[] for _ in budget_sets]
+    for run in all_runs:
+        for idx in sets_per_budget.get(run.budget, []):
+            runs_per_set[idx].append(run)
+
+    id2config = result.get_id2config_mapping()
+    trajectories = OrderedDict()
+    for budgets, runs in zip(budget_sets, runs_per_set):
+        for mode in modes:
+            if mode == 'racing':
+                trajectory = _get_trajectory_racing(runs, budgets, id2config)
+            else:
+                trajectory = _get_trajectory_hpbandster(runs, id2config, result.HB_config['min_budget'],
+                                                        bigger_is_better=mode == 'prefer_higher_budget',
+                                                        non_decreasing_budget=mode == 'prefer_higher_budget')
+            trajectories[(mode, tuple(budgets))] = trajectory
+    return trajectories
+
+def _check_budgets(result, budgets):
+    """ Raise ValueError if budgets is not a list of budgets in the result """
+    if not isinstance(budgets, list):
+        raise ValueError("%s not a valid argument for 'budgets'" % str(budgets))
+    for budget in budgets:
+        if budget not in result.HB_config['budgets']:
+            raise ValueError("Budget '{}' (type: {}) does not exist. Choose from {}".format(
+                str(budget), str(type(budget)),
+                "[" + ", ".join([str(b) + " (type: " + str(type(b)) + ")" for b in result.HB_config['budgets']]) + "]"))
+
+def _get_trajectory_racing(all_runs, budgets, id2config):
+    """
+    Trajectory-dict in racing mode, see _compute_trajectory_racing. Racing moves the finishing time of incumbents,
+    so it works on copies of the runs (their time stamps belong to the result).
+
+    Parameters
+    ----------
+    all_runs: List[hpbandster.core.result.Run]
+        runs on budgets, sorted by their finishing time
+    budgets: List[float]
+        budgets in ascending order
+    id2config: dict
+        id2config-mapping of the result
+
+    Returns
+    -------
+    trajectory: dict
+        see get_incumbent_trajectory
+    """
+    runs = []
+    for run in all_runs:
+        run = copy.copy(run)
+        run.time_stamps = dict(run.time_stamps)
+        runs.append(run)
+
+    return_dict = {'config_ids': [],
+                   'times_finished': [],
+                   'budgets': [],
+                   'losses': [],
+                   'config': [],
+                   }
+    last_run = None
+    for r in _compute_trajectory_racing(runs, budgets):
+        if last_run is None or last_run is not r:
+            return_dict['config_ids'].append(r.config_id)
+            return_dict['times_finished'].append(r.time_stamps['finished'])
+            return_dict['budgets'].append(r.budget)
+            return_dict['losses'].append(r.loss)
+            return_dict['config'].append(id2config[r.config_id])
+        last_run = r
+    return return_dict
+
 def _compute_trajectory_racing(all_runs, budgets):
     """
     Computes the trajectory in racing mode.
@@ -220,6 +307,29 @@ def _get_incumbent_trajectory_hpbandster(result, budgets, bigger_is_better=True,
 
     all_runs.sort(key=lambda r: r.time_stamps['finished'])
 
+    return _get_trajectory_hpbandster(all_runs, id2config, result.HB_config['min_budget'],
+                                      bigger_is_better=bigger_is_better, non_decreasing_budget=non_decreasing_budget)
+
+def _get_trajectory_hpbandster(all_runs, id2config, min_budget, bigger_is_better=True, non_decreasing_budget=True):
+    """
+    Trajectory-dict as in hpbandster, see _get_incumbent_trajectory_hpbandster
+
+    Parameters
+    ----------
+    all_runs: List[hpbandster.core.result.Run]
+        runs on the considered budgets, sorted by their finishing time
+    id2config: dict
+        id2config-mapping of the result
+    min_budget: float
+        minimum budget of the result
+    bigger_is_better, non_decreasing_budget: bool
+        see _get_incumbent_trajectory_hpbandster
+
+    Returns
+    -------
+    trajectory: dict
+        see get_incumbent_trajectory
+    """
     return_dict = { 'config_ids' : [],
                     'times_finished': [],
                     'budgets'    : [],
@@ -228,7 +338,7 @@ def _get_incumbent_trajectory_hpbandster(result, budgets, bigger_is_better=True,
     }
 
     current_incumbent = float('inf')
-    incumbent_budget = result.HB_config['min_budget']
+    incumbent_budget = min_budget
 
     for r in all_runs:
         if r.loss is None or not np.isfinite(r.loss):
@@ -255,7 +365,7 @@ def _get_incumbent_trajectory_hpbandster(result, budgets, bigger_is_better=True,
             return_dict['losses'].append(r.loss)
             return_dict['config'].append(id2config[r.config_id])
 
-    if current_incumbent != r.loss:
+    if return_dict['config_ids'] and current_incumbent != r.loss:
         r = all_runs[-1]
 
         return_dict['config_ids'].append(return_dict['config_ids'][-1])
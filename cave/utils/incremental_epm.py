@@ -0,0 +1,269 @@
+import logging
+import os
+import pickle
+
+import numpy as np
+from smac.epm.rf_with_instances import RandomForestWithInstances
+from smac.epm.util_funcs import get_types
+from smac.runhistory.runhistory import RunHistory
+from smac.runhistory.runhistory2epm import RunHistory2EPM4Cost
+from smac.tae.execute_ta_run import StatusType
+from smac.utils.constants import MAXINT
+
+from cave.utils.compact_epm import CompactRandomForestWithInstances
+from cave.utils.convert_for_epm import CompactRunHistory2EPM4Cost, _fingerprint_scenario
+from cave.utils.marginalized_forest import predict_marginalized_over_instances
+
+
+class IncrementalEPM(object):
+    """
+    Random forest EPM that can be updated with the new runs of a growing runhistory instead of being retrained from
+    scratch. The model consists of generations of small forests. Each update grows a new generation on the runs that
+    were not seen before plus a replay-sample of a fixed share of the older data and retires the oldest generations
+    once more than `max_trees` trees are held. Generations are weighted by the amount of data they were trained on.
+    If the runhistory changed too much since the last full retrain (too many new runs, runs were removed or changed),
+    a full retrain is performed instead. A pickled model is only loaded for the scenario it was trained on.
+    """
+
+    def __init__(self,
+                 scenario,
+                 rng=None,
+                 num_trees=10,
+                 max_trees=30,
+                 retrain_ratio=0.2,
+                 replay_ratio=0.5,
+                 compact=False,
+                 ):
+        """
+        Parameters
+        ----------
+        scenario: Scenario
+            scenario to get configspace, instance features and run objective from
+        rng: np.random.RandomState
+            random number generator, used for seeding the forests and subsampling old data
+        num_trees: int
+            number of trees per generation, a full retrain creates `max_trees // num_trees` generations
+        max_trees: int
+            upper bound on the total number of trees, oldest generations are retired beyond this
+        retrain_ratio: float
+            if the fraction of runs added since the last full retrain is larger than this, a full retrain is
+            performed
+        replay_ratio: float
+            fraction of the previously seen data that is replayed (sampled without replacement) when growing a new
+            generation
+        compact: bool
+            keep the training data in float32 and train CompactRandomForestWithInstances (halves memory of the
+            kept training data)
+        """
+        self.logger = logging.getLogger(self.__module__ + '.' + self.__class__.__name__)
+        if max_trees < num_trees:
+            raise ValueError("max_trees (%d) must not be smaller than num_trees (%d)" % (max_trees, num_trees))
+        self.scenario = scenario
+        self.scenario_fingerprint = _fingerprint_scenario(scenario)
+        self.rng = rng if rng is not None else np.random.RandomState(42)
+        self.num_trees = num_trees
+        self.max_trees = max_trees
+        self.retrain_ratio = retrain_ratio
+        self.replay_ratio = replay_ratio
+        self.compact = compact
+        self.model_class = CompactRandomForestWithInstances if compact else RandomForestWithInstances
+
+        self.types, self.bounds = get_types(self.scenario.cs, self.scenario.feature_array)
+        self.generations = []  # List of (RandomForestWithInstances, num_trees, num_samples), oldest first
+        self.seen = {}         # (config, instance, seed, budget) -> cost of all runs the model was trained on
+        self.num_retrained = 0  # Number of runs at the last full retrain
+        self.X, self.y = None, None
+        self.num_full_retrains = 0
+
+    @staticmethod
+    def _run_key(runhistory, k):
+        return runhistory.ids_config[k.config_id], k.instance_id, k.seed, k.budget
+
+    def _transform(self, runhistory):
+        rh2epm_class = CompactRunHistory2EPM4Cost if self.compact else RunHistory2EPM4Cost
+        rh2epm = rh2epm_class(scenario=self.scenario,
+                              num_params=len(self.scenario.cs.get_hyperparameters()),
+                              success_states=[StatusType.SUCCESS, ],
+                              impute_censored_data=False,
+                              impute_state=None)
+        return rh2epm.transform(runhistory)
+
+    def _train_forest(self, X, y, num_trees):
+        forest = self.model_class(self.scenario.cs,
+                                  types=self.types,
+                                  bounds=self.bounds,
+                                  seed=self.rng.randint(MAXINT),
+                                  num_trees=num_trees,
+                                  instance_features=self.scenario.feature_array,
+                                  ratio_features=1.0)
+        forest.train(X, y)
+        return forest
+
+    def needs_full_retrain(self, runhistory):
+        """
+        Check whether the runhistory can be used for an incremental update of the current model.
+
+        Parameters
+        ----------
+        runhistory: RunHistory
+            runhistory to be compared to the data the model was trained on
+
+        Returns
+        -------
+        retrain: bool
+            True, if there is no model yet, previously seen runs are missing or changed in the runhistory or the
+            fraction of runs added since the last full retrain exceeds `retrain_ratio`
+        """
+        if not self.generations:
+            return True
+        current = {self._run_key(runhistory, k): v.cost for k, v in runhistory.data.items()}
+        if any(current.get(key, np.nan) != cost for key, cost in self.seen.items()):
+            self.logger.debug("Runhistory is no extension of the data the EPM was trained on.")
+            return True
+        num_new = len(current) - self.num_retrained
+        if num_new / max(len(current), 1) > self.retrain_ratio:
+            self.logger.debug("%d of %d runs were added since the last full retrain, exceeding ratio of %.2f.",
+                              num_new, len(current), self.retrain_ratio)
+            return True
+        return False
+
+    def update(self, runhistory: RunHistory):
+        """
+        Bring the model up to date with the runhistory, either by growing a new generation of trees on the unseen runs
+        or, if necessary, by retraining from scratch.
+
+        Parameters
+        ----------
+        runhistory: RunHistory
+            (potentially grown) runhistory with all data to be modelled
+
+        Returns
+        -------
+        changed: bool
+            whether the model changed (new generation or full retrain, see num_full_retrains)
+        """
+        if self.needs_full_retrain(runhistory):
+            self.X, self.y = self._transform(runhistory)
+            self.logger.debug("Fully retraining EPM with data of shape X: %s, y: %s", str(self.X.shape),
+                              str(self.y.shape))
+            # Split into generations of num_trees, so trees trained on the full data are retired gradually
+            self.generations = [(self._train_forest(self.X, self.y, self.num_trees), self.num_trees, len(self.X))
+                                for _ in range(self.max_trees // self.num_trees)]
+            self.seen = {self._run_key(runhistory, k): v.cost for k, v in runhistory.data.items()}
+            self.num_retrained = len(self.seen)
+            self.num_full_retrains += 1
+            return True
+
+        new_runs = [(k, v) for k, v in runhistory.data.items() if self._run_key(runhistory, k) not in self.seen]
+        if not new_runs:
+            self.logger.debug("No new runs, EPM is up to date.")
+            return False
+
+        delta_rh = RunHistory()
+        for k, v in new_runs:
+            delta_rh.add(config=runhistory.ids_config[k.config_id],
+                         cost=v.cost,
+                         time=v.time,
+                         status=v.status,
+                         instance_id=k.instance_id,
+                         seed=k.seed,
+                         budget=k.budget,
+                         additional_info=v.additional_info)
+        X_new, y_new = self._transform(delta_rh)
+        # Replay a fixed share of the old data, so the new trees do not only know about the most recent region
+        num_replay = min(self.X.shape[0], max(int(round(self.replay_ratio * self.X.shape[0])), 1))
+        replay = self.rng.choice(self.X.shape[0], size=num_replay, replace=False)
+        X_train, y_train = np.vstack([X_new, self.X[replay]]), np.vstack([y_new, self.y[replay]])
+        self.logger.debug("Growing %d trees on %d new and %d replayed samples.", self.num_trees, X_new.shape[0],
+                          len(replay))
+        self.generations.append((self._train_forest(X_train, y_train, self.num_trees), self.num_trees,
+                                 len(X_train)))
+        while sum([n for _, n, _ in self.generations]) > self.max_trees:
+            self.generations.pop(0)
+        self.X, self.y = np.vstack([self.X, X_new]), np.vstack([self.y, y_new])
+        self.seen.update({self._run_key(runhistory, k): v.cost for k, v in new_runs})
+        return True
+
+    def _mix(self, predictions):
+        """ Combine mean and variance of the generations as a mixture weighted by number of trees and samples. """
+        weights = np.array([n * num_samples for _, n, num_samples in self.generations], dtype=float)
+        weights /= weights.sum()
+        means = np.array([m for m, _ in predictions])
+        second_moments = np.array([v + m ** 2 for m, v in predictions])
+        mean = np.tensordot(weights, means, axes=1)
+        var = np.maximum(np.tensordot(weights, second_moments, axes=1) - mean ** 2, 0)
+        return mean, var
+
+    def predict(self, X):
+        """ Predict mean and variance for X (configurations with instance features), see RandomForestWithInstances """
+        if not self.generations:
+            raise ValueError("IncrementalEPM needs to be updated with a runhistory before predicting.")
+        return self._mix([forest.predict(X) for forest, _, _ in self.generations])
+
+    def predict_marginalized_over_instances(self, X):
+        """ Predict mean and variance for configurations X, marginalized over all instances """
+        if not self.generations:
+            raise ValueError("IncrementalEPM needs to be updated with a runhistory before predicting.")
+        return self._mix([predict_marginalized_over_instances(forest, X) for forest, _, _ in self.generations])
+
+    def __getstate__(self):
+        # The smac-wrapper holds swig-objects (rng, options) that cannot be pickled, the pyrfr-forest itself can. The
+        # scenario is not pickled, the model is attached to the current one when loading
+        state = self.__dict__.copy()
+        state['generations'] = [(forest.rf, forest.seed, n, num_samples)
+                                for forest, n, num_samples in self.generations]
+        del state['logger'], state['scenario']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.logger = logging.getLogger(self.__module__ + '.' + self.__class__.__name__)
+        self.scenario = None  # generations hold (rf, seed, num_trees, num_samples) until _attach
+
+    def _attach(self, scenario):
+        """ Use scenario for the unpickled model and wrap its forests """
+        self.scenario = scenario
+        self.types, self.bounds = get_types(self.scenario.cs, self.scenario.feature_array)
+        generations, self.generations = self.generations, []
+        for rf, seed, n, num_samples in generations:
+            forest = self.model_class(self.scenario.cs,
+                                      types=self.types,
+                                      bounds=self.bounds,
+                                      seed=seed,
+                                      num_trees=n,
+                                      instance_features=self.scenario.feature_array,
+                                      ratio_features=1.0)
+            forest.rf = rf
+            self.generations.append((forest, n, num_samples))
+
+    def save(self, path):
+        """ Pickle the model to path, so later analyses of the grown runhistory can update instead of retrain. """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'wb') as fh:
+            pickle.dump(self, fh)
+
+    @staticmethod
+    def load(path, scenario):
+        """
+        Load a pickled IncrementalEPM from path for scenario. Raises a ValueError, if the model was trained on a
+        different scenario.
+
+        Parameters
+        ----------
+        path: str
+            path of the pickled model
+        scenario: Scenario
+            current scenario, must have the same configspace, instance features, run objective and cutoff as the
+            scenario the model was trained on
+
+        Returns
+        -------
+        epm: IncrementalEPM
+            loaded model, using scenario
+        """
+        with open(path, 'rb') as fh:
+            epm = pickle.load(fh)
+        if epm.scenario_fingerprint != _fingerprint_scenario(scenario):
+            raise ValueError("EPM in %s was trained on a different scenario" % path)
+        epm._attach(scenario)
+        return epm
@@ -0,0 +1,197 @@
+import logging
+
+import numpy as np
+from smac.epm.rf_with_instances import RandomForestWithInstances
+
+
+class MarginalizedForest(object):
+    """
+    Precomputed version of `RandomForestWithInstances.predict_marginalized_over_instances`.
+
+    The smac-implementation traverses every tree once per (configuration, instance)-pair and pools all leaf values
+    per tree. Since the set of instances that reaches a node only depends on the splits on instance features along
+    the path to it, it can be computed once per node. Each leaf then stores the pooled statistics (sum and number of
+    leaf values, weighted by the number of instances reaching it) and a query only needs to follow the configuration
+    splits of each tree, branching into both children at instance splits. This yields the same predictions with one
+    traversal per configuration (up to floating point summation order).
+    """
+
+    def __init__(self, model: RandomForestWithInstances):
+        """
+        Parameters
+        ----------
+        model: RandomForestWithInstances
+            trained smac random forest with instance features
+        """
+        self.logger = logging.getLogger(self.__module__ + '.' + self.__class__.__name__)
+        if model.instance_features is None or len(model.instance_features) == 0:
+            raise ValueError("Model has no instance features to marginalize over.")
+        self.model = model
+        self.n_params = len(model.bounds)
+        self.trees = [self._precompute_tree(tree, np.asarray(model.instance_features, dtype=np.float64))
+                      for tree in model.rf.get_all_trees()]
+
+    def _precompute_tree(self, tree, instance_features):
+        """ Flatten tree into arrays and compute the instance-marginalized leaf statistics """
+        n_nodes = tree.number_of_nodes()
+        feature = np.full(n_nodes, -1, dtype=np.int64)  # -1 for leafs
+        split = np.full(n_nodes, np.nan)                 # nan for categorical splits
+        categories = {}                                  # node -> categories that fall into the left child
+        children = np.zeros((n_nodes, 2), dtype=np.int64)
+        leaf_sum, leaf_count = np.zeros(n_nodes), np.zeros(n_nodes)
+        reachable = np.zeros(n_nodes, dtype=bool)
+
+        stack = [(0, np.arange(instance_features.shape[0]))]
+        while stack:
+            idx, insts = stack.pop()
+            if len(insts) == 0:
+                continue
+            reachable[idx] = True
+            node = tree.get_node(int(idx))
+            if node.is_a_leaf():
+                values = np.array(node.responses())
+                if self.model.log_y:
+                    values = np.exp(values)
+                leaf_sum[idx] = len(insts) * values.sum()
+                leaf_count[idx] = len(insts) * len(values)
+                continue
+            feature[idx] = node.get_feature_index()
+            split[idx] = node.get_num_split_value()
+            if np.isnan(split[idx]):
+                categories[idx] = np.array(node.get_cat_split(), dtype=np.float64)
+            children[idx] = node.get_child_index(0), node.get_child_index(1)
+            if feature[idx] < self.n_params:
+                # Split on configuration, all instances are possible in both children
+                stack.extend([(children[idx][0], insts), (children[idx][1], insts)])
+            else:
+                right = self._falls_right(idx, split, categories,
+                                          instance_features[insts, feature[idx] - self.n_params])
+                stack.extend([(children[idx][0], insts[~right]), (children[idx][1], insts[right])])
+        return feature, split, categories, children, leaf_sum, leaf_count, reachable
+
+    @staticmethod
+    def _falls_right(idx, split, categories, values):
+        """ Same semantics as the pyrfr-split: numerical splits go right if larger, categorical if not in the set """
+        if np.isnan(split[idx]):
+            return ~np.isin(values, categories[idx])
+        return values > split[idx]
+
+    def _predict_tree(self, tree, X):
+        feature, split, categories, children, leaf_sum, leaf_count, reachable = tree
+        total_sum, total_count = np.zeros(X.shape[0]), np.zeros(X.shape[0])
+        queries, nodes = np.arange(X.shape[0]), np.zeros(X.shape[0], dtype=np.int64)
+        while len(queries) > 0:
+            # Drop branches no instance reaches
+            mask = reachable[nodes]
+            queries, nodes = queries[mask], nodes[mask]
+            leafs = feature[nodes] == -1
+            np.add.at(total_sum, queries[leafs], leaf_sum[nodes[leafs]])
+            np.add.at(total_count, queries[leafs], leaf_count[nodes[leafs]])
+            queries, nodes = queries[~leafs], nodes[~leafs]
+
+            on_config = feature[nodes] < self.n_params
+            next_queries, next_nodes = [], []
+            # Instance splits: follow both children
+            inst_q, inst_n = queries[~on_config], nodes[~on_config]
+            next_queries.extend([inst_q, inst_q])
+            next_nodes.extend([children[inst_n, 0], children[inst_n, 1]])
+            # Configuration splits: follow the child the configuration falls into
+            conf_q, conf_n = queries[on_config], nodes[on_config]
+            values = X[conf_q, feature[conf_n]]
+            right = values > split[conf_n]
+            for node in np.unique(conf_n[np.isnan(split[conf_n])]):
+                at_node = conf_n == node
+                right[at_node] = self._falls_right(node, split, categories, values[at_node])
+            next_queries.append(conf_q)
+            next_nodes.append(children[conf_n, right.astype(np.int64)])
+            queries, nodes = np.concatenate(next_queries), np.concatenate(next_nodes)
+        return total_sum / total_count
+
+    def predict_marginalized_over_instances(self, X: np.ndarray):
+        """
+        Predict mean and variance marginalized over all instances, see
+        `RandomForestWithInstances.predict_marginalized_over_instances`.
+
+        Parameters
+        ----------
+        X : np.ndarray
+            [n_samples, n_features (config)]
+
+        Returns
+        -------
+        means : np.ndarray of shape = [n_samples, 1]
+            Predictive mean
+        vars : np.ndarray  of shape = [n_samples, 1]
+            Predictive variance
+        """
+        if len(X.shape) != 2:
+            raise ValueError('Expected 2d array, got %dd array!' % len(X.shape))
+        if X.shape[1] != self.n_params:
+            raise ValueError('Rows in X should have %d entries but have %d!' % (self.n_params, X.shape[1]))
+        X = self.model._impute_inactive(X)
+
+        dat_ = np.array([self._predict_tree(tree, X) for tree in self.trees]).T  # marginalized predictions per tree
+        if self.model.log_y:
+            dat_ = np.log(dat_)
+        mean_ = dat_.mean(axis=1)
+        var = dat_.var(axis=1)
+        var[var < self.model.var_threshold] = self.model.var_threshold
+        return mean_.reshape((-1, 1)), var.reshape((-1, 1))
+
+    def check_exactness(self, X: np.ndarray, rtol=1e-6, atol=1e-8):
+        """
+        Compare the precomputed predictions against the smac-implementation.
+
+        Parameters
+        ----------
+        X: np.ndarray
+            configurations to compare the predictions on
+        rtol, atol: float
+            tolerances as in np.allclose
+
+        Returns
+        -------
+        exact: bool
+            whether mean and variance agree within tolerance
+        """
+        mean, var = self.predict_marginalized_over_instances(X)
+        mean_ref, var_ref = self.model.predict_marginalized_over_instances(X)
+        exact = np.allclose(mean, mean_ref, rtol=rtol, atol=atol) and np.allclose(var, var_ref, rtol=rtol, atol=atol)
+        if not exact:
+            self.logger.warning("Precomputed marginalized predictions deviate from the reference (max. abs. difference "
+                                "in mean: %f)", np.max(np.abs(mean - mean_ref)))
+        return exact
+
+
+def predict_marginalized_over_instances(model, X, num_checks=5, logger=None):
+    """
+    Predict marginalized over instances, using the precomputed MarginalizedForest when possible. The precomputed
+    predictions are checked against the original implementation on the first `num_checks` configurations, falling
+    back to the original implementation in case of deviations.
+
+    Parameters
+    ----------
+    model: AbstractEPM
+        trained EPM
+    X: np.ndarray
+        configurations to predict, [n_samples, n_features (config)]
+    num_checks: int
+        number of configurations to check for exactness
+    logger: logging.Logger
+        logger to write debugs to
+
+    Returns
+    -------
+    means, vars : np.ndarray, np.ndarray
+        predictive mean and variance, each of shape [n_samples, 1]
+    """
+    if (not isinstance(model, RandomForestWithInstances) or model.instance_features is None or
+            len(model.instance_features) <= 1):
+        return model.predict_marginalized_over_instances(X)
+    forest = MarginalizedForest(model)
+    if not forest.check_exactness(X[:num_checks]):
+        return model.predict_marginalized_over_instances(X)
+    if logger:
+        logger.debug("Predicting %d configurations using precomputed marginalization over %d instances",
+                     X.shape[0], len(model.instance_features))
+    return forest.predict_marginalized_over_instances(X)
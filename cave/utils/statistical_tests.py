@@ -1,9 +1,24 @@
-from scipy.stats import ttest_rel
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
+import numpy as np
+from scipy.stats import beta, ttest_rel
+from smac.utils.constants import MAXINT
 
-def paired_permutation(data1, data2, rng, num_permutations=10000, logger=None):
+# Maximum number of sign-flips (permutations x instances) drawn at once in paired_permutation
+PERMUTATION_CHUNK_ELEMENTS = 2 ** 22
+# Minimum number of sign-flips of a sequential test to evaluate its batches in parallel (smaller tests are faster
+# than sending them to other processes)
+PARALLEL_MIN_ELEMENTS = 2 ** 24
+
+
+def paired_permutation(data1, data2, rng, num_permutations=10000, logger=None, chunk_size=None):
     """Test for significance using paired permutation.
 
+    Permuting a pair is flipping the sign of its difference, so the mean of difference of a permutation is the dot
+    product of random signs with the differences. Signs are drawn for chunks of permutations at once as
+    (chunk_size x len(data1)) int8-matrix, so memory is bounded independent of the number of permutations.
+
     Parameters
     ----------
     data1, data2: List<float>, List<float>
@@ -14,6 +29,8 @@ def paired_permutation(data1, data2, rng, num_permutations=10000, logger=None):
         number of permutations performed
     logger: Logger
         logger-instance write debugs to
+    chunk_size: int
+        number of permutations per chunk, defaults to PERMUTATION_CHUNK_ELEMENTS / len(data1)
 
     Returns
     -------
@@ -21,29 +38,158 @@ def paired_permutation(data1, data2, rng, num_permutations=10000, logger=None):
         p-value for statistical test
     """
     assert(len(data1) == len(data2))
-
-    def test(x, y):
-        """Mean of difference between two lists of results"""
-        return abs((sum(x) / float(len(x))) - (sum(y) / float(len(y))))
-    # Original order
-    t = test(data1, data2)
-    # Test-statistics for 10000 permutations of data in s
-    s = [t]
-    for count in range(num_permutations):
-        # Shuffle data
-        X, Y = zip(*[rng.permutation([d1, d2]) for d1, d2 in zip(data1, data2)])
-        s.append(test(X, Y))
+    diff, t, threshold = _permutation_statistic(data1, data2)
+    # Original order is counted as one of the permutations
+    larger = int(t >= threshold)
+    larger += _count_larger(diff, threshold, num_permutations, rng, chunk_size)
     # Find p-value
-    larger = len([z for z in s if z >= t])
-    p = larger / float(len(s))
+    p = larger / float(num_permutations + 1)
     if logger:
         logger.debug("Permutation test with %d/%d permutations yielding a "
                      "higher mean of difference between permutated data than "
                      "the real data (%f), yielding a p-value of %f",
-                     larger, len(s), t, p)
+                     larger, num_permutations + 1, t, p)
     return p
 
 
+def sequential_paired_permutation(data1, data2, rng, max_permutations=10000, alpha=0.05, precision=0.001,
+                                  confidence=0.99, batch_size=1000, early_stopping=True, n_jobs=1, executor=None,
+                                  logger=None):
+    """Paired permutation test with early stopping (sequential Monte Carlo).
+
+    Same test and p-value as paired_permutation, but permutations are evaluated in batches. After each batch, a
+    Clopper-Pearson confidence interval of the p-value is computed and the test stops as soon as the interval
+    excludes alpha (the decision is clear) or is narrower than 2 * precision. Since the interval is checked after
+    every batch, each check uses the level 1 - (1 - confidence) / number of batches (Bonferroni), so all intervals
+    hold simultaneously with the given confidence. Each batch has its own seed (drawn from rng), so the result does
+    not depend on n_jobs.
+
+    Parameters
+    ----------
+    data1, data2: List<float>, List<float>
+        ordered results for instances for two different configurations
+    rng: np.RandomState
+        random number generator
+    max_permutations: int
+        maximum number of permutations performed
+    alpha: float
+        significance level, stop when the confidence interval excludes it
+    precision: float
+        stop when the confidence interval is narrower than 2 * precision
+    confidence: float
+        confidence level of the interval (over all checks)
+    batch_size: int
+        number of permutations between two checks
+    early_stopping: bool
+        if False, always perform max_permutations permutations (and still report the confidence interval)
+    n_jobs: int
+        number of batches evaluated in parallel (for tests that do not stop early), only for tests with at least
+        PARALLEL_MIN_ELEMENTS sign-flips
+    executor: Executor
+        evaluates batches if n_jobs > 1, e.g. a ProcessPoolExecutor shared by several tests. if None, processes are
+        started for this test
+    logger: Logger
+        logger-instance write debugs to
+
+    Returns
+    -------
+    p: float
+        p-value for statistical test
+    num_permutations: int
+        number of permutations performed
+    ci: Tuple[float, float]
+        confidence interval of the p-value (at the level of a single check, if early_stopping)
+    """
+    assert(len(data1) == len(data2))
+    diff, t, threshold = _permutation_statistic(data1, data2)
+    sizes = [min(batch_size, max_permutations - start) for start in range(0, max_permutations, batch_size)]
+    tasks = [(diff, threshold, size, seed) for size, seed in zip(sizes, rng.randint(MAXINT, size=len(sizes)))]
+    check_confidence = 1 - (1 - confidence) / max(len(sizes), 1) if early_stopping else confidence
+
+    larger, done = 0, 0
+    parallel = n_jobs > 1 and len(tasks) > 1 and max_permutations * len(diff) >= PARALLEL_MIN_ELEMENTS
+    own_executor = ProcessPoolExecutor(max_workers=n_jobs) if parallel and executor is None else None
+    if not parallel:
+        counts = (_count_larger_seeded(*task) for task in tasks)
+    else:
+        counts = _ordered_results(executor or own_executor, _count_larger_seeded, tasks, n_jobs)
+    try:
+        for size, count in zip(sizes, counts):
+            larger += count
+            done += size
+            if early_stopping:
+                ci = _clopper_pearson(larger, done, check_confidence)
+                if ci[1] < alpha or ci[0] > alpha or ci[1] - ci[0] < 2 * precision:
+                    break
+    finally:
+        counts.close()
+        if own_executor is not None:
+            own_executor.shutdown(wait=True)
+    ci = _clopper_pearson(larger, done, check_confidence)
+
+    # Original order is counted as one of the permutations
+    p = (larger + int(t >= threshold)) / float(done + 1)
+    if logger:
+        logger.debug("Sequential permutation test with %d/%d permutations yielding a higher mean of difference "
+                     "between permutated data than the real data (%f), yielding a p-value of %f (%g%%-confidence "
+                     "interval [%f, %f])", larger, done, t, p, check_confidence * 100, ci[0], ci[1])
+    return p, done, ci
+
+
+def _permutation_statistic(data1, data2):
+    """ Differences, mean of difference for the original order and threshold for permutations to count as larger """
+    diff = np.asarray(data1, dtype=np.float64) - np.asarray(data2, dtype=np.float64)
+    # Mean of difference between two lists of results
+    t = abs(diff.sum()) / max(len(diff), 1)
+    # Permutations with the same mean of difference as the original (e.g. flipping equal pairs) might differ due to
+    # summation order
+    threshold = t - np.finfo(np.float64).eps * np.abs(diff).sum()
+    return diff, t, threshold
+
+
+def _count_larger(diff, threshold, num_permutations, rng, chunk_size=None):
+    """ Number of random permutations (sign-flips of diff) with a mean of difference of at least threshold """
+    n = max(len(diff), 1)
+    if chunk_size is None:
+        chunk_size = max(1, PERMUTATION_CHUNK_ELEMENTS // n)
+    larger, done = 0, 0
+    while done < num_permutations:
+        size = min(chunk_size, num_permutations - done)
+        signs = 1 - 2 * rng.randint(0, 2, size=(size, len(diff)), dtype=np.int8)
+        larger += np.count_nonzero(np.abs(signs.dot(diff)) / n >= threshold)
+        done += size
+    return larger
+
+
+def _count_larger_seeded(diff, threshold, num_permutations, seed):
+    """ _count_larger with its own random number generator (e.g. in another process) """
+    return _count_larger(diff, threshold, num_permutations, np.random.RandomState(seed))
+
+
+def _ordered_results(executor, fn, tasks, n_ahead):
+    """ Results of fn(*task) in order of tasks, with n_ahead tasks submitted ahead. Closing cancels pending tasks """
+    pending = deque()
+    try:
+        for task in tasks:
+            pending.append(executor.submit(fn, *task))
+            if len(pending) >= n_ahead:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _clopper_pearson(k, n, confidence):
+    """ Confidence interval of a binomial proportion (k successes in n trials) """
+    if n == 0:
+        return 0., 1.
+    lower = beta.ppf((1 - confidence) / 2, k, n - k + 1) if k > 0 else 0.
+    upper = beta.ppf(1 - (1 - confidence) / 2, k + 1, n - k) if k < n else 1.
+    return float(lower), float(upper)
+
+
 def paired_t_student(data1, data2, logger=None):
     """Test for significance using paired t-test.
 
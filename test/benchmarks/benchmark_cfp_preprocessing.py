@@ -0,0 +1,76 @@
+"""
+Time the preprocessing of the configurator footprint (reducing the runhistory, building the configuration matrix and
+creating the views per run) on synthetic runhistories. All steps should scale linearly in the number of runs and
+configurations. Usage:
+
+    python test/benchmarks/benchmark_cfp_preprocessing.py --num_configs 50000 --num_runs_per_config 2
+"""
+import argparse
+import logging
+import time
+
+import numpy as np
+from ConfigSpace.configuration_space import ConfigurationSpace
+from ConfigSpace.hyperparameters import UniformFloatHyperparameter, CategoricalHyperparameter
+from smac.runhistory.runhistory import RunHistory
+from smac.scenario.scenario import Scenario
+from smac.tae.execute_ta_run import StatusType
+
+from cave.plot.configurator_footprint import ConfiguratorFootprintPlotter
+
+
+def generate(num_configs, num_runs_per_config, num_rhs, seed=1):
+    rng = np.random.RandomState(seed)
+    cs = ConfigurationSpace(seed=seed)
+    cs.add_hyperparameters([UniformFloatHyperparameter('x%d' % i, 0, 1) for i in range(5)] +
+                           [CategoricalHyperparameter('c', ['a', 'b', 'c'])])
+    insts = ['inst%d' % i for i in range(max(num_runs_per_config, 1))]
+    scen = Scenario({'cs': cs, 'run_obj': 'quality', 'instances': [[i] for i in insts], 'output_dir': ''})
+    configs = cs.sample_configuration(num_configs)
+    rhs = [RunHistory() for _ in range(num_rhs)]
+    for idx, config in enumerate(configs):
+        for inst in insts[:rng.randint(1, num_runs_per_config + 1)]:
+            rhs[idx % num_rhs].add(config, float(rng.rand()), 1, StatusType.SUCCESS, instance_id=inst, seed=0,
+                                   starttime=idx, endtime=idx + 1)
+    incs = [[configs[idx] for idx in rng.choice(num_configs, 10, replace=False)]]
+    return scen, rhs, incs
+
+
+def measure(scen, rhs, incs, max_plot, num_quantiles):
+    cfp = ConfiguratorFootprintPlotter(scen, rhs, incs, incs[0][-1], max_plot=max_plot, num_quantiles=num_quantiles)
+    times = {}
+    start = time.time()
+    rh = cfp.reduce_runhistory(cfp.combined_rh, max_plot, keep=incs[0] + [cfp.default])
+    times['reduce_runhistory'] = time.time() - start
+    start = time.time()
+    conf_matrix, conf_list, runs_per_quantile, _ = cfp.get_conf_matrix(rh, incs)
+    times['get_conf_matrix'] = time.time() - start
+    start = time.time()
+    source, used_configs = cfp._plot_get_source(conf_list, runs_per_quantile[-1], np.zeros((len(conf_list), 2)),
+                                                incs, [hp.name for hp in scen.cs.get_hyperparameters()])
+    times['_plot_get_source'] = time.time() - start
+    start = time.time()
+    cfp._create_views(source, used_configs)
+    times['_create_views'] = time.time() - start
+    return len(conf_list), times
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--num_configs', default=50000, type=int)
+    parser.add_argument('--num_runs_per_config', default=2, type=int)
+    parser.add_argument('--num_rhs', default=2, type=int)
+    parser.add_argument('--max_plot', default=40000, type=int)
+    parser.add_argument('--num_quantiles', default=3, type=int)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    # Time a tenth of the data as well, to check the scaling
+    results = {}
+    for num_configs in [args.num_configs // 10, args.num_configs]:
+        scen, rhs, incs = generate(num_configs, args.num_runs_per_config, args.num_rhs)
+        results[num_configs] = measure(scen, rhs, incs, min(args.max_plot, num_configs - 1), args.num_quantiles)
+    print("{:<24}".format('configs') + "".join(["{:>16}".format(n) for n in results.keys()]))
+    print("{:<24}".format('plotted') + "".join(["{:>16}".format(r[0]) for r in results.values()]))
+    for key in list(results.values())[0][1].keys():
+        print("{:<24}".format(key + ' [sec]') + "".join(["{:>16.2f}".format(r[1][key]) for r in results.values()]))
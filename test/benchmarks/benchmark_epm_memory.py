@@ -0,0 +1,79 @@
+"""
+Compare memory consumption of the default (float64) and the compact (float32/uint32/uint8) mode for EPM-data on a
+synthetic runhistory. Usage:
+
+    python test/benchmarks/benchmark_epm_memory.py --num_runs 100000 --num_params 20 --num_features 40
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+from ConfigSpace.configuration_space import ConfigurationSpace
+from ConfigSpace.hyperparameters import UniformFloatHyperparameter
+from smac.epm.rf_with_instances import RandomForestWithInstances
+from smac.runhistory.runhistory import RunHistory
+from smac.scenario.scenario import Scenario
+from smac.tae.execute_ta_run import StatusType
+
+from cave.utils.compact_epm import CompactRandomForestWithInstances
+from cave.utils.convert_for_epm import convert_data_for_epm, runhistory_to_arrays, clear_epm_data_cache
+
+
+def generate(num_runs, num_params, num_features, num_instances, seed=1):
+    rng = np.random.RandomState(seed)
+    cs = ConfigurationSpace(seed=seed)
+    cs.add_hyperparameters([UniformFloatHyperparameter('x%d' % i, 0, 1) for i in range(num_params)])
+    insts = ['inst%d' % i for i in range(num_instances)]
+    feats = {i: rng.rand(num_features) for i in insts}
+    scen = Scenario({'cs': cs, 'run_obj': 'quality', 'instances': [[i] for i in insts], 'features': feats,
+                     'output_dir': ''})
+    rh = RunHistory()
+    configs = cs.sample_configuration(max(1, num_runs // num_instances))
+    for idx in range(num_runs):
+        config = configs[idx % len(configs)]
+        inst = insts[idx // len(configs) % num_instances]
+        rh.add(config, float(np.sum(config.get_array()) + feats[inst][0]), 1, StatusType.SUCCESS,
+               instance_id=inst, seed=idx)
+    return scen, rh
+
+
+def measure(scen, rh, compact, num_trees):
+    clear_epm_data_cache()
+    tracemalloc.start()
+    start = time.time()
+    X, y, types = convert_data_for_epm(scen, rh, compact=compact)
+    runs, _ = runhistory_to_arrays(rh, compact=compact)
+    _, peak_convert = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    # Same model classes as the library uses in both modes
+    model_class = CompactRandomForestWithInstances if compact else RandomForestWithInstances
+    model = model_class(scen.cs, types, [(0, 1)] * len(scen.cs.get_hyperparameters()),
+                        seed=1, num_trees=num_trees, instance_features=scen.feature_array)
+    model.train(X, y)
+    _, peak_train = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'X+y [MB]': (X.nbytes + y.nbytes) / 2 ** 20,
+            'run-arrays [MB]': sum([a.nbytes for a in runs.values()]) / 2 ** 20,
+            'peak convert [MB]': peak_convert / 2 ** 20,
+            'peak train (python-side) [MB]': peak_train / 2 ** 20,
+            'time [sec]': time.time() - start,
+            }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--num_runs', default=20000, type=int)
+    parser.add_argument('--num_params', default=20, type=int)
+    parser.add_argument('--num_features', default=40, type=int)
+    parser.add_argument('--num_instances', default=50, type=int)
+    parser.add_argument('--num_trees', default=10, type=int)
+    args = parser.parse_args()
+
+    scen, rh = generate(args.num_runs, args.num_params, args.num_features, args.num_instances)
+    results = {mode: measure(scen, rh, compact, args.num_trees) for mode, compact in [('default', False),
+                                                                                        ('compact', True)]}
+    print("%d runs, %d columns" % (args.num_runs, args.num_params + args.num_features))
+    print("{:<32}{:>12}{:>12}".format('', *results.keys()))
+    for key in results['default'].keys():
+        print("{:<32}{:>12.2f}{:>12.2f}".format(key, *[r[key] for r in results.values()]))
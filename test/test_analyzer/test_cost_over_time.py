@@ -0,0 +1,167 @@
+import logging
+import os
+import tempfile
+import unittest
+from collections import OrderedDict
+import warnings
+from unittest import mock
+
+import numpy as np
+from ConfigSpace import ConfigurationSpace, UniformFloatHyperparameter
+from smac.runhistory.runhistory import RunHistory
+from smac.scenario.scenario import Scenario
+from smac.tae.execute_ta_run import StatusType
+
+from cave.analyzer.performance.cost_over_time import CostOverTime, _merge_trajectories, _nanpercentile
+from cave.utils.incremental_epm import IncrementalEPM
+
+
+class TestCostOverTime(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(1)
+        # Trajectories of different lengths with shared times, equal times within a run and nan-costs
+        self.trajectories = []
+        for length in [1, 4, 20, 20, 7]:
+            times = np.sort(rng.choice(np.arange(1, 30, dtype=np.float64), length))
+            costs = rng.rand(length)
+            costs[rng.rand(length) < 0.2] = np.nan
+            self.trajectories.append((times, costs))
+
+    def _cost_over_time(self):
+        """ CostOverTime without runscontainer, the trajectory of a run is given by its index """
+        cot = object.__new__(CostOverTime)
+        cot.logger = logging.getLogger(self.__module__ + '.' + self.__class__.__name__)
+        cot.output_dir = ''
+        cot.scenario = mock.Mock(run_obj='quality')
+        cot.max_points_per_line = 0
+        cot._get_mean_var_time = lambda validator, traj, use_epm, rh, *args: (
+            self.trajectories[traj][1].reshape(-1, 1), np.zeros((len(self.trajectories[traj][1]), 1)),
+            list(self.trajectories[traj][0]), [None for _ in self.trajectories[traj][0]])
+        runs = [mock.Mock(trajectory=idx, validated_runhistory=None) for idx in range(len(self.trajectories))]
+        return cot, runs
+
+    @staticmethod
+    def _avg_per_timestep(trajectories):
+        """ Median and quartiles over runs as previously computed (evaluating all runs per time step) """
+        means, times = [costs for _, costs in trajectories], [times for times, _ in trajectories]
+        all_times = np.array(sorted([a for b in times for a in b]))
+        at, m = [0 for _ in trajectories], [np.nan for _ in trajectories]
+        mean, upper, lower = [], [], []
+        for t in all_times:
+            for traj_idx, entry_idx in enumerate(at):
+                try:
+                    if t == times[traj_idx][entry_idx]:
+                        m[traj_idx] = means[traj_idx][entry_idx]
+                        at[traj_idx] += 1
+                except IndexError:
+                    pass
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)  # all-nan slices
+                upper.append(np.nanpercentile(m, 75))
+                mean.append(np.nanpercentile(m, 50))
+                lower.append(np.nanpercentile(m, 25))
+        return all_times, np.array(mean), np.array(upper), np.array(lower)
+
+    @staticmethod
+    def _merge_pointers(trajectories):
+        """ Mean and standard deviation over parallel runs as previously computed (minimum over the next times) """
+        data = OrderedDict([(idx, {'costs': list(costs), 'times': list(times)})
+                            for idx, (times, costs) in enumerate(trajectories) if len(times) > 0])
+        pointer = OrderedDict([(idx, {'cost': np.nan, 'time': 0}) for idx in list(data.keys())])
+        f_time, f_mean, f_std = [], [], []
+        while len(data) > 0:
+            next_idx = min({idx: data[idx]['times'][0] for idx in data.keys()}.items(), key=lambda x: x[1])[0]
+            pointer[next_idx] = {'cost': data[next_idx]['costs'].pop(0), 'time': data[next_idx]['times'].pop(0)}
+            f_time.append(pointer[next_idx]['time'])
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)  # all-nan slices
+                f_mean.append(np.nanmean([values['cost'] for values in pointer.values()]))
+                f_std.append(np.nanstd([values['cost'] for values in pointer.values()]))
+            if len(data[next_idx]['times']) == 0:
+                data.pop(next_idx)
+        return f_time, f_mean, f_std
+
+    def test_merge_trajectories(self):
+        """ Testing merged trajectories against the previous merge (equal times, different lengths, nan-costs). """
+        trajectories = self.trajectories + [([], []), ([5., 5., 40.], [0.3, 0.3, 0.3])]
+        times, mean, std = _merge_trajectories(trajectories)
+        expected_times, expected_mean, expected_std = self._merge_pointers(trajectories)
+        np.testing.assert_array_equal(times, expected_times)
+        np.testing.assert_allclose(mean, expected_mean, atol=1e-12)
+        np.testing.assert_allclose(std, expected_std, atol=1e-6)
+        self.assertEqual(len(times), sum([len(t) for t, _ in trajectories]))
+        # Trajectories are not modified and equal costs have no deviation
+        self.assertEqual(len(trajectories[-1][0]), 3)
+        np.testing.assert_array_equal(_merge_trajectories([([1., 2.], [0.1, 0.1])] * 3)[2], np.zeros(6))
+
+    def test_incremental_epm(self):
+        """ Testing the cached EPM is only saved if it changed and only reused for the same scenario. """
+        cs = ConfigurationSpace(seed=1)
+        cs.add_hyperparameter(UniformFloatHyperparameter('x', 0, 1))
+        rh = RunHistory()
+        for config in cs.sample_configuration(20):
+            rh.add(config, config['x'], 1, StatusType.SUCCESS, seed=0)
+        cot, _ = self._cost_over_time()
+        cot.scenario = Scenario({'cs': cs, 'run_obj': 'quality', 'output_dir': ''})
+        cot.rng, cot.compact_epm_data, cot.epms = np.random.RandomState(1), False, {}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'epm.pkl')
+            with mock.patch.object(IncrementalEPM, 'save', autospec=True, side_effect=IncrementalEPM.save) as save:
+                for _ in range(3):
+                    epm = cot._get_incremental_epm(rh, path)
+                self.assertEqual(save.call_count, 1)
+                self.assertIs(cot._get_incremental_epm(rh, None), cot.epms[None])
+                self.assertEqual(save.call_count, 1)
+            cot.epms = {}
+            with mock.patch.object(IncrementalEPM, '_train_forest') as train:
+                self.assertEqual(cot._get_incremental_epm(rh, path).seen, epm.seen)
+                train.assert_not_called()
+            # A different scenario does not reuse the cached model
+            cot.epms, cot.scenario = {}, Scenario({'cs': cs, 'run_obj': 'runtime', 'cutoff_time': 10,
+                                                   'output_dir': ''})
+            self.assertIs(cot._get_incremental_epm(rh, path).scenario, cot.scenario)
+            self.assertEqual(cot.epms[path].num_full_retrains, 1)
+
+    def test_nanpercentile(self):
+        """ Testing column-wise percentiles against numpy (including nan and columns without values). """
+        rng = np.random.RandomState(2)
+        values = np.round(rng.rand(7, 50) * 5)
+        values[rng.rand(7, 50) < 0.4] = np.nan
+        values[:, :3] = np.nan
+        q = [0, 25, 50, 75, 100, 33.3]
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)  # all-nan slices
+            expected = np.nanpercentile(values, q, axis=0)
+        np.testing.assert_allclose(_nanpercentile(values, q), expected)
+        np.testing.assert_allclose(_nanpercentile(values[:1], q), np.tile(values[:1], (len(q), 1)))
+
+    def test_trajectory_matrix(self):
+        """ Testing the step-functions of all runs on the union of their time points. """
+        cot, runs = self._cost_over_time()
+        times, values = cot._get_trajectory_matrix(None, runs, None)
+        np.testing.assert_array_equal(times, np.unique(np.concatenate([t for t, _ in self.trajectories])))
+        self.assertEqual(values.shape, (len(runs), len(times)))
+        for (traj_times, traj_costs), row in zip(self.trajectories, values):
+            for t, value in zip(times, row):
+                before = np.flatnonzero(traj_times <= t)
+                np.testing.assert_equal(value, traj_costs[before[-1]] if len(before) else np.nan)
+        grid_times, grid_values = cot._get_trajectory_matrix(None, runs, None, grid=lambda t: t[::3])
+        np.testing.assert_array_equal(grid_times, times[::3])
+        np.testing.assert_array_equal(grid_values, values[:, ::3])
+
+    def test_get_avg(self):
+        """ Testing median and quartiles over runs against the evaluation per time step. """
+        cot, runs = self._cost_over_time()
+        line = cot._get_avg(None, runs, None)
+        times, mean, upper, lower = self._avg_per_timestep(self.trajectories)
+        # Previously, equal times were repeated, the last one holds the values after all entries at that time
+        last = np.searchsorted(times, line.time, side='right') - 1
+        np.testing.assert_array_equal(line.time, times[last])
+        np.testing.assert_allclose(line.mean, mean[last])
+        np.testing.assert_allclose(line.upper, upper[last])
+        np.testing.assert_allclose(line.lower, lower[last])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+
+import numpy as np
+from scipy.spatial import ConvexHull
+from ConfigSpace import ConfigurationSpace, UniformFloatHyperparameter
+from smac.runhistory.runhistory import RunHistory
+from smac.tae.execute_ta_run import StatusType
+
+from cave.plot.algorithm_footprint import AlgorithmFootprintPlotter, _DynamicKDTree, _merge_regions
+
+
+class TestAlgorithmFootprint(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(1)
+        cs = ConfigurationSpace(seed=1)
+        cs.add_hyperparameter(UniformFloatHyperparameter('x', 0, 1))
+        default, incumbent = cs.get_default_configuration(), cs.sample_configuration()
+        self.insts = ['i%d' % i for i in range(100)]
+        self.feats = {i: rng.rand(4) for i in self.insts}
+        self.rh = RunHistory()
+        for config in [default, incumbent]:
+            for inst in self.insts:
+                self.rh.add(config, rng.rand(), 1, StatusType.SUCCESS, instance_id=inst, seed=0)
+        self.algorithms = [(default, 'default'), (incumbent, 'incumbent')]
+
+    def test_dynamic_kdtree(self):
+        """ Testing nearest neighbours and radius queries with removed and added points against brute force (including
+        ties). """
+        rng = np.random.RandomState(2)
+        points = np.round(rng.rand(1000, 2) * 10) / 10  # many duplicates
+        tree = _DynamicKDTree(points[:500], capacity=1000)
+        alive = np.zeros(len(points), dtype=bool)
+        alive[:500] = True
+        for idx in range(500, 1000):
+            self.assertEqual(tree.add(points[idx]), idx)
+            alive[idx] = True
+            for removed in rng.choice(np.flatnonzero(alive), 2 if idx % 3 else 1, replace=False):
+                tree.remove(removed)
+                alive[removed] = False
+            x = rng.rand(2)
+            dists = np.linalg.norm(points - x, axis=1)
+            candidates = np.flatnonzero(alive)
+            expected = candidates[sorted(range(len(candidates)), key=lambda i: dists[candidates[i]])[:3]]
+            np.testing.assert_array_equal(tree.query(x, 3), expected)
+            np.testing.assert_array_equal(np.sort(tree.query_radius(x, 0.2)), candidates[dists[candidates] <= 0.2])
+        self.assertEqual(len(tree), alive.sum())
+
+    def test_label_instances(self):
+        """ Testing labels (within epsilon of the best, no timeout, zero cost always good) and good/bad indices. """
+        rh = RunHistory()
+        costs = np.array([[0, 1, 10, 2, 3], [0, 1.04, 9, 4, 10]])
+        for config, algo_costs in zip([a for a, _ in self.algorithms], costs):
+            for inst, cost in zip(self.insts, algo_costs):
+                rh.add(config, cost, 1, StatusType.SUCCESS, instance_id=inst, seed=0)
+        feats = {i: self.feats[i] for i in self.insts[:5]}
+        afp = AlgorithmFootprintPlotter(rh, feats, {}, self.algorithms, cutoff=10)
+        np.testing.assert_array_equal(afp.labels, [[1, 1, 0, 1, 1], [1, 1, 1, 0, 0]])
+        self.assertEqual(afp.algo_labels[afp.algorithms[1]], dict(zip(self.insts[:5], [1, 1, 1, 0, 0])))
+        good, bad = afp._get_good_bad(afp.algorithms[0])
+        np.testing.assert_array_equal(good, [0, 1, 3, 4])
+        np.testing.assert_array_equal(bad, [2])
+        good, bad = afp._get_good_bad(afp.algorithms[1], insts=self.insts[2:4])
+        np.testing.assert_array_equal(good, [2])
+        np.testing.assert_array_equal(bad, [3])
+
+    def test_footprint(self):
+        """ Testing footprints are deterministic (seeded) and merging works down to a single region. """
+        areas = []
+        for _ in range(2):
+            afp = AlgorithmFootprintPlotter(self.rh, self.feats, {}, self.algorithms, rng=np.random.RandomState(3))
+            areas.append([afp.footprint(a, density, 0.5) for a in afp.algorithms for density in [0, 200]])
+        self.assertEqual(areas[0], areas[1])
+        self.assertTrue(all([area > 0 for area in areas[0]]))
+
+    def test_merge_regions(self):
+        """ Testing no final region can be merged with its closest region anymore. """
+        afp = AlgorithmFootprintPlotter(self.rh, self.feats, {}, self.algorithms, rng=np.random.RandomState(3))
+        good = np.array([afp.algo_labels[afp.algorithms[0]][i] == 1 for i in afp.insts])
+        triangles = [(i, i + 1, i + 2) for i in range(0, len(afp.insts) - 2, 3)]
+        regions, _ = _merge_regions(afp.features_2d, triangles, good, 1, 0.5, np.random.RandomState(4), afp.logger)
+        self.assertLess(len(regions), len(triangles))
+        self.assertEqual(sum([len(r['insts']) for r in regions]), 3 * len(triangles))
+        centroids = np.array([afp.features_2d[list(r['insts'])].mean(axis=0) for r in regions])
+        for n, region in enumerate(regions):
+            dists = np.linalg.norm(centroids - centroids[n], axis=1)
+            dists[n] = np.inf
+            merged = list(region['insts'] | regions[int(np.argmin(dists))]['insts'])
+            hull = ConvexHull(afp.features_2d[merged])
+            self.assertFalse(len(merged) / hull.volume > 1 and good[merged].mean() > 0.5)
+
+    def test_footprints(self):
+        """ Testing footprints over a threshold grid are independent of the number of processes. """
+        results = []
+        for n_jobs in [1, 2]:
+            afp = AlgorithmFootprintPlotter(self.rh, self.feats, {}, self.algorithms, rng=np.random.RandomState(3))
+            results.append(afp.footprints([1, 10, 100], [0.5, 0.9], n_jobs=n_jobs))
+        self.assertEqual(len(results[0]), 2 * 3 * 2)
+        self.assertEqual(list(results[0].columns), ['algorithm', 'density', 'purity', 'area', 'good'])
+        np.testing.assert_array_equal(results[0]['area'], results[1]['area'])
+        plot = afp.plot_footprint_areas(results[0])
+        self.assertEqual(len(plot.legend[0].items), 2 * 2)
+
+if __name__ == '__main__':
+    unittest.main()
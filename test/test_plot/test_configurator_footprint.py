@@ -0,0 +1,236 @@
+import copy
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+from bokeh.embed import components
+from bokeh.models import GlyphRenderer
+from bokeh.models.markers import Scatter
+from ConfigSpace import ConfigurationSpace, UniformFloatHyperparameter, CategoricalHyperparameter, EqualsCondition
+from smac.runhistory.runhistory import RunHistory
+from smac.scenario.scenario import Scenario
+from smac.tae.execute_ta_run import StatusType
+from smac.utils.constants import MAXINT
+
+from cave.plot import configurator_footprint
+from cave.plot.configurator_footprint import ConfiguratorFootprintPlotter
+
+
+class TestConfiguratorFootprint(unittest.TestCase):
+
+    def setUp(self):
+        cs = ConfigurationSpace(seed=1)
+        a = CategoricalHyperparameter('a', ['x', 'y'])
+        b = UniformFloatHyperparameter('b', 1, 100, log=True)
+        c = UniformFloatHyperparameter('c', 0, 1)
+        cs.add_hyperparameters([a, b, c])
+        cs.add_condition(EqualsCondition(b, a, 'x'))
+        insts = ['i%d' % i for i in range(4)]
+        feats = {i: np.random.RandomState(n).rand(3) for n, i in enumerate(insts)}
+        self.scenario = Scenario({'cs': cs, 'run_obj': 'quality', 'instances': [[i] for i in insts],
+                                  'features': feats, 'output_dir': ''})
+        rng = np.random.RandomState(1)
+        self.rhs, self.incs, t = [], [], 0
+        for _ in range(2):
+            rh, configs = RunHistory(), cs.sample_configuration(150)
+            for config in configs:
+                for inst in insts[:rng.randint(1, 5)]:
+                    t += 1
+                    rh.add(config, config['c'] + rng.rand() * 0.1, 1, StatusType.SUCCESS, instance_id=inst, seed=0,
+                           additional_info={'timestamps': {'finished': t}})
+            self.rhs.append(rh)
+            self.incs.append([configs[0], configs[3]])
+
+    def _capped_runhistory(self):
+        """ Runhistory with varying numbers of runs per configuration, some of them capped """
+        rng, rh = np.random.RandomState(2), RunHistory()
+        configs = self.scenario.cs.sample_configuration(40)
+        for t in range(400):
+            config = configs[min(rng.geometric(0.1) - 1, len(configs) - 1)]
+            status = StatusType.CAPPED if rng.rand() < 0.2 else StatusType.SUCCESS
+            rh.add(config, rng.rand(), 1, status, instance_id='i%d' % (t % 4), seed=t,
+                   additional_info={'timestamps': {'finished': 1 + t + rng.rand()}})
+        return rh
+
+    @staticmethod
+    def _reduce_runhistory_lists(rh, max_configs, keep):
+        """ Configurations kept by reduce_runhistory as previously computed (list-based) """
+        configs = rh.get_all_configs()
+        runs = [(c, len(rh.get_runs_for_config(c, only_max_observed_budget=False))) for c in configs]
+        runs = sorted(runs, key=lambda x: x[1])[-max_configs:]
+        return [r[0] for r in runs] + keep
+
+    @staticmethod
+    def _conf_list_lists(rh, incs):
+        """ Configurations of get_conf_matrix as previously collected (list-based) """
+        conf_list = []
+        for c in rh.get_all_configs() + [a for b in incs for a in b]:
+            if c not in conf_list:
+                conf_list.append(c)
+        return conf_list
+
+    @staticmethod
+    def _runs_per_config_quantiled_snapshots(rh, conf_list, quantiles, log):
+        """ Labels and runs per quantile per configuration as previously computed (from snapshot-runhistories) """
+        as_list, scale = list(rh.data.items()), np.geomspace if log else np.linspace
+        timestamps = None
+        try:
+            as_list = sorted(as_list, key=lambda x: x[1].additional_info['timestamps']['finished'])
+            timestamps = [x[1].additional_info['timestamps']['finished'] for x in as_list]
+            ranges, idx = [], 0
+            for time_idx, time in enumerate(scale(timestamps[0], timestamps[-1], num=quantiles + 1)):
+                while len(timestamps) - 1 > idx and (timestamps[idx] < time or idx <= time_idx):
+                    idx += 1
+                ranges.append(idx)
+        except (KeyError, TypeError):
+            ranges = [int(x) for x in scale(1, len(as_list), num=quantiles + 1)]
+        ranges[0], ranges[-1] = 0, len(as_list)
+        for r in range(1, len(ranges)):
+            if ranges[r] <= ranges[r - 1]:
+                ranges[r] = ranges[r - 1] + 1
+        labels, r_p_q_p_c, tmp_rh = [], [], RunHistory()
+        for i, j in zip(ranges[:-1], ranges[1:]):
+            for k, v in as_list[i:j]:
+                tmp_rh.add(config=rh.ids_config[k.config_id], cost=v.cost, time=v.time, status=v.status,
+                           instance_id=k.instance_id, seed=k.seed, additional_info=v.additional_info)
+            if timestamps:
+                labels.append("{0:.2f}".format(timestamps[j - 1]))
+            r_p_q_p_c.append([len(tmp_rh.get_runs_for_config(c, only_max_observed_budget=False)) for c in conf_list])
+        return labels, r_p_q_p_c
+
+    def _report_size(self, use_timeslider, num_quantiles):
+        cfp = ConfiguratorFootprintPlotter(self.scenario, self.rhs, self.incs, self.incs[0][-1],
+                                           rh_labels=['run1', 'run2'], use_timeslider=use_timeslider,
+                                           num_quantiles=num_quantiles, timeslider_log=False, embedding='pca')
+        layout, _ = cfp.run()
+        script, div = components(layout)
+        return len(script) + len(div)
+
+    def test_timeslider_report_size(self):
+        """ Testing the report size grows by about one byte per configuration and quantile with time slider. """
+        without_timeslider = self._report_size(False, 2)
+        few_quantiles = self._report_size(True, 2)
+        many_quantiles = self._report_size(True, 22)
+        # Coordinates and parameters are not duplicated per quantile
+        self.assertLess(few_quantiles, 1.2 * without_timeslider)
+        # 300 configurations, 20 additional quantiles, base64-encoded uint8 counts
+        self.assertLess(many_quantiles - few_quantiles, 2 * 300 * 20)
+
+    def test_constant_renderer_count(self):
+        """ Testing one scatter-renderer is used, independent of the number of runs. """
+        rhs = [copy.deepcopy(self.rhs[0]) for _ in range(5)] + self.rhs
+        cfp = ConfiguratorFootprintPlotter(self.scenario, rhs, self.incs, self.incs[0][-1], num_quantiles=3,
+                                           embedding='pca')
+        layout, _ = cfp.run()
+        scatters = [r for r in layout.select({'type': GlyphRenderer}) if isinstance(r.glyph, Scatter)]
+        self.assertEqual(len(scatters), 1)
+        # All configs are shown initially
+        self.assertEqual(len(scatters[0].view.filters[0].indices), len(scatters[0].data_source.data['x']))
+
+    def test_pred_surfaces(self):
+        """ Testing identical contours are fitted once and equal the contour fitted for a single runhistory. """
+        for rhs, expected_fits in [(self.rhs[:1], 1), (self.rhs, 3)]:
+            cfp = ConfiguratorFootprintPlotter(self.scenario, rhs, self.incs[:len(rhs)], self.incs[0][-1],
+                                               num_quantiles=2, embedding='pca')
+            with mock.patch.object(configurator_footprint, '_fit_and_predict_surface',
+                                   wraps=configurator_footprint._fit_and_predict_surface) as fit:
+                cfp.run()
+            self.assertEqual(fit.call_count, expected_fits)
+
+        cfp = ConfiguratorFootprintPlotter(self.scenario, self.rhs, self.incs, self.incs[0][-1],
+                                           rng=np.random.RandomState(3))
+        conf_list = cfp.combined_rh.get_all_configs()
+        X_scaled = np.random.RandomState(1).rand(len(conf_list), 2)
+        surfaces = cfp.get_pred_surfaces({'a': self.rhs[0], 'b': copy.deepcopy(self.rhs[0])}, X_scaled, conf_list, 0.2)
+        cfp.rng = np.random.RandomState(3)
+        xx, yy, Z = cfp.get_pred_surface(self.rhs[0], X_scaled, conf_list, 0.2)
+        for label in ['a', 'b']:
+            np.testing.assert_array_equal(surfaces[label][0], xx)
+            np.testing.assert_array_equal(surfaces[label][2], Z)
+
+    def test_preprocessing(self):
+        """ Testing reduced runhistory and configurations equal the previous list-based preprocessing. """
+        rh = self._capped_runhistory()
+        incs = [[rh.get_all_configs()[-1], self.incs[0][0]]]
+        cfp = ConfiguratorFootprintPlotter(self.scenario, [rh], incs, incs[0][-1], num_quantiles=3)
+        for max_configs in [-1, 5, 20, 100]:
+            reduced = cfp.reduce_runhistory(rh, max_configs, keep=incs[0])
+            if max_configs <= 0 or max_configs > len(rh.get_all_configs()):
+                self.assertIs(reduced, rh)
+                continue
+            expected = set(self._reduce_runhistory_lists(rh, max_configs, incs[0])) & set(rh.get_all_configs())
+            self.assertEqual(set(reduced.get_all_configs()), expected)
+            self.assertEqual(len(reduced.data), len([k for k in rh.data if rh.ids_config[k.config_id] in expected]))
+        conf_matrix, conf_list, _, _ = cfp.get_conf_matrix(rh, incs)
+        expected = self._conf_list_lists(rh, incs)
+        self.assertEqual(list(conf_list), expected)
+        np.testing.assert_array_equal(conf_matrix, np.array([c.get_array() for c in expected]))
+
+    def test_runs_per_config_quantiled(self):
+        """ Testing quantile labels and counts equal the former snapshots, with log-scale, capped runs and without
+        timestamps. """
+        with_timestamps = self._capped_runhistory()
+        without_timestamps = RunHistory()
+        for k, v in with_timestamps.data.items():
+            without_timestamps.add(with_timestamps.ids_config[k.config_id], v.cost, v.time, v.status,
+                                   instance_id=k.instance_id, seed=k.seed)
+        for rh in [with_timestamps, without_timestamps]:
+            conf_list = rh.get_all_configs() + [self.incs[0][0]]  # incumbent without runs
+            for log in [True, False]:
+                for quantiles in [1, 3, 10]:
+                    cfp = ConfiguratorFootprintPlotter(self.scenario, [rh], [conf_list[:1]], conf_list[0],
+                                                       timeslider_log=log)
+                    labels, counts = cfp._get_runs_per_config_quantiled(rh, conf_list, quantiles)
+                    expected_labels, expected_counts = self._runs_per_config_quantiled_snapshots(rh, conf_list,
+                                                                                                quantiles, log)
+                    self.assertEqual(labels, expected_labels)
+                    np.testing.assert_array_equal(counts, expected_counts)
+            self.assertEqual(counts[-1][-1], 0)
+
+    def test_compact_surface_data(self):
+        """ Testing the training data of the contours is the same with compact EPM-data. """
+        data = []
+        for compact in [False, True]:
+            cfp = ConfiguratorFootprintPlotter(self.scenario, self.rhs, self.incs, self.incs[0][-1],
+                                               embedding='pca', compact_epm_data=compact)
+            conf_list = cfp.combined_rh.get_all_configs()
+            X_scaled = np.random.RandomState(1).rand(len(conf_list), 2)
+            data.append(cfp._get_surface_data(self.rhs[0], X_scaled, conf_list))
+        self.assertEqual(data[1][0].shape, data[0][0].shape)
+        np.testing.assert_array_almost_equal(data[1][0], data[0][0], decimal=6)
+        np.testing.assert_array_almost_equal(data[1][1], data[0][1], decimal=6)
+
+    def test_embedding_cache(self):
+        """ Testing cached embeddings depend on seed and fixed landmarks and do not change later random numbers. """
+        output_dir = tempfile.mkdtemp()
+
+        def embed(fixed_landmarks, seed=5):
+            cfp = ConfiguratorFootprintPlotter(self.scenario, self.rhs, self.incs, self.incs[0][-1],
+                                               embedding='landmark_mds', num_landmarks=20, output_dir=output_dir,
+                                               rng=np.random.RandomState(seed))
+            conf_matrix, conf_list, _, _ = cfp.get_conf_matrix(cfp.combined_rh, self.incs)
+            coords = cfp.get_embedding(conf_matrix, conf_list, fixed_landmarks)
+            return coords, cfp.rng.randint(MAXINT), len(os.listdir(os.path.join(output_dir, 'analysis_data')))
+
+        coords, next_random, num_cached = embed(self.incs[0])
+        self.assertEqual(num_cached, 1)
+        cached_coords, cached_next_random, num_cached = embed(self.incs[0])
+        self.assertEqual(num_cached, 1)
+        np.testing.assert_array_equal(coords, cached_coords)
+        self.assertEqual(next_random, cached_next_random)
+        self.assertEqual(embed(self.incs[1])[2], 2)
+        self.assertEqual(embed(self.incs[0], seed=6)[2], 3)
+
+    def test_static_pictures(self):
+        """ Testing static pictures of the quantiles are created with matplotlib (in parallel) and animated. """
+        output_dir = tempfile.mkdtemp()
+        cfp = ConfiguratorFootprintPlotter(self.scenario, self.rhs, self.incs, self.incs[0][-1], num_quantiles=3,
+                                           embedding='pca', output_dir=output_dir, n_jobs=2, animation='gif')
+        _, paths = cfp.run()
+        self.assertEqual(len(paths), 3)
+        self.assertTrue(all([p.endswith('.png') and os.path.exists(p) for p in paths]))
+        self.assertTrue(cfp.animation_path.endswith('.gif'))
+        self.assertTrue(os.path.exists(cfp.animation_path))
+        self.assertTrue(os.path.exists(os.path.join(output_dir, 'content/images/configurator_footprint.png')))
@@ -0,0 +1,79 @@
+import copy
+import unittest
+
+import numpy as np
+from ConfigSpace import ConfigurationSpace, UniformFloatHyperparameter, UniformIntegerHyperparameter, \
+    CategoricalHyperparameter, EqualsCondition, InCondition, GreaterThanCondition, AndConjunction, OrConjunction
+from ConfigSpace.util import impute_inactive_values
+
+from cave.utils.configspace_structure import get_configspace_structure, clear_configspace_structure_cache
+from cave.utils.convert_for_epm import impute_default_values
+
+
+class TestConfigSpaceStructure(unittest.TestCase):
+
+    def setUp(self):
+        self.cs = ConfigurationSpace(seed=5)
+        a = CategoricalHyperparameter('a', ['x', 'y', 'z'])
+        b = UniformFloatHyperparameter('b', 1, 100, log=True)
+        c = UniformIntegerHyperparameter('c', 1, 10, default_value=5)
+        d = CategoricalHyperparameter('d', ['u', 'v'])
+        e = UniformFloatHyperparameter('e', 0, 1)
+        f = UniformFloatHyperparameter('f', 0, 1)
+        self.cs.add_hyperparameters([a, b, c, d, e, f])
+        self.cs.add_condition(InCondition(b, a, ['x', 'z']))
+        self.cs.add_condition(AndConjunction(EqualsCondition(c, a, 'x'), GreaterThanCondition(c, b, 5)))
+        self.cs.add_condition(OrConjunction(EqualsCondition(e, a, 'y'), EqualsCondition(e, d, 'v')))
+        self.cs.add_condition(GreaterThanCondition(f, c, 3))
+        clear_configspace_structure_cache()
+
+    @staticmethod
+    def _bfs_depth(cs, param):
+        """ Depth as previously computed by the configurator footprint """
+        parents = cs.get_parents_of(param)
+        if not parents:
+            return 1
+        new_parents, d = parents, 1
+        while new_parents:
+            d += 1
+            old_parents, new_parents = new_parents, []
+            for p in old_parents:
+                pp = cs.get_parents_of(p)
+                if pp:
+                    new_parents.extend(pp)
+                else:
+                    return d
+
+    def test_structure(self):
+        """ Testing depth and masks against querying the configuration space. """
+        structure = get_configspace_structure(self.cs)
+        self.assertEqual(structure.names, self.cs.get_hyperparameter_names())
+        for idx, name in enumerate(structure.names):
+            self.assertEqual(structure.depth[idx], self._bfs_depth(self.cs, name))
+            self.assertEqual(structure.is_conditional[idx], len(self.cs.get_parents_of(name)) > 0)
+        self.assertEqual(list(structure.is_categorical), [n in ['a', 'd'] for n in structure.names])
+        self.assertEqual(list(structure.is_conditional), [n in ['b', 'c', 'e', 'f'] for n in structure.names])
+        self.assertEqual(structure.depth[structure.index['f']], 3)
+        self.assertEqual(structure.limits['b'], {'lower': 1, 'upper': 100, 'log': True})
+        self.assertEqual(structure.limits['d']['choices'], ('u', 'v'))
+
+    def test_imputation(self):
+        """ Testing vectorized imputation against Configuration-objects. """
+        configs = self.cs.sample_configuration(300)
+        X = np.array([c.get_array() for c in configs])
+        # Configuration-objects convert active values back and forth, so these might differ in the last digits
+        imputed = np.array([impute_inactive_values(c).get_array() for c in configs])
+        np.testing.assert_allclose(impute_default_values(self.cs, X), imputed, rtol=1e-12)
+        np.testing.assert_array_equal(impute_default_values(self.cs, X)[~np.isfinite(X)], imputed[~np.isfinite(X)])
+
+    def test_memoization(self):
+        """ Testing configuration spaces with the same content share one structure. """
+        structure = get_configspace_structure(self.cs)
+        self.assertIs(get_configspace_structure(copy.deepcopy(self.cs)), structure)
+        self.cs.add_hyperparameter(UniformFloatHyperparameter('g', 0, 1))
+        self.assertIsNot(get_configspace_structure(self.cs), structure)
+        self.assertEqual(len(get_configspace_structure(self.cs).names), 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import copy
+import unittest
+
+import numpy as np
+from ConfigSpace import ConfigurationSpace, UniformFloatHyperparameter, CategoricalHyperparameter, EqualsCondition
+from ConfigSpace.util import impute_inactive_values
+from smac.runhistory.runhistory import RunHistory
+from smac.scenario.scenario import Scenario
+from smac.tae.execute_ta_run import StatusType
+
+from cave.utils import convert_for_epm
+from cave.utils.compact_epm import CompactRandomForestWithInstances
+from cave.utils.convert_for_epm import convert_data_for_epm, clear_epm_data_cache, runhistory_to_arrays
+
+
+class TestConvertForEPM(unittest.TestCase):
+
+    def setUp(self):
+        self.cs = ConfigurationSpace(seed=3)
+        a = CategoricalHyperparameter('a', ['x', 'y'])
+        b = UniformFloatHyperparameter('b', 1, 100, log=True)
+        self.cs.add_hyperparameters([a, b])
+        self.cs.add_condition(EqualsCondition(b, a, 'x'))
+        insts = ['i%d' % i for i in range(5)]
+        feats = {i: np.random.RandomState(n).rand(3) for n, i in enumerate(insts)}
+        self.scenario = Scenario({'cs': self.cs, 'run_obj': 'runtime', 'cutoff_time': 10,
+                                  'instances': [[i] for i in insts], 'features': feats, 'output_dir': ''})
+        self.rh = RunHistory()
+        rng = np.random.RandomState(1)
+        for config in self.cs.sample_configuration(30):
+            for inst in insts:
+                t = rng.rand() * 15
+                self.rh.add(config, min(t, 10), min(t, 10), StatusType.TIMEOUT if t > 8 else StatusType.SUCCESS,
+                            instance_id=inst, seed=0)
+        clear_epm_data_cache()
+
+    @staticmethod
+    def _impute_runhistory(runhistory):
+        """ Impute inactive parameters of all configurations in the runhistory, as previously done before converting """
+        def impute(config):
+            config.configuration_space.forbidden_clauses = []
+            return impute_inactive_values(config)
+        runhistory.config_ids = {impute(config): config_id for config, config_id in runhistory.config_ids.items()}
+        runhistory.ids_config = {config_id: impute(config) for config_id, config in runhistory.ids_config.items()}
+        return runhistory
+
+    def test_memoization(self):
+        """ Testing memoization and sharing of imputed data between modes. """
+        X_imp, y_imp, types = convert_data_for_epm(self.scenario, self.rh, impute_inactive_parameters=True)
+        self.assertEqual(len(convert_for_epm._EPM_DATA_CACHE), 1)
+        # Equal content, but different objects -> memoized
+        X, y, _ = convert_data_for_epm(copy.deepcopy(self.scenario), self.rh, impute_inactive_parameters=False)
+        self.assertEqual(len(convert_for_epm._EPM_DATA_CACHE), 1)
+        self.assertTrue(np.isnan(X).any())
+        self.assertFalse(np.isnan(X_imp).any())
+        np.testing.assert_array_equal(y, y_imp)
+        # Returned arrays are copies
+        X_imp[:] = 0
+        X_imp2, _, _ = convert_data_for_epm(self.scenario, self.rh, impute_inactive_parameters=True)
+        self.assertFalse((X_imp2 == 0).all())
+        # Changed data -> not memoized
+        self.rh.add(self.cs.sample_configuration(), 1, 1, StatusType.SUCCESS, instance_id='i0', seed=0)
+        convert_data_for_epm(self.scenario, self.rh)
+        self.assertEqual(len(convert_for_epm._EPM_DATA_CACHE), 2)
+
+    def test_memoization_seed(self):
+        """ Testing the imputation of censored data is memoized per seed drawn from rng. """
+        _, y1, _ = convert_data_for_epm(self.scenario, self.rh, rng=np.random.RandomState(1))
+        convert_data_for_epm(self.scenario, self.rh, rng=np.random.RandomState(2))
+        self.assertEqual(len(convert_for_epm._EPM_DATA_CACHE), 2)
+        _, y1_again, _ = convert_data_for_epm(self.scenario, self.rh, rng=np.random.RandomState(1))
+        self.assertEqual(len(convert_for_epm._EPM_DATA_CACHE), 2)
+        np.testing.assert_array_equal(y1, y1_again)
+        # Without censored data, the seed does not matter
+        scenario = Scenario({'cs': self.cs, 'run_obj': 'quality', 'cutoff_time': 10, 'output_dir': ''})
+        for seed in range(2):
+            convert_data_for_epm(scenario, self.rh, rng=np.random.RandomState(seed))
+        self.assertEqual(len(convert_for_epm._EPM_DATA_CACHE), 3)
+
+    def test_equivalence_to_runhistory_imputation(self):
+        """ Testing the imputed data equals the data from imputing configurations in the runhistory. """
+        scenario, rh = copy.deepcopy(self.scenario), copy.deepcopy(self.rh)
+        X_expected, y_expected, _ = convert_for_epm._convert_data_for_epm(scenario, self._impute_runhistory(rh))
+        X, y, _ = convert_data_for_epm(self.scenario, self.rh, impute_inactive_parameters=True)
+        np.testing.assert_array_almost_equal(X, X_expected)
+        np.testing.assert_array_equal(y, y_expected)
+
+    def test_compact(self):
+        """ Testing compact dtypes for EPM-data, sharing of memoized data and training on compact data. """
+        # Built in float32
+        X_c, y_c, _ = convert_data_for_epm(self.scenario, self.rh, impute_inactive_parameters=True, compact=True)
+        self.assertEqual(X_c.dtype, np.float32)
+        self.assertEqual(y_c.dtype, np.float32)
+        self.assertEqual(list(convert_for_epm._EPM_DATA_CACHE.values())[0][0].dtype, np.float32)
+        # float64 replaces the memoized float32-data, compact data is then cast from it
+        X, y, types = convert_data_for_epm(self.scenario, self.rh, impute_inactive_parameters=True)
+        self.assertEqual(X.dtype, np.float64)
+        self.assertEqual(X_c.nbytes * 2, X.nbytes)
+        np.testing.assert_array_almost_equal(X_c, X, decimal=6)
+        np.testing.assert_array_almost_equal(y_c, y, decimal=5)
+        X_c2, _, _ = convert_data_for_epm(self.scenario, self.rh, impute_inactive_parameters=True, compact=True)
+        self.assertEqual(len(convert_for_epm._EPM_DATA_CACHE), 1)
+        np.testing.assert_array_equal(X_c2, X.astype(np.float32))
+
+        bounds = [(2, np.nan), (0, 1)]
+        model = CompactRandomForestWithInstances(self.cs, types, bounds, seed=1,
+                                                 instance_features=self.scenario.feature_array)
+        model.train(X_c, y_c)
+        self.assertEqual(model.X.dtype, np.float32)
+        mean, _ = model.predict_marginalized_over_instances(X_c[:5, :2])
+        self.assertEqual(mean.shape, (5, 1))
+
+        runs, instances = runhistory_to_arrays(self.rh, compact=True)
+        self.assertEqual(runs['status'].dtype, np.uint8)
+        self.assertEqual(runs['config_id'].dtype, np.uint32)
+        self.assertEqual(len(instances), 5)
+        self.assertEqual(len(runs['cost']), len(self.rh.data))
+        self.assertEqual(sorted(set(runs['status'])), [StatusType.SUCCESS.value, StatusType.TIMEOUT.value])
@@ -0,0 +1,50 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from cave.utils.distances import pairwise_config_distances
+
+
+class TestDistances(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(42)
+        self.n_params = 12
+        self.conf_matrix = rng.rand(60, self.n_params)
+        self.conf_matrix[rng.rand(60, self.n_params) < 0.2] = np.nan
+        self.is_cat = rng.rand(self.n_params) < 0.4
+        self.conf_matrix[:, self.is_cat] = np.floor(self.conf_matrix[:, self.is_cat] * 3)
+        self.depth = rng.randint(1, 4, self.n_params)
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _reference(self):
+        n_confs = self.conf_matrix.shape[0]
+        dists = np.zeros((n_confs, n_confs))
+        for i in range(n_confs):
+            for j in range(i + 1, n_confs):
+                dist = np.abs(self.conf_matrix[i, :] - self.conf_matrix[j, :])
+                dist[np.isnan(dist)] = 1
+                dist[np.logical_and(self.is_cat, dist != 0)] = 1
+                dist = np.sum(dist / self.depth)
+                dists[i, j] = dist
+                dists[j, i] = dist
+        return dists
+
+    def test_pairwise_config_distances(self):
+        """ Testing blocked distance computation against pairwise loop. """
+        expected = self._reference()
+        # Tiny memory budget -> many blocks
+        for n_jobs in [1, 3]:
+            dists = pairwise_config_distances(self.conf_matrix, self.is_cat, self.depth, max_memory_mb=0.01,
+                                              n_jobs=n_jobs)
+            np.testing.assert_array_equal(dists, expected)
+        dists = pairwise_config_distances(self.conf_matrix, self.is_cat, self.depth,
+                                          out_path=os.path.join(self.tmp_dir, 'dists.dat'))
+        self.assertEqual(dists.dtype, np.float32)
+        np.testing.assert_array_almost_equal(dists, expected, decimal=5)
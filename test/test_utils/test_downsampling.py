@@ -0,0 +1,38 @@
+import unittest
+
+import numpy as np
+
+from cave.utils.downsampling import downsample
+
+
+class TestDownsampling(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(1)
+        self.x = np.cumsum(rng.rand(10000))
+        self.y = np.cumsum(rng.normal(size=10000))
+
+    def test_bounded(self):
+        """ Testing the number of points is bounded, first and last point are kept and short lines are unchanged. """
+        for method in ['lttb', 'minmax']:
+            for max_points in [2, 3, 10, 1000]:
+                indices = downsample(self.x, self.y, max_points, method)
+                self.assertLessEqual(len(indices), max_points)
+                self.assertEqual((indices[0], indices[-1]), (0, len(self.x) - 1))
+                self.assertTrue(np.all(np.diff(indices) > 0))
+            np.testing.assert_array_equal(downsample(self.x[:50], self.y[:50], 100, method), np.arange(50))
+            np.testing.assert_array_equal(downsample(self.x, self.y, 0, method), np.arange(len(self.x)))
+        self.assertRaises(ValueError, downsample, self.x, self.y, 100, 'random')
+
+    def test_extremes(self):
+        """ Testing minmax keeps global extremes and lttb keeps an outlier. """
+        indices = downsample(self.x, self.y, 100, 'minmax')
+        self.assertIn(np.argmin(self.y), indices)
+        self.assertIn(np.argmax(self.y), indices)
+        y = np.zeros(len(self.x))
+        y[4321] = 100
+        self.assertIn(4321, downsample(self.x, y, 100, 'lttb'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from scipy.spatial.distance import cdist, pdist
+
+from cave.utils.distances import pairwise_config_distances
+from cave.utils.embeddings import select_landmarks, classical_mds, landmark_mds, config_features, \
+    feature_embedding, normalized_stress, sampled_normalized_stress, embedding_cache_path, FEATURE_EMBEDDINGS
+
+
+class TestEmbeddings(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = np.random.RandomState(42)
+        # Points that can be embedded in 2d without error
+        self.points = self.rng.rand(200, 2)
+
+    def test_select_landmarks(self):
+        """ Testing that landmarks contain fixed indices and a stratified sample. """
+        landmarks = select_landmarks(200, 20, fixed=[3, 150, 3], rng=self.rng)
+        self.assertEqual(len(landmarks), 20)
+        self.assertEqual(len(set(landmarks)), 20)
+        self.assertIn(3, landmarks)
+        self.assertIn(150, landmarks)
+        # Every tenth of the configurations is represented
+        self.assertEqual(len(set(landmarks // 20)), 10)
+        self.assertEqual(len(select_landmarks(10, 20, rng=self.rng)), 10)
+
+    def test_landmark_mds(self):
+        """ Testing landmark-MDS reconstructs euclidean distances. """
+        expected = pdist(self.points)
+        np.testing.assert_array_almost_equal(pdist(classical_mds(cdist(self.points, self.points))), expected)
+        landmarks = select_landmarks(200, 15, rng=self.rng)
+        landmark_dists = cdist(self.points, self.points[landmarks])
+        coords, stress = landmark_mds(landmark_dists, landmarks)  # classical, as in the configurator footprint
+        self.assertIsNone(stress)
+        np.testing.assert_array_almost_equal(pdist(coords), expected)
+        coords, stress = landmark_mds(landmark_dists, landmarks, method='smacof')
+        self.assertEqual(coords.shape, (200, 2))
+        self.assertIsNotNone(stress)
+        self.assertRaises(ValueError, landmark_mds, landmark_dists, landmarks, 'unknown')
+
+    def test_feature_embeddings(self):
+        """ Testing feature embeddings and their normalized stress. """
+        conf_matrix = np.c_[self.rng.randint(0, 3, 200).astype(float), self.rng.rand(200, 2)]
+        conf_matrix[:50, 2] = np.nan
+        is_cat, depth = np.array([True, False, False]), np.array([1., 1., 2.])
+        features = config_features(conf_matrix, is_cat, depth)
+        self.assertEqual(features.shape, (200, 3 + 1 + 2))  # one-hot for three choices + inactive column
+        # Distances between features equal configuration distances for categorical and active numerical values
+        dists = pairwise_config_distances(conf_matrix, is_cat, depth)
+        np.testing.assert_array_almost_equal(cdist(features[50:], features[50:], 'cityblock'), dists[50:, 50:])
+
+        for method in FEATURE_EMBEDDINGS:
+            coords = feature_embedding(features, method, n_jobs=2)
+            self.assertEqual(coords.shape, (200, 2))
+            stress = sampled_normalized_stress(conf_matrix, coords, is_cat, depth, sample_size=100)
+            self.assertTrue(0 <= stress <= 1)
+        self.assertRaises(ValueError, feature_embedding, features, 'unknown')
+
+        # Stress is scale-invariant and zero for perfect embeddings
+        euclidean = cdist(self.points, self.points)
+        self.assertAlmostEqual(normalized_stress(euclidean, self.points * 5, block_size=7), 0)
+        self.assertGreater(normalized_stress(euclidean, self.rng.rand(200, 2)), 0.1)
+
+    def test_embedding_cache_path(self):
+        """ Testing cache paths depend on configurations and parameters. """
+        conf_matrix = self.rng.rand(10, 3)
+        cache_dir = tempfile.mkdtemp()
+        path = embedding_cache_path(cache_dir, conf_matrix, method='pca')
+        self.assertEqual(os.path.dirname(path), cache_dir)
+        self.assertEqual(path, embedding_cache_path(cache_dir, conf_matrix.copy(), method='pca'))
+        self.assertNotEqual(path, embedding_cache_path(cache_dir, conf_matrix, method='spectral'))
+        self.assertNotEqual(path, embedding_cache_path(cache_dir, conf_matrix[:9], method='pca'))
@@ -1,9 +1,11 @@
+import copy
 import unittest
 
 import matplotlib.pyplot as plt
 from hpbandster.core.result import Run, logged_results_to_HBS_result
 
-from cave.utils.hpbandster_helpers import _compute_trajectory_racing, get_incumbent_trajectory
+from cave.utils.hpbandster_helpers import _compute_trajectory_racing, get_incumbent_trajectory, \
+    get_incumbent_trajectories
 
 
 class TestHpbandsterHelpers(unittest.TestCase):
@@ -167,3 +169,18 @@ class TestHpbandsterHelpers(unittest.TestCase):
         traj = get_incumbent_trajectory(result, [result.HB_config['budgets'][0]], mode='racing')
         traj = get_incumbent_trajectory(result, [result.HB_config['budgets'][0]], mode='minimum')
         traj = get_incumbent_trajectory(result, [result.HB_config['budgets'][0]], mode='prefer_higher_budget')
+
+    def test_incumbent_trajectories(self):
+        """ Testing all trajectories at once are equal to individual trajectories and do not modify the result. """
+        result = logged_results_to_HBS_result(self.result_path)
+        original = copy.deepcopy(result)
+        budgets = result.HB_config['budgets']
+        trajectories = get_incumbent_trajectories(result)
+        self.assertEqual(len(trajectories), 3 * (1 + len(budgets)))
+        for (mode, traj_budgets), traj in trajectories.items():
+            self.assertEqual(traj, get_incumbent_trajectory(copy.deepcopy(original), list(traj_budgets), mode=mode))
+        self.assertEqual([r.time_stamps for r in result.get_all_runs()],
+                         [r.time_stamps for r in original.get_all_runs()])
+        subset = get_incumbent_trajectories(result, [budgets[:2]], ['minimum'])
+        self.assertEqual(list(subset.keys()), [('minimum', tuple(budgets[:2]))])
+        self.assertRaises(ValueError, get_incumbent_trajectories, result, [[budgets[0] + 1]])
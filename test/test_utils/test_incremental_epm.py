@@ -0,0 +1,129 @@
+import copy
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from ConfigSpace import ConfigurationSpace, UniformFloatHyperparameter
+from smac.configspace import convert_configurations_to_array
+from smac.runhistory.runhistory import RunHistory
+from smac.scenario.scenario import Scenario
+from smac.tae.execute_ta_run import StatusType
+
+from cave.utils.incremental_epm import IncrementalEPM
+
+
+class TestIncrementalEPM(unittest.TestCase):
+
+    def setUp(self):
+        self.cs = ConfigurationSpace(seed=1)
+        self.cs.add_hyperparameters([UniformFloatHyperparameter('x', 0, 1), UniformFloatHyperparameter('y', 0, 1)])
+        self.scenario = Scenario({'cs': self.cs, 'run_obj': 'quality', 'output_dir': ''})
+        self.rh = RunHistory()
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _add_runs(self, n):
+        for config in self.cs.sample_configuration(n):
+            self.rh.add(config, config['x'] ** 2 + config['y'], 1, StatusType.SUCCESS, seed=0)
+
+    def test_incremental_update(self):
+        """ Testing growing and retiring generations of trees. """
+        epm = IncrementalEPM(self.scenario, np.random.RandomState(1), num_trees=5, max_trees=15, retrain_ratio=0.2)
+        self._add_runs(100)
+        self.assertTrue(epm.update(self.rh))
+        self.assertEqual(len(epm.generations), 3)
+        self.assertFalse(epm.update(self.rh))  # Nothing new
+        self.assertEqual(len(epm.generations), 3)
+        for _ in range(4):
+            self._add_runs(5)
+            self.assertTrue(epm.update(self.rh))
+            self.assertLessEqual(sum([n for _, n, _ in epm.generations]), 15)
+        self.assertEqual(epm.num_full_retrains, 1)
+        self.assertEqual(len(epm.seen), 120)
+        self.assertEqual(epm.X.shape[0], 120)
+        X = convert_configurations_to_array(self.cs.sample_configuration(10))
+        mean, var = epm.predict_marginalized_over_instances(X)
+        self.assertEqual(mean.shape, (10, 1))
+        self.assertTrue(np.all(var >= 0))
+
+    def test_incremental_quality(self):
+        """ Testing predictions after several small updates stay close to a full retrain. """
+        epm = IncrementalEPM(self.scenario, np.random.RandomState(1), num_trees=5, max_trees=15, retrain_ratio=0.2)
+        self._add_runs(200)
+        epm.update(self.rh)
+        for _ in range(8):
+            self._add_runs(5)
+            self.assertTrue(epm.update(self.rh))
+        self.assertEqual(epm.num_full_retrains, 1)
+        full = IncrementalEPM(self.scenario, np.random.RandomState(2), num_trees=5, max_trees=15)
+        full.update(self.rh)
+        configs = self.cs.sample_configuration(200)
+        X = convert_configurations_to_array(configs)
+        truth = np.array([c['x'] ** 2 + c['y'] for c in configs])
+        incremental_error = np.abs(epm.predict_marginalized_over_instances(X)[0].flatten() - truth).mean()
+        full_error = np.abs(full.predict_marginalized_over_instances(X)[0].flatten() - truth).mean()
+        self.assertLess(incremental_error, 2 * full_error)
+        np.testing.assert_allclose(epm.predict_marginalized_over_instances(X)[0],
+                                   full.predict_marginalized_over_instances(X)[0], atol=0.25)
+
+    def test_full_retrain(self):
+        """ Testing detection of necessary full retrain. """
+        epm = IncrementalEPM(self.scenario, np.random.RandomState(1), retrain_ratio=0.2)
+        self._add_runs(50)
+        epm.update(self.rh)
+        self._add_runs(50)  # Too many new runs
+        self.assertTrue(epm.needs_full_retrain(self.rh))
+        self.assertTrue(epm.update(self.rh))
+        self.assertEqual(epm.num_full_retrains, 2)
+        for _ in range(2):  # Small updates, that add up to too many new runs since the last full retrain
+            self._add_runs(12)
+            self.assertFalse(epm.needs_full_retrain(self.rh))
+            self.assertTrue(epm.update(self.rh))
+        self._add_runs(12)
+        self.assertTrue(epm.needs_full_retrain(self.rh))
+        self.assertTrue(epm.update(self.rh))
+        self.assertEqual(epm.num_full_retrains, 3)
+        other_rh = RunHistory()  # Not an extension of the seen data
+        for config in self.cs.sample_configuration(5):
+            other_rh.add(config, 1, 1, StatusType.SUCCESS, seed=0)
+        self.assertTrue(epm.needs_full_retrain(other_rh))
+
+    def test_compact(self):
+        """ Testing the training data is kept in float32 in compact mode. """
+        epm = IncrementalEPM(self.scenario, np.random.RandomState(1), compact=True)
+        self._add_runs(50)
+        epm.update(self.rh)
+        self._add_runs(5)
+        self.assertTrue(epm.update(self.rh))
+        self.assertEqual(epm.num_full_retrains, 1)
+        self.assertEqual((epm.X.dtype, epm.y.dtype), (np.float32, np.float32))
+        X = convert_configurations_to_array(self.cs.sample_configuration(5))
+        mean, _ = epm.predict_marginalized_over_instances(X)
+        self.assertTrue(np.all(np.isfinite(mean)))
+
+    def test_save_load(self):
+        """ Testing pickling of the model, which is only loaded for the scenario it was trained on. """
+        epm = IncrementalEPM(self.scenario, np.random.RandomState(1))
+        self._add_runs(50)
+        epm.update(self.rh)
+        path = os.path.join(self.tmp_dir, 'epm.pkl')
+        epm.save(path)
+        scenario = Scenario({'cs': self.cs, 'run_obj': 'quality', 'output_dir': ''})
+        loaded = IncrementalEPM.load(path, scenario)
+        self.assertIs(loaded.scenario, scenario)
+        X = convert_configurations_to_array(self.cs.sample_configuration(10))
+        np.testing.assert_array_almost_equal(epm.predict_marginalized_over_instances(X)[0],
+                                             loaded.predict_marginalized_over_instances(X)[0])
+        self._add_runs(5)
+        self.assertTrue(loaded.update(self.rh))
+        self.assertEqual(loaded.num_full_retrains, 1)
+        other_cs = copy.deepcopy(self.cs)
+        other_cs.add_hyperparameter(UniformFloatHyperparameter('z', 0, 1))
+        for other in [Scenario({'cs': other_cs, 'run_obj': 'quality', 'output_dir': ''}),
+                      Scenario({'cs': self.cs, 'run_obj': 'runtime', 'cutoff_time': 10, 'output_dir': ''})]:
+            with self.assertRaises(ValueError):
+                IncrementalEPM.load(path, other)
@@ -0,0 +1,41 @@
+import unittest
+
+import numpy as np
+from ConfigSpace import ConfigurationSpace, UniformFloatHyperparameter, CategoricalHyperparameter
+from smac.epm.rf_with_instances import RandomForestWithInstances
+
+from cave.utils.marginalized_forest import MarginalizedForest, predict_marginalized_over_instances
+
+
+class TestMarginalizedForest(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = np.random.RandomState(42)
+        self.cs = ConfigurationSpace()
+        self.cs.add_hyperparameters([UniformFloatHyperparameter('x', 0, 1),
+                                     CategoricalHyperparameter('c', ['a', 'b', 'c'])])
+        # Two numerical and one categorical instance feature
+        self.feats = np.hstack([self.rng.rand(50, 2), self.rng.randint(0, 3, (50, 1))])
+
+    def _get_model(self, log_y):
+        model = RandomForestWithInstances(self.cs, np.array([0, 3, 0, 0, 3]), [(0, 1), (3, np.nan)], seed=1,
+                                          num_trees=5, instance_features=self.feats, log_y=log_y)
+        X_conf = np.c_[self.rng.rand(500), self.rng.randint(0, 3, 500)]
+        X = np.hstack([X_conf, self.feats[self.rng.randint(0, 50, 500)]])
+        y = (X[:, 0] + X[:, 2] * (X[:, 1] == 1) + 0.3 * X[:, 4] + 0.1).reshape(-1, 1)
+        model.train(X, np.log(y) if log_y else y)
+        return model
+
+    def test_exactness(self):
+        """ Testing precomputed predictions against smac's predict_marginalized_over_instances. """
+        X = np.c_[self.rng.rand(50), self.rng.randint(0, 3, 50)]
+        for log_y in [False, True]:
+            model = self._get_model(log_y)
+            forest = MarginalizedForest(model)
+            mean, var = forest.predict_marginalized_over_instances(X)
+            mean_ref, var_ref = model.predict_marginalized_over_instances(X)
+            self.assertEqual(mean.shape, (50, 1))
+            np.testing.assert_array_almost_equal(mean, mean_ref)
+            np.testing.assert_array_almost_equal(var, var_ref)
+            self.assertTrue(forest.check_exactness(X))
+            np.testing.assert_array_almost_equal(predict_marginalized_over_instances(model, X)[0], mean_ref)
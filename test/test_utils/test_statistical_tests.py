@@ -1,9 +1,12 @@
 import logging
 import unittest
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
 
 import numpy as np
 
-from cave.utils.statistical_tests import paired_permutation, paired_t_student
+from cave.utils import statistical_tests
+from cave.utils.statistical_tests import paired_permutation, paired_t_student, sequential_paired_permutation
 
 
 class TestStatisticalTests(unittest.TestCase):
@@ -17,12 +20,51 @@ class TestStatisticalTests(unittest.TestCase):
         a, b = rng.normal(loc=0, size=100), rng.normal(loc=0, size=100)
         result = paired_permutation(a, a, rng, 100, self.logger)
         self.assertGreater(result, 0.9999)
-        result = paired_permutation(a, b, rng, 100, self.logger)
+        result = paired_permutation(a, b, rng, 1000, self.logger)
         self.assertGreater(result, 0.3)
         a, b = rng.normal(loc=-1, size=100), rng.normal(loc=1, size=100)
         result = paired_permutation(a, b, rng, 1000, self.logger)
         self.assertLess(result, 0.001)
 
+    def test_paired_permutation_exact(self):
+        """ Testing paired permutation test against all sign-flips, independent of the chunk size. """
+        rng = np.random.RandomState(1)
+        a, b = rng.normal(loc=0, size=12), rng.normal(loc=0.5, size=12)
+        a[:3] = b[:3]  # equal pairs, flipping them yields the original statistic
+        signs = 1 - 2 * ((np.arange(2 ** 12)[:, np.newaxis] >> np.arange(12)) & 1)
+        exact = np.mean(np.abs(signs.dot(a - b)) >= abs(np.sum(a - b)) - 1e-12)
+        for chunk_size in [None, 7]:
+            result = paired_permutation(a, b, np.random.RandomState(2), 20000, self.logger, chunk_size=chunk_size)
+            self.assertAlmostEqual(result, exact, delta=0.01)
+        self.assertEqual(paired_permutation(a, a, rng, 10, self.logger, chunk_size=3), 1)
+
+    def test_sequential_paired_permutation(self):
+        """ Testing early stopping for clear decisions, the interval (corrected for the number of checks) and
+        independence of the number of processes (with own or shared pool). """
+        rng = np.random.RandomState(3)
+        a, b = rng.normal(loc=0, size=50), rng.normal(loc=0.1, size=50)
+        c = rng.normal(loc=1, size=50)
+        p, n, ci = sequential_paired_permutation(a, c, np.random.RandomState(4), max_permutations=10000,
+                                                 batch_size=100, logger=self.logger)
+        self.assertLess(ci[1], 0.05)
+        self.assertLess(n, 10000)
+        larger = int(round(p * (n + 1))) - 1  # the original order is counted as one of the permutations
+        self.assertEqual(ci, statistical_tests._clopper_pearson(larger, n, 1 - 0.01 / 100))
+        p, n, ci = sequential_paired_permutation(a, b, np.random.RandomState(4), max_permutations=2000,
+                                                 batch_size=100, early_stopping=False, logger=self.logger)
+        self.assertEqual(n, 2000)
+        self.assertTrue(ci[0] <= p <= ci[1])
+        self.assertEqual(ci, statistical_tests._clopper_pearson(int(round(p * (n + 1))) - 1, n, 0.99))
+        with mock.patch.object(statistical_tests, 'PARALLEL_MIN_ELEMENTS', 0), \
+                ProcessPoolExecutor(max_workers=2) as executor:
+            for early_stopping in [True, False]:
+                results = [sequential_paired_permutation(a, b, np.random.RandomState(5), max_permutations=2000,
+                                                         batch_size=300, early_stopping=early_stopping, n_jobs=n_jobs,
+                                                         executor=shared, logger=self.logger)
+                           for n_jobs, shared in [(1, None), (2, None), (2, executor)]]
+                self.assertEqual(results[0], results[1])
+                self.assertEqual(results[0], results[2])
+
     def test_t_student(self):
         """ Testing paired t-test. """
         rng = np.random.RandomState(42)